@@ -3,9 +3,39 @@
 import asyncio
 import time
 import uuid
-from agent_learning.planner import plan_task
-from agent_learning.tool_registry import TOOLS
-from agent_learning.state import FileState
+from typing import Any, AsyncIterator
+from agent_learning.planner import PLANNERS, PlanCache, PlanStep, plan_task_graph, plan_task_llm
+from agent_learning.scheduler import run_dag
+from agent_learning.similarity import DEFAULT_SIMILARITY_THRESHOLD, SimilarityIndex
+from agent_learning.executor import execute_tools
+from agent_learning.metrics import METRICS, RunMetrics
+from agent_learning.log_sink import DEFAULT_LOG_SINK, LogSink
+from agent_learning.tool_registry import TOOLS, CircuitOpenError, ToolTimeout, call_tool
+from agent_learning.deadline import (
+    DEADLINE_GRACE,
+    MIN_SUPPLEMENT_BUDGET,
+    PLAN_BUDGET_SHARE,
+    REFLECTION_BUDGET_SHARE,
+    Deadline,
+    DeadlineExceeded,
+)
+from agent_learning.tool_pools import pool_stats
+from agent_learning.tool_policy import ToolPolicy
+from agent_learning.tracing import TRACER, Tracer
+from agent_learning.state import FileState, SQLiteState
+from agent_learning.cache import (
+    DEFAULT_CACHE_TTL,
+    DEFAULT_NEGATIVE_TTL,
+    DEFAULT_STALE_TTL,
+    REVALIDATOR,
+    BoundedCache,
+    is_negative,
+    make_cache_key,
+    negative_result,
+    read_persisted,
+    unwrap_persisted,
+    wrap_persisted,
+)
 
 
 def need_more_info(result: dict) -> bool:
@@ -15,9 +45,9 @@ def need_more_info(result: dict) -> bool:
     return result.get("confidence", 0) < 0.6
 
 
-def choose_candidate_tools(step: str) -> list[str]:
+def route_tools(step: str) -> list[str]:
     """
-    为并发执行准备候选工具列表
+    按 step 内容路由到候选工具（不考虑工具健康状况）
     """
     if "技术" in step:
         return ["tech", "general"]
@@ -27,17 +57,78 @@ def choose_candidate_tools(step: str) -> list[str]:
         return ["general"]
 
 
-# 全局超时配置（秒）
+def choose_candidate_tools(step: str) -> list[str]:
+    """
+    为并发执行准备候选工具列表：跳过熔断中的工具，
+    冷却结束后工具重新出现，由下一次调用充当半开探测
+    """
+    candidates = []
+    for tool_type in route_tools(step):
+        descriptor = TOOLS.get(tool_type)
+        if descriptor is None or descriptor.available():
+            candidates.append(tool_type)
+    return candidates
+
+
+# 工具超时上限（秒）；实际超时由各工具观测到的延迟自适应收紧
 TOOL_TIMEOUT = 3
 
 
-async def run_agent(
+def describe_result(res: Any) -> dict:
+    """把工具返回值 / 异常统一成 status、confidence（以及 content / message）。"""
+    if isinstance(res, (asyncio.TimeoutError, asyncio.CancelledError)):
+        return {"status": "timeout", "confidence": 0.0}
+    if isinstance(res, Exception):
+        return {"status": "error", "confidence": 0.0, "message": str(res)}
+    return {
+        "status": res.get("status"),
+        "confidence": res.get("confidence", 0.5),
+        "content": res.get("content", ""),
+    }
+
+
+async def run_agent_stream(
     task: str,
     initial_state: dict | None = None,
-    persistent_state: FileState | None = None
-) -> str:
+    persistent_state: FileState | SQLiteState | None = None,
+    cache: BoundedCache | None = None,
+    cache_ttl: float | None = DEFAULT_CACHE_TTL,
+    stale_ttl: float | None = DEFAULT_STALE_TTL,
+    negative_ttl: float | None = DEFAULT_NEGATIVE_TTL,
+    exec_mode: str = "all",
+    log_sink: LogSink | None = None,
+    planner: str = "static",
+    plan_cache: PlanCache | None = None,
+    similarity: SimilarityIndex | None = None,
+    similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    tracer: Tracer | None = None,
+    prefetch: int = 0,
+    deadline: float | None = None,
+    tool_policy: ToolPolicy | None = None,
+) -> AsyncIterator[dict]:
+    """
+    流式执行任务：每个事件产生时立即 yield 一个 dict，`event` 字段取值：
+    run_started / step_started / tool_result / best_chosen / supplement / step_complete / run_complete
+    其中 run_complete 携带按计划顺序拼接的 final_result 与日志路径。
+    planner="llm" 时由 LLM 拆解任务，计划按任务指纹缓存在 `plan_cache`（默认进程级 PLAN_CACHE）。
+    传入 `similarity` 索引（需配合 persistent_state）时，精确 key 未命中会复用相似度不低于
+    `similarity_threshold` 的历史任务在 persistent_state 中的结果；run 结束后把本任务加入索引。
+    `tracer` 记录 run / plan / step 及各阶段（decision / cache_read / execution / tool / reflection /
+    state_write / supplement）的 span，默认使用进程级 TRACER（默认关闭）。
+    persistent_state 中超过 `cache_ttl` 但仍在 `stale_ttl` 内的结果立即返回，同时在后台刷新（同一 key 只刷新一次）；
+    工具超时 / 出错会写入 `negative_ttl` 秒的负缓存，窗口内不再调用（0 / None 关闭）。
+    `prefetch > 0` 时为依赖尚未完成的 step 提前发起缓存未命中的工具调用，最多 `prefetch` 个同时在途。
+    `deadline` 是整个 run 的总时限（秒）：规划、各 step 的工具调用与补救共享这一预算，
+    预算不足时跳过补救 / 未开始的 step，run_complete 的 `partial` 为 True，决策日志记为 `partial_result`。
+    `tool_policy` 按历史结果从候选工具中选出预期能越过 need_more_info 阈值的最小集合，并从本次结果继续学习。
+    """
+    if planner not in PLANNERS:
+        raise ValueError(f"未知的 planner：{planner}，可选 {PLANNERS}")
     trace_id = str(uuid.uuid4())
+    tracer = tracer if tracer is not None else TRACER
     start_time = time.time()
+    metrics = RunMetrics(trace_id)
+    run_deadline = Deadline(deadline)
     print(f"\nAgent 接收到任务：{task} (trace={trace_id})")
 
     # 《Planner Layer（规划层）》
@@ -48,21 +139,342 @@ async def run_agent(
     #   2、不关心执行方式
     #   3、只负责“把任务拆清楚”
     # 📌 到这里为止：Agent 仍然处于“纯思考阶段”
-    steps = plan_task(task)
+    # planner="llm"：先查计划缓存（微秒级），未命中才请求 LLM，无法解析时退回静态计划
+    # 有总时限时规划最多使用其中 PLAN_BUDGET_SHARE，超出同样退回静态计划
+    plan_started = time.perf_counter()
+    with tracer.span("plan", trace_id=trace_id, planner=planner):
+        if planner == "llm":
+            try:
+                plan, plan_source = await asyncio.wait_for(
+                    plan_task_llm(task, cache=plan_cache),
+                    run_deadline.budget(run_deadline.share(PLAN_BUDGET_SHARE)) if run_deadline.bounded else None,
+                )
+            except asyncio.TimeoutError:
+                plan, plan_source = plan_task_graph(task), "deadline_fallback"
+            metrics.record_cache("plan", plan_source == "cache")
+        else:
+            plan, plan_source = plan_task_graph(task), "static"
+    plan_seconds = time.perf_counter() - plan_started
 
     # 《State Layer（状态层）》
     # state：本次 run 内的短期记忆（内存态）
     # persistent_state：跨 run 的长期记忆（文件态）
     # 目的：避免重复调用 Tool，形成“经验复用”
-    state: dict = initial_state.copy() if initial_state else {}
+    # key = 任务指纹:step:tool，条目带 TTL，内存缓存有条目数 / 字节上限
+    # 传入共享的 `cache` 可在多个 run 之间复用内存缓存
+    state = cache if cache is not None else BoundedCache(ttl=cache_ttl)
+    for init_key, init_value in (initial_state or {}).items():
+        state.set(init_key, init_value)
+
+    # 《Decision Log（决策日志）》
+    # 每条记录产生时立即交给 sink，由 sink 决定缓冲 / 落盘方式，run 本身不持有日志列表
+    # 记录器由 sink 提供：紧凑的 DecisionRecord 或列式 DecisionBuffer，写出时才转换成 dict
+    sink = log_sink if log_sink is not None else DEFAULT_LOG_SINK
+    log_decision = sink.decision_log(trace_id)
+    log_decision(
+        action="plan",
+        planner=planner,
+        source=plan_source,
+        steps=[s.description for s in plan],
+        duration=plan_seconds,
+    )
+
+    # 《Similarity Cache（近似匹配）》
+    # 近似任务只在第一次需要时查询一次索引，本 run 内各 step / tool 共用
+    similar_tasks: list[tuple[str, float]] | None = None
+
+    def find_similar(step: str, tool_type: str) -> tuple[str, float, dict] | None:
+        nonlocal similar_tasks
+        if similarity is None or persistent_state is None:
+            return None
+        if similar_tasks is None:
+            try:
+                similar_tasks = similarity.nearest(task, similarity_threshold)
+            except Exception:
+                similar_tasks = []
+        for other, score in similar_tasks:
+            try:
+                res = unwrap_persisted(persistent_state.get(make_cache_key(other, step, tool_type)))
+            except Exception:
+                res = None
+            if res is not None and not is_negative(res):
+                return other, score, res
+        return None
+
+    # 《Event Stream（事件流）》
+    # 各 step 并发产生的事件先进入队列，再由生成器按产生顺序交给调用方
+    events: asyncio.Queue = asyncio.Queue()
+
+    def emit(event: str, **fields: Any) -> None:
+        events.put_nowait({"event": event, "time": time.time(), "trace_id": trace_id, **fields})
+
+    # 《Tool Invocation（工具调用）》
+    # 所有真实调用都经过这里：自适应超时（以 TOOL_TIMEOUT 为上限），并在调用过程中记录延迟 / 状态指标
+    # tool_latency 保存本 run 内各工具最近一次调用的延迟，供 tool_policy 学习
+    tool_latency: dict[str, float] = {}
+
+    # 有总时限时超时不超过剩余预算；执行层的调用为反思 / 补救预留 `reserve` 秒
+    async def invoke(tool_type: str, reserve: float = 0.0) -> dict:
+        with tracer.span("tool", trace_id=trace_id, tool=tool_type) as span:
+            started = time.perf_counter()
+            try:
+                res = await call_tool(tool_type, task, timeout=TOOL_TIMEOUT,
+                                      budget=run_deadline.budget(reserve=reserve))
+            except DeadlineExceeded:
+                metrics.record_tool(tool_type, time.perf_counter() - started, "deadline")
+                raise
+            except asyncio.TimeoutError:
+                metrics.record_tool(tool_type, time.perf_counter() - started, "timeout")
+                raise
+            except CircuitOpenError:
+                metrics.record_tool(tool_type, time.perf_counter() - started, "circuit_open")
+                raise
+            except Exception:
+                metrics.record_tool(tool_type, time.perf_counter() - started, "error")
+                raise
+            tool_latency[tool_type] = time.perf_counter() - started
+            metrics.record_tool(tool_type, tool_latency[tool_type], res.get("status") or "unknown")
+            span.set(status=res.get("status"))
+            return res
+
+    # 《Result Memo（本次 run 的结果备忘）》
+    # (tool, query) -> Future：执行层发起的调用与缓存命中都登记在这里，
+    # 补救时直接复用在途或已完成的结果，同一 run 内不再重复调用同一个工具。
+    # memo_source 记录来自缓存的条目（值为缓存来源）：复用它们时不写回缓存、不交给 tool_policy 学习
+    memo: dict[tuple[str, str], asyncio.Future] = {}
+    memo_source: dict[tuple[str, str], str] = {}
+
+    def track(tool_type: str, reserve: float = 0.0) -> asyncio.Future:
+        fut = asyncio.ensure_future(invoke(tool_type, reserve))
+        memo[(tool_type, task)] = fut
+        memo_source.pop((tool_type, task), None)
+        return fut
+
+    def remember(tool_type: str, res: dict, source: str) -> None:
+        fut = asyncio.get_running_loop().create_future()
+        fut.set_result(res)
+        if memo.setdefault((tool_type, task), fut) is fut:
+            memo_source[(tool_type, task)] = source
+
+    def recall(tool_type: str) -> asyncio.Future | None:
+        # 只复用在途或成功完成的调用；失败 / 被取消的调用补救时重新发起
+        fut = memo.get((tool_type, task))
+        if fut is None or fut.cancelled() or (fut.done() and fut.exception() is not None):
+            return None
+        return fut
+
+    # 《Tool Selection（工具选择）》
+    # 默认沿用关键词路由的全部可用候选；传入 tool_policy 时按历史统计收窄为预期足够的最小集合
+    def select_tools(step: str, available: list[str] | None = None) -> list[str]:
+        available = choose_candidate_tools(step) if available is None else available
+        if tool_policy is None:
+            return available
+        return tool_policy.select(step, available, [t for t, d in TOOLS.items() if d.available()])
+
+    # 《Deadline Budget（总时限）》
+    # 执行层为反思 / 补救预留总时限的一部分；剩余预算不够一次补救（低于补救工具的平均延迟）时跳过补救。
+    # degraded 记录因预算不足而不完整的 step，run 结束时据此把结果标记为 partial
+    reflection_reserve = run_deadline.share(REFLECTION_BUDGET_SHARE)
+    degraded: dict[str, str] = {}
+
+    def supplement_affordable(step: str, tool_type: str = "tech") -> bool:
+        if not run_deadline.bounded:
+            return True
+        descriptor = TOOLS.get(tool_type)
+        expected = descriptor.health.ewma_latency if descriptor is not None else None
+        remaining = run_deadline.remaining()
+        if remaining >= max(MIN_SUPPLEMENT_BUDGET, expected or 0.0):
+            return True
+        metrics.inc("supplements_skipped_total")
+        log_decision(step, "supplement_skipped", reason="deadline", remaining=remaining)
+        degraded.setdefault(step, "supplement_skipped")
+        return False
+
+    # 《Stale-While-Revalidate / Negative Cache（新鲜度）》
+    # stale 结果先返回，再由 REVALIDATOR 在后台刷新（同一 key 只有一个刷新在途，刷新失败保留旧结果）；
+    # 工具自身超时 / 出错写入短 ttl 的负缓存，窗口内该工具直接按失败处理，不再等满 TOOL_TIMEOUT
+    def revalidate(step: str, tool_type: str, key: str) -> None:
+        async def refresh() -> None:
+            try:
+                res = await call_tool(tool_type, task, timeout=TOOL_TIMEOUT)
+            except Exception:
+                METRICS.inc("revalidations_total", result="error")
+                return
+            if res.get("status") == "ok":
+                try:
+                    state.set(key, res)
+                    persistent_state.set(key, wrap_persisted(res, cache_ttl, stale_ttl))
+                except Exception:
+                    pass
+            METRICS.inc("revalidations_total", result=res.get("status") or "unknown")
+
+        if REVALIDATOR.schedule(key, refresh):
+            log_decision(step, "revalidate", tool=tool_type)
+
+    def remember_failure(step: str, tool_type: str, status: str, message: str = "") -> None:
+        if not negative_ttl:
+            return
+        key = make_cache_key(task, step, tool_type)
+        res = negative_result(tool_type, status, message)
+        with tracer.span("state_write", tool=tool_type):
+            try:
+                state.set(key, res, ttl=negative_ttl)
+                if persistent_state is not None:
+                    persistent_state.set(key, wrap_persisted(res, negative_ttl))
+            except Exception:
+                pass
+
+    # 《Reflection Layer（补救调用）》
+    # 复用顺序：本次 run 的备忘 → 内存缓存 → 持久化缓存 → 真实调用；结果写回 state / persistent_state
+    async def supplement(index: int, step: str, tool_type: str = "tech") -> str:
+        if not TOOLS.get(tool_type):
+            return ""
+        key = make_cache_key(task, step, tool_type)
+        res, source = None, None
+
+        fut = recall(tool_type)
+        if fut is None:
+            res = state.get(key)
+            metrics.record_cache("memory", res is not None)
+            source = "cache" if res is not None else None
+        if fut is None and res is None and persistent_state is not None:
+            try:
+                res = unwrap_persisted(persistent_state.get(key))
+            except Exception:
+                res = None
+            metrics.record_cache("persistent", res is not None)
+            source = "persistent_cache" if res is not None else None
+        if fut is not None:
+            source = memo_source.get((tool_type, task)) or ("finished" if fut.done() else "inflight")
+        # 只有真实调用（本次发起、在途或已完成）的结果才写回缓存、交给 tool_policy 学习；
+        # 缓存命中（包括 stale / 负缓存 / 相似结果）原样复用，不刷新它们的时间戳
+        real_call = source in (None, "finished", "inflight")
+
+        if source:
+            log_decision(step, "supplement_reused", tool=tool_type, source=source)
+
+        try:
+            if res is None:
+                if fut is None:
+                    fut = track(tool_type)
+                try:
+                    res = await asyncio.shield(fut)
+                except asyncio.CancelledError:
+                    # 共享的调用被其他 step 的提前返回取消了，而本 step 并未被取消：重新发起
+                    if not fut.cancelled() or asyncio.current_task().cancelling():
+                        raise
+                    res = await track(tool_type)
+        except Exception as e:
+            log_decision(step, "supplement_error", tool=tool_type, message=str(e))
+            return ""
+
+        # 补救工具在该 step 上的表现同样交给 tool_policy 学习
+        if tool_policy is not None and real_call:
+            outcome = describe_result(res)
+            tool_policy.record(step, tool_type, outcome["status"], outcome["confidence"], tool_latency.get(tool_type))
+
+        if res.get("status") != "ok":
+            return ""
+
+        # 《State Update（状态写入）》
+        if real_call:
+            with tracer.span("state_write", tool=tool_type):
+                try:
+                    state.set(key, res)
+                    if persistent_state is not None:
+                        persistent_state.set(key, wrap_persisted(res, cache_ttl, stale_ttl))
+                except Exception:
+                    pass
 
-    decision_log: list[dict] = []
-    final_result = ""
+        emit("supplement", index=index, step=step, tool=tool_type,
+             reused=source is not None, **describe_result(res))
+        log_decision(step, "supplement_done", tool=tool_type, confidence=res.get("confidence", 0.5))
+        return res.get("content", "") + "\n"
+
+    # 《Speculative Prefetch（推测预取）》
+    # 计划一次性给出全部 step，候选工具只取决于 step 文本：依赖尚未完成的 step 的缓存未命中工具
+    # 可以在前序 step 执行 / 反思 / 补救期间提前发起（同时在途的预取调用不超过 `prefetch` 个）。
+    # step 开始执行时直接消费预取结果；step 结束时仍未被消费的预取调用被取消，计为浪费
+    started_steps: set[int] = set()
+    finished_steps: set[int] = set()
+    # (step 下标, tool) -> [Future, 发起时间, 完成时间]
+    speculative: dict[tuple[int, str], list] = {}
+    prefetch_open = prefetch > 0
+
+    def cached(step: str, tool_type: str) -> bool:
+        key = make_cache_key(task, step, tool_type)
+        if key in state:
+            return True
+        if persistent_state is not None:
+            try:
+                if read_persisted(persistent_state.get(key))[0] is not None:
+                    return True
+            except Exception:
+                pass
+        return find_similar(step, tool_type) is not None
+
+    async def prefetch_call(step: str, tool_type: str) -> dict:
+        with tracer.span("prefetch", trace_id=trace_id, step=step, tool=tool_type):
+            return await invoke(tool_type, reflection_reserve)
+
+    def prefetch_done(entry: list) -> None:
+        entry[2] = time.perf_counter()
+        if not entry[0].cancelled():
+            entry[0].exception()  # 取走异常：未被消费的失败预取不应告警
+        speculate()  # 空出的名额留给后面的 step
+
+    def speculate() -> None:
+        if not prefetch_open:
+            return
+        inflight = sum(1 for entry in speculative.values() if not entry[0].done())
+        for index, plan_step in enumerate(plan):
+            # 已开始，或依赖都已完成（调度器马上就会启动它）的 step 不需要预取
+            if index in started_steps or set(plan_step.depends_on) <= finished_steps:
+                continue
+            step = plan_step.description
+            for tool_type in select_tools(step):
+                if inflight >= prefetch:
+                    return
+                if (index, tool_type) in speculative or not TOOLS.get(tool_type) or cached(step, tool_type):
+                    continue
+                entry = [asyncio.ensure_future(prefetch_call(step, tool_type)), time.perf_counter(), None]
+                speculative[(index, tool_type)] = entry
+                entry[0].add_done_callback(lambda _, e=entry: prefetch_done(e))
+                inflight += 1
+                log_decision(step, "prefetch", tool=tool_type)
+
+    def use_prefetched(index: int, step: str, tool_type: str) -> asyncio.Future | None:
+        entry = speculative.pop((index, tool_type), None)
+        if entry is None:
+            return None
+        fut, started, ended = entry
+        if fut.cancelled() or (fut.done() and fut.exception() is not None):
+            # 失败的预取不复用，由 step 重新发起真实调用
+            metrics.record_prefetch(False)
+            return None
+        saved = (ended if ended is not None else time.perf_counter()) - started
+        metrics.record_prefetch(True, saved)
+        memo[(tool_type, task)] = fut
+        memo_source.pop((tool_type, task), None)
+        log_decision(step, "prefetch_used", tool=tool_type, saved=saved)
+        return fut
+
+    def retire_prefetched(index: int | None = None) -> None:
+        """取消 step `index`（None 表示全部）未被消费的预取调用。"""
+        for key in [k for k in speculative if index is None or k[0] == index]:
+            fut = speculative.pop(key)[0]
+            if not fut.done():
+                fut.cancel()
+            metrics.record_prefetch(False)
+            log_decision(plan[key[0]].description, "prefetch_wasted", tool=key[1])
 
     # <<================ Agent Control Loop（控制循环） =================>>
     # Agent 的“生命循环”
     # 每一个 step 都会经历：Decision → Execution → Reflection → State Update
-    for step in steps:
+    # 单个 step 的执行被封装为协程，由调度器按依赖关系并发驱动
+    async def execute_step(index: int, plan_step: PlanStep) -> str:
+        step = plan_step.description
+        step_result = ""
         step_start = time.time()
         print(f"执行步骤：{step}")
         await asyncio.sleep(0)  # 协作式调度点
@@ -72,258 +484,368 @@ async def run_agent(
         #   1、只读信息（step / state）
         #   2、不执行任何能力
         #   3、只产出“策略选择”（用哪些 Tool）
-        candidate_tools = choose_candidate_tools(step)
-        decision_log.append({
-            "time": time.time(),
-            "trace_id": trace_id,
-            "step": step,
-            "candidate_tools": candidate_tools,
-        })
-
-        tasks = []
+        with tracer.span("decision"):
+            available_tools = choose_candidate_tools(step)
+            candidate_tools = select_tools(step, available_tools)
+            skipped_tools = [t for t in route_tools(step) if t not in available_tools]
+            pruned_tools = [t for t in available_tools if t not in candidate_tools]
+            log_decision(
+                step,
+                candidate_tools=candidate_tools,
+                **({"skipped_tools": skipped_tools} if skipped_tools else {}),
+                **({"pruned_tools": pruned_tools, **tool_policy.expected(step, candidate_tools)}
+                   if candidate_tools != available_tools else {}),
+            )
+
+        calls = []
         cached_results = []
 
         # 《State Read（状态读取）》
         # 优先从持久化 / 内存缓存中命中结果
-        for tool_type in candidate_tools:
-            tool_func = TOOLS.get(tool_type)
-            key = f"{step}:{tool_type}"
-
-            persisted = None
-            if persistent_state:
-                try:
-                    persisted = persistent_state.get(key)
-                except Exception:
-                    persisted = None
-
-            if persisted is not None:
-                cached_results.append(persisted)
-                decision_log.append({
-                    "time": time.time(),
-                    "trace_id": trace_id,
-                    "step": step,
-                    "tool": tool_type,
-                    "action": "persistent_cache_hit",
-                })
-                continue
-
-            if key in state:
-                cached_results.append(state[key])
-                decision_log.append({
-                    "time": time.time(),
-                    "trace_id": trace_id,
-                    "step": step,
-                    "tool": tool_type,
-                    "action": "cache_hit",
-                })
-                continue
-
-            # 《Execution Layer（执行层）》
-            # 职责：
-            #   1、把“策略选择”变成真实行动
-            #   2、调用 Tool（不可控）
-            #   3、可能失败 / 超时 / 异常
-            if tool_func:
-                tasks.append(
-                    asyncio.wait_for(tool_func(task), timeout=TOOL_TIMEOUT)
-                )
-
-        if not tasks and not cached_results:
-            decision_log.append({
-                "time": time.time(),
-                "trace_id": trace_id,
-                "step": step,
-                "action": "no_tools",
-                "message": "未找到可用工具，跳过"
-            })
-            continue
+        with tracer.span("cache_read"):
+            for tool_type in candidate_tools:
+                tool_func = TOOLS.get(tool_type)
+                key = make_cache_key(task, step, tool_type)
+
+                persisted, freshness = None, None
+                if persistent_state is not None:
+                    try:
+                        persisted, freshness = read_persisted(persistent_state.get(key))
+                    except Exception:
+                        persisted = None
+                    metrics.record_cache("persistent", persisted is not None)
+
+                # stale-while-revalidate：过期但仍在 stale 窗口内的结果照常使用，后台刷新
+                if persisted is not None:
+                    cached_results.append((tool_type, persisted))
+                    if is_negative(persisted):
+                        action, source = "negative_cache_hit", "negative_cache"
+                        metrics.inc("negative_cache_hits_total")
+                    elif freshness == "stale":
+                        action, source = "stale_cache_hit", "stale_cache"
+                        metrics.inc("stale_results_total")
+                        revalidate(step, tool_type, key)
+                    else:
+                        action, source = "persistent_cache_hit", "persistent_cache"
+                    remember(tool_type, persisted, source)
+                    log_decision(step, action, tool=tool_type)
+                    emit("tool_result", index=index, step=step, tool=tool_type,
+                         source=source, **describe_result(persisted))
+                    continue
+
+                memory_hit = state.get(key)
+                metrics.record_cache("memory", memory_hit is not None)
+                if memory_hit is not None:
+                    cached_results.append((tool_type, memory_hit))
+                    if is_negative(memory_hit):
+                        action, source = "negative_cache_hit", "negative_cache"
+                        metrics.inc("negative_cache_hits_total")
+                    else:
+                        action, source = "cache_hit", "cache"
+                    remember(tool_type, memory_hit, source)
+                    log_decision(step, action, tool=tool_type)
+                    emit("tool_result", index=index, step=step, tool=tool_type,
+                         source=source, **describe_result(memory_hit))
+                    continue
+
+                similar = find_similar(step, tool_type)
+                if similarity is not None and persistent_state is not None:
+                    metrics.record_cache("similar", similar is not None)
+                if similar is not None:
+                    matched_task, score, similar_res = similar
+                    cached_results.append((tool_type, similar_res))
+                    remember(tool_type, similar_res, "similar_cache")
+                    log_decision(
+                        step,
+                        "similar_cache_hit",
+                        tool=tool_type,
+                        matched_task=matched_task,
+                        similarity=score,
+                    )
+                    emit("tool_result", index=index, step=step, tool=tool_type,
+                         source="similar_cache", **describe_result(similar_res))
+                    continue
+
+                # 《Execution Layer（执行层）》
+                # 职责：
+                #   1、把“策略选择”变成真实行动
+                #   2、调用 Tool（不可控）
+                #   3、可能失败 / 超时 / 异常
+                # 已有预取调用时直接接管它（在途或已完成），否则发起真实调用
+                if tool_func:
+                    calls.append((
+                        tool_type,
+                        lambda t=tool_type: use_prefetched(index, step, t) or track(t, reflection_reserve),
+                    ))
+
+        if not calls and not cached_results:
+            log_decision(step, "no_tools", message="未找到可用工具，跳过")
+            return step_result
 
         # 《Fast Path（纯缓存路径）》
         # 无需执行 Tool，直接评估缓存结果
-        if cached_results and not tasks:
+        if cached_results and not calls:
             best_cached = None
             best_c = -1
-            for cres in cached_results:
+            for _, cres in cached_results:
                 c = cres.get("confidence", 0.5)
                 if cres.get("status") == "ok" and c > best_c:
                     best_c = c
                     best_cached = cres
 
             if best_cached:
-                final_result += best_cached.get("content", "") + "\n"
-                decision_log.append({
-                    "time": time.time(),
-                    "trace_id": trace_id,
-                    "step": step,
-                    "action": "use_cache_best",
-                    "best_confidence": best_c,
-                })
+                step_result += best_cached.get("content", "") + "\n"
+                log_decision(step, "use_cache_best", best_confidence=best_c)
+                emit("best_chosen", index=index, step=step, tool=best_cached.get("type"),
+                     confidence=best_c, content=best_cached.get("content", ""))
 
                 # 《Reflection Layer（反思层）》
                 # 判断结果是否“足够好”
-                if need_more_info(best_cached):
-                    tech_tool = TOOLS.get("tech")
-                    if tech_tool:
-                        try:
-                            tech_result = await asyncio.wait_for(
-                                tech_tool(task), timeout=TOOL_TIMEOUT
-                            )
-                            if tech_result.get("status") == "ok":
-                                final_result += tech_result.get("content", "") + "\n"
-                                decision_log.append({
-                                    "time": time.time(),
-                                    "trace_id": trace_id,
-                                    "step": step,
-                                    "action": "supplement_done",
-                                    "tool": "tech",
-                                    "confidence": tech_result.get("confidence", 0.5),
-                                })
-                        except Exception as e:
-                            decision_log.append({
-                                "time": time.time(),
-                                "trace_id": trace_id,
-                                "step": step,
-                                "action": "supplement_error",
-                                "tool": "tech",
-                                "message": str(e),
-                            })
-
-                decision_log.append({
-                    "time": time.time(),
-                    "trace_id": trace_id,
-                    "step": step,
-                    "action": "step_complete",
-                    "duration": time.time() - step_start,
-                })
-                continue
+                if need_more_info(best_cached) and supplement_affordable(step):
+                    with tracer.span("supplement"):
+                        metrics.record_supplement()
+                        step_result += await supplement(index, step)
+
+                log_decision(step, "step_complete", duration=time.time() - step_start)
+                return step_result
 
         # 《Execution Layer（并发执行）》
-        results = []
-        if tasks:
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-        results = list(results) + cached_results
+        # exec_mode="all" 等待全部候选；"first_good" / "hedged" 在拿到足够好的结果后提前返回
+        with tracer.span("execution", tools=[name for name, _ in calls]):
+            results, cancelled_tools = await execute_tools(
+                calls,
+                mode=exec_mode,
+                good_enough=lambda r: isinstance(r, dict) and r.get("status") == "ok" and not need_more_info(r),
+                on_result=lambda name, res: emit(
+                    "tool_result", index=index, step=step, tool=name, source="tool", **describe_result(res)
+                ),
+            )
+        if cancelled_tools:
+            log_decision(step, "early_return", cancelled_tools=cancelled_tools)
+        # 真实调用的结果交给 tool_policy 学习（被提前返回取消 / 被总时限截断的不代表工具质量）
+        if tool_policy is not None:
+            for tool_name, res in results:
+                if isinstance(res, (asyncio.CancelledError, DeadlineExceeded)):
+                    continue
+                outcome = describe_result(res)
+                tool_policy.record(step, tool_name, outcome["status"], outcome["confidence"],
+                                   tool_latency.get(tool_name))
+        # 缓存命中同样参与比较，但标记出来：它们原样复用，不写回缓存（否则 stale 条目会被当作新结果重新持久化）
+        results = [(name, res, False) for name, res in results] + [(name, res, True) for name, res in cached_results]
 
         # 《Reflection Layer（结果评估）》
         # 职责：
         #   1、判断成功 / 失败
         #   2、比较多个结果质量
         #   3、选出“当前最优解”
-        best_result = None
-        best_confidence = -1
-
-        for idx, res in enumerate(results):
-            tool_name = candidate_tools[idx]
-            entry = {
-                "time": time.time(),
-                "trace_id": trace_id,
-                "step": step,
-                "tool": tool_name,
-            }
-
-            if isinstance(res, asyncio.TimeoutError) or isinstance(res, asyncio.CancelledError):
-                entry.update({"status": "timeout", "confidence": 0.0})
-                decision_log.append(entry)
-                continue
-
-            if isinstance(res, Exception):
-                entry.update({"status": "error", "confidence": 0.0, "message": str(res)})
-                decision_log.append(entry)
-                continue
-
-            entry.update({
-                "status": res.get("status"),
-                "confidence": res.get("confidence", 0.5),
-            })
-            decision_log.append(entry)
-
-            confidence = res.get("confidence", 0.5)
-            if confidence > best_confidence and res.get("status") == "ok":
-                best_confidence = confidence
-                best_result = res
-
-                # 《State Update（状态写入）》
-                try:
-                    tool_type_for_state = res.get("type") or "unknown"
-                    state_key = f"{step}:{tool_type_for_state}"
-                    state[state_key] = res
-                    if persistent_state:
-                        persistent_state.set(state_key, res)
-                except Exception:
-                    pass
+        with tracer.span("reflection"):
+            best_result = None
+            best_confidence = -1
+
+            for tool_name, res, from_cache in results:
+                # 因总时限被截断的调用不代表工具故障：不写负缓存，只标记本 step 结果不完整
+                if isinstance(res, DeadlineExceeded):
+                    log_decision(step, tool=tool_name, status="deadline", confidence=0.0)
+                    degraded.setdefault(step, "tools_cut")
+                    continue
+
+                # 被提前返回取消的调用同样不代表工具质量：单独记为 cancelled，回放时与 deadline 一样跳过
+                if isinstance(res, asyncio.CancelledError):
+                    log_decision(step, tool=tool_name, status="cancelled", confidence=0.0)
+                    continue
+
+                if isinstance(res, asyncio.TimeoutError):
+                    log_decision(step, tool=tool_name, status="timeout", confidence=0.0)
+                    # 只有工具自身超时（已计入 ToolHealth）才写负缓存；调用方一侧的等待超时不代表工具故障
+                    if isinstance(res, ToolTimeout):
+                        remember_failure(step, tool_name, "timeout")
+                    continue
+
+                if isinstance(res, Exception):
+                    log_decision(step, tool=tool_name, status="error", confidence=0.0, message=str(res))
+                    if not isinstance(res, CircuitOpenError):
+                        remember_failure(step, tool_name, "error", str(res))
+                    continue
+
+                log_decision(step, tool=tool_name, status=res.get("status"), confidence=res.get("confidence", 0.5),
+                             **({"cached": True} if from_cache else {}))
+
+                confidence = res.get("confidence", 0.5)
+                if confidence > best_confidence and res.get("status") == "ok":
+                    best_confidence = confidence
+                    best_result = res
+                    if from_cache:
+                        continue
+
+                    # 《State Update（状态写入）》
+                    with tracer.span("state_write"):
+                        try:
+                            tool_type_for_state = res.get("type") or "unknown"
+                            state_key = make_cache_key(task, step, tool_type_for_state)
+                            state.set(state_key, res)
+                            if persistent_state is not None:
+                                persistent_state.set(state_key, wrap_persisted(res, cache_ttl, stale_ttl))
+                        except Exception:
+                            pass
 
-        decision_log.append({
-            "time": time.time(),
-            "trace_id": trace_id,
-            "step": step,
-            "action": "choose_best",
-            "best_confidence": best_confidence,
-        })
+            log_decision(step, "choose_best", best_confidence=best_confidence)
 
         if not best_result:
-            decision_log.append({
-                "time": time.time(),
-                "trace_id": trace_id,
-                "step": step,
-                "action": "no_valid_result",
-            })
-            continue
+            log_decision(step, "no_valid_result")
+            return step_result
 
-        final_result += best_result.get("content", "") + "\n"
+        step_result += best_result.get("content", "") + "\n"
+        emit("best_chosen", index=index, step=step, tool=best_result.get("type"),
+             confidence=best_confidence, content=best_result.get("content", ""))
 
         # 《Reflection Layer（补救策略）》
-        if need_more_info(best_result):
-            decision_log.append({
-                "time": time.time(),
-                "trace_id": trace_id,
-                "step": step,
-                "action": "supplement",
-            })
-
-            tech_tool = TOOLS.get("tech")
-            if tech_tool:
-                try:
-                    tech_result = await asyncio.wait_for(
-                        tech_tool(task), timeout=TOOL_TIMEOUT
-                    )
-                    if tech_result.get("status") == "ok":
-                        final_result += tech_result.get("content", "") + "\n"
-                except Exception:
-                    pass
-
-        decision_log.append({
-            "time": time.time(),
-            "trace_id": trace_id,
-            "step": step,
-            "action": "step_complete",
-            "duration": time.time() - step_start,
-        })
+        if need_more_info(best_result) and supplement_affordable(step):
+            log_decision(step, "supplement")
+            with tracer.span("supplement"):
+                metrics.record_supplement()
+                step_result += await supplement(index, step)
+
+        log_decision(step, "step_complete", duration=time.time() - step_start)
+
+        return step_result
+
+    async def run_step(index: int, plan_step: PlanStep) -> str:
+        emit("step_started", index=index, step=plan_step.description)
+        started = time.time()
+        started_steps.add(index)
+        speculate()
+        step = plan_step.description
+        try:
+            with tracer.span("step", trace_id=trace_id, step=step, index=index):
+                if run_deadline.expired():
+                    # 预算已耗尽：不再开始新的 step
+                    log_decision(step, "deadline_skip")
+                    degraded[step] = "skipped"
+                    content = ""
+                elif run_deadline.bounded:
+                    # 工具与补救都已按剩余预算限时，这里只是兜底的硬上限
+                    try:
+                        content = await asyncio.wait_for(
+                            execute_step(index, plan_step), run_deadline.remaining() + DEADLINE_GRACE
+                        )
+                    except asyncio.TimeoutError:
+                        log_decision(step, "deadline_exceeded")
+                        degraded[step] = "timeout"
+                        content = ""
+                else:
+                    content = await execute_step(index, plan_step)
+        finally:
+            finished_steps.add(index)
+            retire_prefetched(index)
+        metrics.record_step(time.time() - started)
+        emit("step_complete", index=index, step=step,
+             content=content, duration=time.time() - started)
+        return content
+
+    # 《Scheduler（步骤调度）》
+    # 没有依赖关系的步骤同时执行；final_result 仍按计划顺序拼接
+    finished = object()
+
+    async def drive() -> list[str]:
+        try:
+            with tracer.span("run", trace_id=trace_id, task=task):
+                return await run_dag(plan, run_step)
+        finally:
+            events.put_nowait(finished)
+
+    yield {
+        "event": "run_started",
+        "time": time.time(),
+        "trace_id": trace_id,
+        "task": task,
+        "steps": [s.description for s in plan],
+    }
+    runner = asyncio.ensure_future(drive())
+    try:
+        while True:
+            event = await events.get()
+            if event is finished:
+                break
+            yield event
+        step_results = await runner
+    except BaseException:
+        sink.abort_trace(trace_id)
+        raise
+    finally:
+        # 调用方提前停止迭代时，取消仍在运行的步骤
+        if not runner.done():
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+        # 未开始的 step 留下的预取调用、备忘中已无人等待的调用（例如被提前返回放弃的补救）一并取消
+        prefetch_open = False
+        leftovers = [entry[0] for entry in speculative.values()]
+        retire_prefetched()
+        leftovers += [fut for fut in memo.values() if not fut.done()]
+        for fut in leftovers:
+            fut.cancel()
+        await asyncio.gather(*leftovers, return_exceptions=True)
+    final_result = "".join(step_results)
+    # 预算不足导致结果不完整：在决策日志中标记，调用方通过 run_complete 的 partial 得知
+    partial = bool(degraded)
+    if partial:
+        metrics.inc("partial_results_total")
+        log_decision(action="partial_result", deadline=deadline, degraded_steps=dict(degraded))
+    if similarity is not None:
+        try:
+            similarity.add(task)
+        except Exception:
+            pass
+    if tool_policy is not None:
+        tool_policy.save()
+    metrics.finish()
+    METRICS.record_run(metrics)
 
     # 《Observation Layer（可观测性层）》
     # 输出结构化日志与指标，便于审计 / 面试 / Debug
+    # 落盘在 sink 的后台线程 / 线程池中完成，不阻塞事件循环
     try:
-        import json
-        from pathlib import Path
-
-        logs_dir = Path(__file__).resolve().parent / "logs"
-        logs_dir.mkdir(parents=True, exist_ok=True)
-
-        decision_path = logs_dir / f"decision_{trace_id}.json"
-        with decision_path.open("w", encoding="utf-8") as f:
-            json.dump(decision_log, f, ensure_ascii=False, indent=2)
-
-        metrics_path = logs_dir / f"metrics_{trace_id}.json"
-        with metrics_path.open("w", encoding="utf-8") as f:
-            json.dump({}, f)
+        decision_path, metrics_path = await sink.close_trace(
+            trace_id, {**metrics.summary(), "memory_cache": state.stats(),
+                       "tool_pools": pool_stats(used_only=True)}
+        )
     except Exception:
         decision_path = None
         metrics_path = None
 
-    total_time = time.time() - start_time
+    yield {
+        "event": "run_complete",
+        "time": time.time(),
+        "trace_id": trace_id,
+        "task": task,
+        "total_time": time.time() - start_time,
+        "decision_path": decision_path,
+        "metrics_path": metrics_path,
+        "final_result": final_result,
+        "partial": partial,
+    }
+
+
+async def run_agent(
+    task: str,
+    initial_state: dict | None = None,
+    persistent_state: FileState | SQLiteState | None = None,
+    **options: Any,
+) -> str:
+    """
+    一次性返回完整结果：run_agent_stream 的薄封装，`options` 原样透传。
+    """
+    done: dict = {}
+    async for event in run_agent_stream(task, initial_state, persistent_state, **options):
+        if event["event"] == "run_complete":
+            done = event
+
+    partial = "【部分结果】 超出总时限，部分步骤未完成或未补救\n" if done["partial"] else ""
     return (
         f"任务完成：{task}\n\n"
-        f"【trace_id】 {trace_id}\n"
-        f"【总耗时】 {total_time:.2f}s\n"
-        f"【决策日志】 {decision_path}\n"
-        f"【指标文件】 {metrics_path}\n\n"
-        f"【最终结果】\n{final_result}"
+        f"【trace_id】 {done['trace_id']}\n"
+        f"【总耗时】 {done['total_time']:.2f}s\n"
+        f"【决策日志】 {done['decision_path']}\n"
+        f"【指标文件】 {done['metrics_path']}\n"
+        f"{partial}\n"
+        f"【最终结果】\n{done['final_result']}"
     )
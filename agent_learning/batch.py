@@ -0,0 +1,107 @@
+"""
+batch.py
+
+批量执行 Task：全局并发上限 + 按完成顺序流式返回 + 吞吐统计。
+工具级的速率 / 在途限制由 tool_registry 中各工具描述符的 limits 负责。
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Iterable
+
+from agent_learning.agent import run_agent
+from agent_learning.task import Task
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+@dataclass
+class BatchStats:
+    """批量运行的吞吐与延迟统计，运行过程中持续更新。"""
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at or time.perf_counter()
+        return end - self.started_at if self.started_at else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """每秒完成的任务数。"""
+        return self.completed / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "elapsed_s": self.elapsed,
+            "throughput_per_s": self.throughput,
+            "latency_p50_s": _percentile(self.latencies, 0.50),
+            "latency_p95_s": _percentile(self.latencies, 0.95),
+            "latency_p99_s": _percentile(self.latencies, 0.99),
+        }
+
+
+async def run_agents(
+    tasks: Iterable[Task],
+    concurrency: int = 16,
+    stats: BatchStats | None = None,
+    **options: Any,
+) -> AsyncIterator[Task]:
+    """
+    以最多 `concurrency` 个并发的 run_agent 执行 `tasks`，
+    填充每个 Task 的 `result` 并按完成顺序 yield。`options` 透传给 run_agent。
+    失败的任务 `result` 为 "任务失败：..."，并计入 stats.failed。
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency 必须 >= 1")
+    stats = stats if stats is not None else BatchStats()
+    stats.started_at = time.perf_counter()
+
+    pending = iter(tasks)
+    running: dict[asyncio.Task, tuple[Task, float]] = {}
+
+    def fill() -> None:
+        # 惰性地从输入中取任务，保证同时存在的协程不超过 concurrency
+        while len(running) < concurrency:
+            item = next(pending, None)
+            if item is None:
+                return
+            stats.submitted += 1
+            fut = asyncio.ensure_future(run_agent(item.description, **options))
+            running[fut] = (item, time.perf_counter())
+
+    fill()
+    try:
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                item, started = running.pop(fut)
+                stats.latencies.append(time.perf_counter() - started)
+                if fut.exception() is not None:
+                    item.result = f"任务失败：{fut.exception()}"
+                    item.status = "failed"
+                    stats.failed += 1
+                else:
+                    item.result = fut.result()
+                    item.status = "ok"
+                stats.completed += 1
+                yield item
+            fill()
+    finally:
+        for fut in running:
+            fut.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        stats.finished_at = time.perf_counter()
@@ -0,0 +1 @@
+"""benchmarks：性能基准脚本集合，使用 `python -m agent_learning.benchmarks.<name>` 运行。"""
@@ -0,0 +1,141 @@
+"""
+decision_log_bench.py
+
+决策日志表示方式的内存 / 分配对比：模拟 N 个并发 run（默认 10k），每个 run 产生约 20 条决策记录，
+全部缓冲在 `PerTraceJsonSink` 中（与真实 run 结束前的状态一致），分别用
+旧的 dict 记录、逐条的 `DecisionRecord` 与列式的 `DecisionBuffer`（PerTraceJsonSink 的默认方式），报告：
+
+- 缓冲区占用的内存（tracemalloc）与分配块数
+- GC 跟踪的对象数增量
+- 产生记录的耗时，以及写出时转换为 JSON 的耗时
+
+    python -m agent_learning.benchmarks.decision_log_bench --runs 10000
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+import uuid
+
+from agent_learning.decision_log import DecisionLog
+from agent_learning.log_sink import PerTraceJsonSink
+
+STEPS = ["理解问题的通用背景", "分析相关技术原理", "结合工程或项目实践进行说明"]
+TOOLS = {STEPS[0]: ["general"], STEPS[1]: ["tech", "general"], STEPS[2]: ["project", "tech"]}
+
+
+def emit_dicts(sink: PerTraceJsonSink, trace_id: str) -> None:
+    """与改造前 agent.py 相同的 dict 记录。"""
+    log = sink.emit
+    log({"time": time.time(), "trace_id": trace_id, "action": "plan", "planner": "static",
+         "source": "static", "steps": STEPS, "duration": 1e-5})
+    for step in STEPS:
+        tools = TOOLS[step]
+        log({"time": time.time(), "trace_id": trace_id, "step": step, "candidate_tools": tools})
+        for tool in tools:
+            log({"time": time.time(), "trace_id": trace_id, "step": step, "tool": tool, "action": "cache_hit"})
+        for tool in tools:
+            log({"time": time.time(), "trace_id": trace_id, "step": step, "tool": tool,
+                 "status": "ok", "confidence": 0.8})
+        log({"time": time.time(), "trace_id": trace_id, "step": step,
+             "action": "choose_best", "best_confidence": 0.8})
+        log({"time": time.time(), "trace_id": trace_id, "step": step,
+             "action": "step_complete", "duration": 0.01})
+
+
+def emit_records(sink: PerTraceJsonSink, trace_id: str) -> None:
+    """同样的记录，逐条生成 DecisionRecord。"""
+    _emit_compact(DecisionLog(trace_id, sink.emit))
+
+
+def emit_columns(sink: PerTraceJsonSink, trace_id: str) -> None:
+    """同样的记录，写入 sink 提供的列式 DecisionBuffer。"""
+    _emit_compact(sink.decision_log(trace_id))
+
+
+def _emit_compact(log) -> None:
+    log(action="plan", planner="static", source="static", steps=STEPS, duration=1e-5)
+    for step in STEPS:
+        tools = TOOLS[step]
+        log(step, candidate_tools=tools)
+        for tool in tools:
+            log(step, "cache_hit", tool=tool)
+        for tool in tools:
+            log(step, tool=tool, status="ok", confidence=0.8)
+        log(step, "choose_best", best_confidence=0.8)
+        log(step, "step_complete", duration=0.01)
+
+
+def measure(emit, runs: int) -> dict:
+    trace_ids = [str(uuid.uuid4()) for _ in range(runs)]
+
+    # 计时单独跑一遍（tracemalloc 会显著拖慢分配）
+    sink = PerTraceJsonSink()
+    started = time.perf_counter()
+    for trace_id in trace_ids:
+        emit(sink, trace_id)
+    emit_seconds = time.perf_counter() - started
+    del sink
+
+    sink = PerTraceJsonSink()
+    gc.collect()
+    tracked_before = len(gc.get_objects())
+    tracemalloc.start()
+    for trace_id in trace_ids:
+        emit(sink, trace_id)
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    # 一次完整回收后仍被 GC 跟踪的对象（只含原子值的 dict / tuple 会被取消跟踪）
+    gc.collect()
+    tracked = len(gc.get_objects()) - tracked_before
+
+    stats = snapshot.statistics("filename")
+    records = 0
+    started = time.perf_counter()
+    for trace_id in trace_ids:
+        # 与 PerTraceJsonSink 写出时相同的转换
+        columns, buffered = sink._columns.get(trace_id), sink._buffers.get(trace_id, [])
+        entries = columns.to_dicts() if columns is not None else []
+        entries.extend(r if isinstance(r, dict) else r.to_dict() for r in buffered)
+        records += len(entries)
+        json.dumps(entries, ensure_ascii=False)
+    serialize_seconds = time.perf_counter() - started
+    return {
+        "records": records,
+        "memory_mb": sum(s.size for s in stats) / 1e6,
+        "blocks": sum(s.count for s in stats),
+        "gc_tracked": tracked,
+        "emit_us_per_record": emit_seconds / records * 1e6,
+        "serialize_us_per_record": serialize_seconds / records * 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="决策日志 dict / 紧凑记录的内存对比")
+    parser.add_argument("--runs", type=int, default=10_000, help="同时缓冲的 run 数")
+    args = parser.parse_args()
+
+    results = {
+        "dict": measure(emit_dicts, args.runs),
+        "DecisionRecord": measure(emit_records, args.runs),
+        "DecisionBuffer": measure(emit_columns, args.runs),
+    }
+    for name, r in results.items():
+        print(
+            f"{name:>14}: {r['records']} 条  内存={r['memory_mb']:.1f}MB  分配块={r['blocks']}  "
+            f"GC 跟踪对象={r['gc_tracked']}  产生={r['emit_us_per_record']:.2f}µs/条  "
+            f"序列化={r['serialize_us_per_record']:.2f}µs/条"
+        )
+    base = results["dict"]
+    for name in ("DecisionRecord", "DecisionBuffer"):
+        compact = results[name]
+        print(
+            f"{name} 相对 dict：内存 {1 - compact['memory_mb'] / base['memory_mb']:+.0%} 节省  "
+            f"分配块 {1 - compact['blocks'] / base['blocks']:+.0%} 节省  "
+            f"GC 跟踪对象 {compact['gc_tracked'] - base['gc_tracked']:+d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
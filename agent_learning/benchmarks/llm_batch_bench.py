@@ -0,0 +1,106 @@
+"""
+llm_batch_bench.py
+
+LLM 微批前端的吞吐 / 附加延迟基准：请求按泊松过程到达，
+对比逐条调用（每条一次往返）与不同收集窗口下的 `LLMBatcher`。
+
+    python -m agent_learning.benchmarks.llm_batch_bench --requests 500 --rate 200
+
+后端为 `LocalBatchBackend`（默认 rtt=50ms、最多 4 个并发连接）。
+"附加延迟" = 请求端到端延迟 - 后端单次往返时间，反映排队与收集窗口的代价。
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from pathlib import Path
+
+from agent_learning.llm import LLMBatcher, LocalBatchBackend
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _drive(call, n_requests: int, rate: float, seed: int) -> tuple[float, list[float]]:
+    """以平均 `rate` 个/秒的泊松到达发出 n_requests 个请求，返回 (总耗时, 各请求延迟)。"""
+    rng = random.Random(seed)
+    latencies: list[float] = []
+
+    async def one(i: int) -> None:
+        started = time.perf_counter()
+        await call(f"prompt-{i}")
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    running = []
+    for i in range(n_requests):
+        running.append(asyncio.ensure_future(one(i)))
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*running)
+    return time.perf_counter() - started, latencies
+
+
+def _report(label: str, elapsed: float, latencies: list[float], rtt: float, extra: dict) -> dict:
+    added = [max(0.0, lat - rtt) for lat in latencies]
+    return {
+        "mode": label,
+        "throughput_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "added_latency_mean_ms": sum(added) / len(added) * 1000 if added else 0.0,
+        "added_latency_p99_ms": _percentile(added, 0.99) * 1000,
+        **extra,
+    }
+
+
+async def bench(
+    n_requests: int, rate: float, windows: list[float], max_batch_size: int,
+    rtt: float, max_concurrency: int, seed: int = 0,
+) -> list[dict]:
+    results = []
+
+    backend = LocalBatchBackend(rtt=rtt, max_concurrency=max_concurrency)
+    elapsed, latencies = await _drive(lambda p: backend([p]), n_requests, rate, seed)
+    results.append(_report("unbatched", elapsed, latencies, rtt, {"backend_calls": backend.calls}))
+
+    for window in windows:
+        backend = LocalBatchBackend(rtt=rtt, max_concurrency=max_concurrency)
+        batcher = LLMBatcher(backend, window=window, max_batch_size=max_batch_size)
+        elapsed, latencies = await _drive(batcher.submit, n_requests, rate, seed)
+        results.append(_report(
+            f"window={window * 1000:g}ms", elapsed, latencies, rtt,
+            {"backend_calls": backend.calls, **batcher.stats()},
+        ))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="LLM 微批吞吐 / 延迟基准")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=200, help="平均到达速率（请求/秒）")
+    parser.add_argument("--windows", default="0,0.001,0.005,0.01,0.05", help="逗号分隔的收集窗口（秒）")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--rtt", type=float, default=0.05, help="后端单次往返时间（秒）")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="后端并发连接数")
+    parser.add_argument("--out", type=Path, help="把结果保存为 JSON")
+    args = parser.parse_args()
+
+    windows = [float(w) for w in args.windows.split(",") if w.strip()]
+    results = asyncio.run(bench(
+        args.requests, args.rate, windows, args.max_batch_size, args.rtt, args.max_concurrency,
+    ))
+    for row in results:
+        print(
+            f"{row['mode']:>16}  {row['throughput_per_s']:>8.1f}/s  "
+            f"added mean={row['added_latency_mean_ms']:>7.1f}ms  p99={row['added_latency_p99_ms']:>7.1f}ms  "
+            f"backend_calls={row['backend_calls']}"
+        )
+    if args.out:
+        args.out.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
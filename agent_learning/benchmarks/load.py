@@ -0,0 +1,388 @@
+"""
+load.py
+
+Agent 控制循环的压测：把 `TOOLS` 换成延迟 / 失败率 / 置信度可配置的合成工具，
+在不同并发级别下用 `run_agents` 驱动 `run_agent`，
+报告吞吐、任务延迟分位数、事件循环延迟与峰值 RSS，并保存为 JSON 以便跨提交对比。
+
+    python -m agent_learning.benchmarks.load --concurrency 1,10,100,1000,10000
+    python -m agent_learning.benchmarks.load --out new.json --baseline old.json
+    python -m agent_learning.benchmarks.load --workers 4   # 多进程 worker 模式（workers.WorkerPool）
+    python -m agent_learning.benchmarks.load --concurrency 100 --trace trace.json   # 导出 span 追踪
+
+工具配置（`--profile`）是一个 JSON 列表，每项对应 `SyntheticTool` 的字段，例如：
+    [{"name": "tech", "dist": "lognormal", "mean": 0.02, "spread": 0.5, "failure_rate": 0.01}]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from agent_learning import tool_registry
+from agent_learning.batch import BatchStats, run_agents
+from agent_learning.log_sink import JsonLinesSink
+from agent_learning.metrics import METRICS
+from agent_learning.task import Task
+from agent_learning.tool_pools import EXEC_KINDS, pool_stats
+from agent_learning.tool_registry import SingleFlight, ToolDescriptor
+from agent_learning.tracing import TRACER
+from agent_learning.workers import WorkerPool
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+@dataclass
+class SyntheticTool:
+    """
+    合成工具：
+    - dist / mean / spread：延迟分布与参数（秒）；uniform 为 mean±spread，lognormal 的 spread 为 sigma
+    - failure_rate：抛出异常的概率；hang_rate：卡住 `hang_seconds`（用于制造超时）的概率
+    - confidence / confidence_jitter：返回的置信度（均匀抖动，截断到 [0, 1]）
+    - kind：执行方式；"thread" / "process" 时用阻塞的 `time.sleep` 模拟同步工具，交给共享执行池
+    """
+    name: str
+    dist: str = "lognormal"
+    mean: float = 0.01
+    spread: float = 0.5
+    failure_rate: float = 0.0
+    hang_rate: float = 0.0
+    hang_seconds: float = 10.0
+    confidence: float = 0.7
+    confidence_jitter: float = 0.1
+    seed: int = 0
+    kind: str = "async"
+
+    def __post_init__(self):
+        if self.dist not in DISTRIBUTIONS:
+            raise ValueError(f"未知的延迟分布：{self.dist}")
+        if self.kind not in EXEC_KINDS:
+            raise ValueError(f"未知的工具执行方式：{self.kind}")
+        self._rng = random.Random(f"{self.seed}:{self.name}")
+
+    def sample_latency(self) -> float:
+        rng = self._rng
+        if self.dist == "fixed" or self.mean <= 0:
+            return max(0.0, self.mean)
+        if self.dist == "uniform":
+            return max(0.0, rng.uniform(self.mean - self.spread, self.mean + self.spread))
+        if self.dist == "exponential":
+            return rng.expovariate(1 / self.mean)
+        # lognormal：取 mu 使分布的均值等于 mean
+        return rng.lognormvariate(math.log(self.mean) - self.spread ** 2 / 2, self.spread)
+
+    async def __call__(self, query: str) -> dict:
+        rng = self._rng
+        if rng.random() < self.hang_rate:
+            await asyncio.sleep(self.hang_seconds)
+        else:
+            await asyncio.sleep(self.sample_latency())
+        return self._result()
+
+    def blocking(self, query: str) -> dict:
+        """同步版本：在执行池的线程 / 子进程中阻塞等待。"""
+        rng = self._rng
+        time.sleep(self.hang_seconds if rng.random() < self.hang_rate else self.sample_latency())
+        return self._result()
+
+    def _result(self) -> dict:
+        rng = self._rng
+        if rng.random() < self.failure_rate:
+            raise RuntimeError(f"{self.name} 合成故障")
+        confidence = self.confidence + rng.uniform(-self.confidence_jitter, self.confidence_jitter)
+        return {
+            "status": "ok",
+            "type": self.name,
+            "confidence": min(1.0, max(0.0, confidence)),
+            "content": f"{self.name} 合成结果",
+        }
+
+    def descriptor(self) -> ToolDescriptor:
+        func = self if self.kind == "async" else self.blocking
+        return ToolDescriptor(self.name, func, kind=self.kind)
+
+
+DEFAULT_PROFILE = [
+    SyntheticTool("general", mean=0.01, confidence=0.5),
+    SyntheticTool("tech", mean=0.02, confidence=0.75, failure_rate=0.01),
+    SyntheticTool("project", mean=0.015, confidence=0.7),
+]
+
+
+@contextlib.contextmanager
+def synthetic_tools(profile: list[SyntheticTool]):
+    """临时把 TOOLS 中的同名工具替换为合成工具（不限流，只测控制循环本身），退出时恢复。"""
+    saved = dict(tool_registry.TOOLS)
+    saved_flight = tool_registry.SINGLE_FLIGHT
+    try:
+        tool_registry.SINGLE_FLIGHT = SingleFlight()
+        for tool in profile:
+            tool_registry.TOOLS[tool.name] = tool.descriptor()
+        yield
+    finally:
+        tool_registry.TOOLS.clear()
+        tool_registry.TOOLS.update(saved)
+        tool_registry.SINGLE_FLIGHT = saved_flight
+
+
+def install_profile(specs: list[dict], quiet: bool = True) -> None:
+    """worker 进程的 initializer：把 TOOLS 换成合成工具（worker 退出即丢弃，无需恢复）。"""
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    for spec in specs:
+        tool = SyntheticTool(**spec)
+        tool_registry.TOOLS[tool.name] = tool.descriptor()
+
+
+class LoopLagMonitor:
+    """每 `interval` 秒醒来一次，记录实际唤醒时间比预期晚了多少（事件循环延迟）。"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+    def summary(self) -> dict:
+        return {
+            "samples": len(self.samples),
+            "p50_ms": _percentile(self.samples, 0.50) * 1000,
+            "p99_ms": _percentile(self.samples, 0.99) * 1000,
+            "max_ms": max(self.samples, default=0.0) * 1000,
+        }
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def peak_rss_mb(who: str = "self") -> float | None:
+    """进程（或已退出子进程中最大的）迄今为止的峰值 RSS（MB）；该值只增不减。"""
+    if resource is None:
+        return None
+    usage = resource.RUSAGE_CHILDREN if who == "children" else resource.RUSAGE_SELF
+    peak = resource.getrusage(usage).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+async def run_level(concurrency: int, n_tasks: int, sink: JsonLinesSink, **options) -> dict:
+    """以给定并发跑 n_tasks 个任务，返回该级别的报告。"""
+    METRICS.reset()
+    stats = BatchStats()
+    monitor = LoopLagMonitor()
+    tasks = (Task(str(i), f"压测任务 {concurrency}-{i}") for i in range(n_tasks))
+
+    monitor.start()
+    try:
+        async for _ in run_agents(tasks, concurrency=concurrency, stats=stats, log_sink=sink, **options):
+            pass
+    finally:
+        await monitor.stop()
+
+    agent = METRICS.summary()
+    return {
+        "concurrency": concurrency,
+        "batch": stats.summary(),
+        "loop_lag": monitor.summary(),
+        "peak_rss_mb": peak_rss_mb(),
+        "tool_pools": pool_stats(used_only=True),
+        "agent": {
+            key: agent[key]
+            for key in ("tool_calls", "timeout_rate", "error_rate", "supplement_rate", "step_latency")
+        },
+    }
+
+
+def run_level_workers(
+    concurrency: int, n_tasks: int, workers: int, profile: list[SyntheticTool],
+    logs_dir: str | Path, quiet: bool, **options,
+) -> dict:
+    """多进程模式：总并发 `concurrency` 均分到 `workers` 个进程（进程启动时间不计入）。"""
+    per_worker = max(1, -(-concurrency // workers))
+    stats = BatchStats()
+    tasks = (Task(str(i), f"压测任务 {concurrency}-{i}") for i in range(n_tasks))
+    with WorkerPool(
+        workers, per_worker, log_dir=logs_dir,
+        initializer=install_profile, initargs=([asdict(tool) for tool in profile], quiet),
+        **options,
+    ) as pool:
+        pool.wait_ready()
+        for _ in pool.run(tasks, stats=stats):
+            pass
+    agent = pool.metrics.summary()
+    return {
+        "concurrency": concurrency,
+        "workers": workers,
+        "batch": stats.summary(),
+        "loop_lag": None,
+        "peak_rss_mb": peak_rss_mb(),
+        "worker_peak_rss_mb": peak_rss_mb("children"),
+        "agent": {
+            key: agent[key]
+            for key in ("tool_calls", "timeout_rate", "error_rate", "supplement_rate", "step_latency")
+        },
+    }
+
+
+def run_benchmark(
+    levels: list[int],
+    profile: list[SyntheticTool] | None = None,
+    min_tasks: int = 100,
+    logs_dir: str | Path | None = None,
+    quiet: bool = True,
+    workers: int = 0,
+    **options,
+) -> dict:
+    """
+    依次运行各并发级别（每级至少 `min_tasks` 个任务、至少等于并发数），返回完整报告。
+    `workers > 0` 时改用多进程 WorkerPool 驱动。
+    """
+    profile = profile if profile is not None else DEFAULT_PROFILE
+    report = {"meta": _meta(profile, min_tasks, {**options, "workers": workers}), "levels": []}
+
+    if workers:
+        with contextlib.ExitStack() as stack:
+            if logs_dir is None:
+                logs_dir = stack.enter_context(tempfile.TemporaryDirectory())
+            for concurrency in levels:
+                n_tasks = max(min_tasks, concurrency)
+                report["levels"].append(
+                    run_level_workers(concurrency, n_tasks, workers, profile, logs_dir, quiet, **options)
+                )
+        return report
+
+    with contextlib.ExitStack() as stack:
+        if logs_dir is None:
+            logs_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        sink = stack.enter_context(JsonLinesSink(Path(logs_dir) / "load.jsonl"))
+        if quiet:
+            # run_agent 每个 step 都会 print，压测时丢弃这些输出
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        stack.enter_context(synthetic_tools(profile))
+        for concurrency in levels:
+            n_tasks = max(min_tasks, concurrency)
+            report["levels"].append(asyncio.run(run_level(concurrency, n_tasks, sink, **options)))
+        report["meta"]["dropped_log_records"] = sink.dropped
+    return report
+
+
+def _meta(profile: list[SyntheticTool], min_tasks: int, options: dict) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "min_tasks": min_tasks,
+        "options": options,
+        "profile": [asdict(tool) for tool in profile],
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float = 0.1) -> list[str]:
+    """与基线报告逐级对比，吞吐下降或 p99 延迟上升超过 tolerance 的级别视为回归。"""
+    base_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    regressions = []
+    for level in report["levels"]:
+        base = base_levels.get(level["concurrency"])
+        if base is None:
+            continue
+        new_tp, old_tp = level["batch"]["throughput_per_s"], base["batch"]["throughput_per_s"]
+        if old_tp and new_tp < old_tp * (1 - tolerance):
+            regressions.append(f"c={level['concurrency']} 吞吐 {old_tp:.1f} -> {new_tp:.1f}/s")
+        new_p99, old_p99 = level["batch"]["latency_p99_s"], base["batch"]["latency_p99_s"]
+        if old_p99 and new_p99 > old_p99 * (1 + tolerance):
+            regressions.append(f"c={level['concurrency']} p99 {old_p99:.3f} -> {new_p99:.3f}s")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Agent 控制循环压测")
+    parser.add_argument("--concurrency", default="1,10,100,1000,10000", help="逗号分隔的并发级别")
+    parser.add_argument("--min-tasks", type=int, default=100, help="每个级别至少运行的任务数")
+    parser.add_argument("--profile", type=Path, help="合成工具配置（JSON 列表）")
+    parser.add_argument("--exec-mode", default="all", help="透传给 run_agent 的 exec_mode")
+    parser.add_argument("--workers", type=int, default=0, help="worker 进程数；0 表示单进程单事件循环")
+    parser.add_argument("--out", type=Path, default=Path("load_bench.json"))
+    parser.add_argument("--baseline", type=Path, help="对比的基线报告，出现回归时以非零状态退出")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="回归判定的相对容忍度")
+    parser.add_argument("--trace", type=Path, help="导出 Chrome / Perfetto trace-event JSON（仅单进程模式）")
+    args = parser.parse_args()
+    if args.trace:
+        if args.workers:
+            parser.error("--trace 仅支持单进程模式")
+        TRACER.enabled = True
+
+    profile = None
+    if args.profile:
+        profile = [SyntheticTool(**spec) for spec in json.loads(args.profile.read_text(encoding="utf-8"))]
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    report = run_benchmark(
+        levels, profile, min_tasks=args.min_tasks, workers=args.workers, exec_mode=args.exec_mode
+    )
+    args.out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    for level in report["levels"]:
+        batch, lag = level["batch"], level["loop_lag"]
+        lag_p99 = f"{lag['p99_ms']:.1f}ms" if lag else "-"
+        print(
+            f"c={level['concurrency']:>6}  tasks={batch['completed']:>6}  "
+            f"{batch['throughput_per_s']:>9.1f}/s  p50={batch['latency_p50_s']:.3f}s  "
+            f"p99={batch['latency_p99_s']:.3f}s  "
+            f"lag_p99={lag_p99}  "
+            f"rss={level['peak_rss_mb']}MB"
+        )
+    print(f"报告已写入 {args.out}")
+    if args.trace:
+        print(f"trace 已写入 {TRACER.export_chrome_trace(args.trace)}（{len(TRACER.spans)} 个 span）")
+
+    if args.baseline:
+        regressions = compare(report, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+        for line in regressions:
+            print(f"回归：{line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
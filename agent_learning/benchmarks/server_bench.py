@@ -0,0 +1,160 @@
+"""
+server_bench.py
+
+常驻服务 vs 一次性进程：同一批请求（从 `--distinct` 个不同任务中重复抽取）分别用两种方式执行：
+- one-shot：每个请求启动一个 Python 进程，导入 agent、从磁盘加载 FileState、跑一次 run_agent 后退出（main.py 的方式）
+- server：只启动一次 `server.py`（unix socket），用 `AgentClient` 在同一连接上提交请求
+
+报告客户端观测的单请求延迟分位数与吞吐（含进程启动 / 导入 / 状态加载）。两种方式都把工具换成 load.py 的合成工具，
+每个并发级别都从空状态开始，服务进程的启动时间不计入。
+
+    python -m agent_learning.benchmarks.server_bench --requests 60 --distinct 10 --concurrency 1,8
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+from agent_learning.benchmarks.load import DEFAULT_PROFILE
+from agent_learning.client import AgentClient
+
+_ONESHOT = """
+import asyncio, json, sys
+from agent_learning.benchmarks.load import install_profile
+from agent_learning.agent import run_agent
+from agent_learning.log_sink import PerTraceJsonSink
+from agent_learning.state import FileState
+specs, state_path, logs_dir, task = json.loads(sys.argv[1])
+install_profile(specs)
+asyncio.run(run_agent(task, persistent_state=FileState(state_path), log_sink=PerTraceJsonSink(logs_dir)))
+"""
+
+_SERVER = """
+import json, sys
+from agent_learning.benchmarks.load import install_profile
+from agent_learning.server import main
+specs, argv = json.loads(sys.argv[1])
+install_profile(specs)
+main(argv)
+"""
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _drive(call, tasks: list[str], concurrency: int) -> dict:
+    """以最多 `concurrency` 个在途请求执行 tasks，返回吞吐与延迟分位数。"""
+    slots = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one(task: str) -> None:
+        async with slots:
+            started = time.perf_counter()
+            await call(task)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(task) for task in tasks))
+    elapsed = time.perf_counter() - started
+    return {
+        "throughput_per_s": len(tasks) / elapsed if elapsed else 0.0,
+        "latency_p50_ms": _percentile(latencies, 0.50) * 1000,
+        "latency_p95_ms": _percentile(latencies, 0.95) * 1000,
+        "latency_max_ms": max(latencies) * 1000,
+    }
+
+
+async def bench_oneshot(tasks: list[str], concurrency: int, workdir: Path, specs: list[dict]) -> dict:
+    state_path, logs_dir = str(workdir / "state.json"), str(workdir / "oneshot_logs")
+
+    async def call(task: str) -> None:
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-c", _ONESHOT, json.dumps([specs, state_path, logs_dir, task]),
+            stdout=asyncio.subprocess.DEVNULL,
+        )
+        if await proc.wait() != 0:
+            raise RuntimeError(f"one-shot 进程失败：{task}")
+
+    return {"mode": "one-shot", "concurrency": concurrency, **await _drive(call, tasks, concurrency)}
+
+
+async def bench_server(tasks: list[str], concurrency: int, workdir: Path, specs: list[dict]) -> dict:
+    sock = workdir / "agent.sock"
+    argv = [
+        "--socket", str(sock), "--state", str(workdir / "state.db"), "--log-dir", str(workdir / "server_logs"),
+        "--max-concurrency", str(concurrency), "--max-queue", str(len(tasks)),
+    ]
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", _SERVER, json.dumps([specs, argv]), stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        client = AgentClient(path=sock)
+        for _ in range(200):  # 等待服务端开始监听
+            try:
+                await client.connect()
+                break
+            except (FileNotFoundError, ConnectionError):
+                await asyncio.sleep(0.05)
+        else:
+            raise RuntimeError("服务进程未能启动")
+        try:
+            row = await _drive(client.run, tasks, concurrency)
+            stats = await client.stats()
+        finally:
+            await client.close()
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        await proc.wait()
+    return {
+        "mode": "server", "concurrency": concurrency, **row,
+        "persistent_hit_rate": stats["agent"]["cache"]["persistent"]["hit_rate"],
+    }
+
+
+async def bench(n_requests: int, distinct: int, levels: list[int], seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    tasks = [f"常驻服务基准任务 {rng.randrange(distinct)}" for _ in range(n_requests)]
+    specs = [asdict(tool) for tool in DEFAULT_PROFILE]
+    results = []
+    for concurrency in levels:
+        for run in (bench_oneshot, bench_server):
+            with tempfile.TemporaryDirectory() as workdir:
+                results.append(await run(tasks, concurrency, Path(workdir), specs))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="常驻服务 vs 一次性进程的延迟 / 吞吐基准")
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--distinct", type=int, default=10, help="不同任务的数量（其余为重复请求）")
+    parser.add_argument("--concurrency", default="1,8", help="逗号分隔的在途请求数")
+    parser.add_argument("--out", type=Path, help="把结果保存为 JSON")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    # 子进程需要能导入 agent_learning（以模块方式运行时当前目录即仓库根目录）
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")]))
+    results = asyncio.run(bench(args.requests, args.distinct, levels))
+    for row in results:
+        print(
+            f"{row['mode']:>9}  c={row['concurrency']:<4} {row['throughput_per_s']:>8.1f}/s  "
+            f"p50={row['latency_p50_ms']:>8.1f}ms  p95={row['latency_p95_ms']:>8.1f}ms  "
+            f"max={row['latency_max_ms']:>8.1f}ms"
+        )
+    if args.out:
+        args.out.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+similarity_bench.py
+
+近似匹配索引的规模基准：构建 N 条合成任务的 `SimilarityIndex`，
+用“改写过的”已收录任务查询，报告查询延迟（均值 / p99）与 recall@1：
+- recall@1（原任务）：top-1 恰好是被改写的那条任务（合成任务彼此高度相似，精确搜索也达不到 1.0）
+- recall@1（相对精确）：近似搜索的 top-1 相似度与全量精确搜索一致的比例，衡量 LSH 的损失
+
+    python -m agent_learning.benchmarks.similarity_bench --entries 1000000
+
+可用 `--save DIR` 把索引写盘，再用 `--load DIR` 以内存映射方式加载后测量。
+"""
+import argparse
+import random
+import time
+from pathlib import Path
+
+from agent_learning.similarity import SimilarityIndex
+
+TOPICS = [
+    "asyncio", "协程", "事件循环", "线程池", "进程池", "缓存", "索引", "数据库", "事务", "锁",
+    "Kubernetes", "Docker", "Redis", "Kafka", "gRPC", "HTTP", "TCP", "TLS", "DNS", "负载均衡",
+    "限流", "熔断", "重试", "超时", "日志", "指标", "追踪", "向量", "矩阵", "哈希",
+]
+TEMPLATES = [
+    "解释什么是 {a} 与 {b}", "如何在项目中使用 {a} 和 {b}", "{a} 和 {b} 的区别是什么",
+    "{a} 在 {b} 场景下的性能优化", "为什么 {a} 会影响 {b}", "设计一个基于 {a} 的 {b} 方案",
+]
+REWRITES = [
+    ("解释什么是", "解释一下什么是"), ("如何", "怎样"), ("的区别是什么", "有什么区别"),
+    ("为什么", "为何"), ("设计一个", "请设计一个"),
+]
+
+
+def synthetic_task(rng: random.Random, i: int) -> str:
+    a, b = rng.sample(TOPICS, 2)
+    return f"{rng.choice(TEMPLATES).format(a=a, b=b)}（编号 {i}）"
+
+
+def rewrite(task: str, rng: random.Random) -> str:
+    for old, new in REWRITES:
+        if old in task:
+            return task.replace(old, new)
+    return "请" + task
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SimilarityIndex 查询延迟 / 召回基准")
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--save", type=Path, help="构建后写盘到该目录")
+    parser.add_argument("--load", type=Path, help="跳过构建，以内存映射加载该目录下的索引")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    tasks = [synthetic_task(rng, i) for i in range(args.entries)]
+
+    t0 = time.perf_counter()
+    if args.load:
+        index = SimilarityIndex.load(args.load, mmap=True)
+        print(f"加载 {len(index)} 条（mmap）：{time.perf_counter() - t0:.2f}s")
+    else:
+        index = SimilarityIndex()
+        index.add_many(tasks)
+        index.compact()
+        print(f"构建 {len(index)} 条：{time.perf_counter() - t0:.1f}s")
+        if args.save:
+            index.save(args.save)
+
+    queries = [(i, rewrite(tasks[i], rng)) for i in rng.sample(range(len(tasks)), min(args.queries, len(tasks)))]
+    samples, results = [], []
+    for _, query in queries:
+        t0 = time.perf_counter()
+        results.append(index.search(query, k=1))
+        samples.append(time.perf_counter() - t0)
+
+    # 精确参照：临时把 exact_limit 调到全量
+    approx_limit, index.exact_limit = index.exact_limit, len(index)
+    exact = [index.search(query, k=1) for _, query in queries]
+    index.exact_limit = approx_limit
+
+    hits = sum(bool(r) and r[0][0] == tasks[i] for (i, _), r in zip(queries, results))
+    agree = sum(bool(r) and r[0][1] >= e[0][1] - 1e-5 for r, e in zip(results, exact))
+
+    print(
+        f"查询 {len(samples)} 次：mean={sum(samples) / len(samples) * 1e6:.0f}µs  "
+        f"p99={_percentile(samples, 0.99) * 1e6:.0f}µs  "
+        f"recall@1（原任务）={hits / len(samples):.3f}  recall@1（相对精确）={agree / len(samples):.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
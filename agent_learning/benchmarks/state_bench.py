@@ -0,0 +1,127 @@
+"""
+state_bench.py
+
+对比 FileState 与 SQLiteState 的写入开销随存储规模的变化。
+
+    python -m agent_learning.benchmarks.state_bench --max-entries 1000000
+
+在 1k / 10k / 100k / 1M 等检查点各测一个窗口内的 set 延迟（均值 / p99），
+以及落盘后的写入吞吐：再写一个窗口并 `save()`，按"set + 提交"的总耗时计算每秒条数与每条的摊还耗时。
+SQLiteState 的 set 只写内存缓冲，前者反映调用方看到的延迟，后者才包含真正的提交成本。
+FileState 每次写入都会重写整个文件，只测到 `--file-state-limit` 为止，
+且每个检查点只测 `--file-state-window` 次。
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from agent_learning.state import FileState, SQLiteState
+
+VALUE = {"status": "ok", "type": "tech", "confidence": 0.8, "content": "技术相关内容"}
+
+
+def _checkpoints(max_entries: int) -> list[int]:
+    points = []
+    n = 1000
+    while n <= max_entries:
+        points.append(n)
+        n *= 10
+    return points
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _measure(store, prefix: str, window: int) -> dict:
+    samples = []
+    for i in range(window):
+        t0 = time.perf_counter_ns()
+        store.set(f"{prefix}:{i}", VALUE)
+        samples.append((time.perf_counter_ns() - t0) / 1000)
+    return {
+        "mean_us": sum(samples) / len(samples),
+        "p99_us": _percentile(samples, 0.99),
+    }
+
+
+def _measure_committed(store, prefix: str, window: int) -> dict:
+    t0 = time.perf_counter()
+    for i in range(window):
+        store.set(f"{prefix}:{i}", VALUE)
+    store.save()
+    elapsed = time.perf_counter() - t0
+    return {
+        "committed_per_s": window / elapsed,
+        "committed_us_per_set": elapsed / window * 1e6,
+    }
+
+
+def bench_sqlite_state(path: Path, max_entries: int, window: int) -> tuple[list[dict], float]:
+    """持续写入到 max_entries，在每个检查点测量 window 次 set 的延迟。"""
+    report = []
+    written = 0
+    with SQLiteState(path) as store:
+        for point in _checkpoints(max_entries):
+            # 先把存储填充到检查点规模（不计时）
+            while written < point - window:
+                store.set(f"fill:{written}", VALUE)
+                written += 1
+            store.save()  # 填充的写入先落盘，不混进下面的提交计时
+            row = {"entries": point, **_measure(store, f"key{point}", window)}
+            row.update(_measure_committed(store, f"commit{point}", window))
+            report.append(row)
+            written += 2 * window
+        t0 = time.perf_counter()
+        store.save()
+        drain_s = time.perf_counter() - t0
+    return report, drain_s
+
+
+def bench_file_state(path: Path, max_entries: int, window: int) -> list[dict]:
+    """FileState 的填充本身就是 O(n^2)，因此每个检查点直接写出对应规模的 JSON 再测量。"""
+    report = []
+    for point in _checkpoints(max_entries):
+        path.write_text(
+            json.dumps({f"fill:{i}": VALUE for i in range(point)}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+        store = FileState(path)
+        report.append({"entries": point, **_measure(store, "key", window), **_measure_committed(store, "commit", window)})
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="FileState / SQLiteState 写入延迟基准")
+    parser.add_argument("--max-entries", type=int, default=1_000_000)
+    parser.add_argument("--window", type=int, default=1000)
+    parser.add_argument("--file-state-limit", type=int, default=10_000)
+    parser.add_argument("--file-state-window", type=int, default=50)
+    parser.add_argument("--out", type=Path, default=None, help="结果 JSON 输出路径")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        sqlite_report, drain_s = bench_sqlite_state(tmp / "state.db", args.max_entries, args.window)
+        file_report = bench_file_state(
+            tmp / "state.json",
+            min(args.max_entries, args.file_state_limit),
+            min(args.window, args.file_state_window),
+        )
+
+    result = {
+        "sqlite_state": sqlite_report,
+        "sqlite_state_final_drain_s": drain_s,
+        "file_state": file_report,
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+tool_policy_bench.py
+
+工具选择策略基准：同一批任务分别用关键词路由（每个 step 扇出到路由给出的全部工具）
+与学习策略（`ToolPolicy`，先用 `--warmup` 个任务学习）执行，报告每任务的 tool-seconds、工具调用数与补救率。
+
+    python -m agent_learning.benchmarks.tool_policy_bench --tasks 200 --warmup 50
+
+合成工具沿用 load.py 的 `SyntheticTool`：general 置信度偏低（通常需要补救），tech / project 较高。
+学习策略的统计来自预热任务与测量期间的在线学习，不读取任何外部日志。
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from agent_learning.batch import run_agents
+from agent_learning.benchmarks.load import SyntheticTool, synthetic_tools
+from agent_learning.log_sink import JsonLinesSink
+from agent_learning.metrics import METRICS
+from agent_learning.task import Task
+from agent_learning.tool_policy import ToolPolicy
+
+PROFILE = [
+    SyntheticTool("general", mean=0.02, confidence=0.4),
+    SyntheticTool("tech", mean=0.03, confidence=0.8),
+    SyntheticTool("project", mean=0.025, confidence=0.7),
+]
+
+
+async def _run(prefix: str, n_tasks: int, concurrency: int, sink: JsonLinesSink, **options) -> dict:
+    METRICS.reset()
+    tasks = (Task(str(i), f"{prefix} {i}") for i in range(n_tasks))
+    async for _ in run_agents(tasks, concurrency=concurrency, log_sink=sink, **options):
+        pass
+    summary = METRICS.summary()
+    return {
+        "tool_seconds_per_task": summary["tool_seconds"] / n_tasks,
+        "tool_calls_per_task": summary["tool_calls"] / n_tasks,
+        "supplement_rate": summary["supplement_rate"],
+    }
+
+
+async def bench(n_tasks: int, warmup: int, concurrency: int, logs_dir: Path, seed: int = 0) -> list[dict]:
+    results = []
+    with JsonLinesSink(logs_dir / "tool_policy.jsonl") as sink:
+        with synthetic_tools(PROFILE):
+            results.append({"mode": "keyword", **await _run("路由任务", n_tasks, concurrency, sink)})
+
+        with synthetic_tools(PROFILE):
+            policy = ToolPolicy(seed=seed)
+            await _run("预热任务", warmup, concurrency, sink, tool_policy=policy)
+            row = await _run("策略任务", n_tasks, concurrency, sink, tool_policy=policy)
+            results.append({"mode": "learned", **row, **policy.stats()})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="关键词路由 vs 学习策略的工具开销基准")
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=50, help="学习策略的预热任务数（不计入结果）")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--out", type=Path, help="把结果保存为 JSON")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        logs_dir = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+        # run_agent 的逐步输出对基准没有意义
+        stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        results = asyncio.run(bench(args.tasks, args.warmup, args.concurrency, logs_dir))
+    for row in results:
+        print(
+            f"{row['mode']:>8}  tool-seconds/task={row['tool_seconds_per_task']:.4f}  "
+            f"calls/task={row['tool_calls_per_task']:.2f}  supplement_rate={row['supplement_rate']:.2%}"
+        )
+    if args.out:
+        args.out.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
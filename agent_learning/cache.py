@@ -0,0 +1,269 @@
+"""
+cache.py
+
+Agent 的有界缓存：
+- 缓存 key 包含归一化后的任务指纹，避免不同任务之间串用结果
+- 每个条目可设置 TTL，过期即失效
+- 条目数 / 字节数上限，超限时按 LRU 或 LFU 淘汰
+- 统计命中 / 未命中 / 淘汰 / 过期次数
+
+持久化条目带新鲜度元数据（写入时间 / ttl / stale_ttl）：
+- ttl 内为 fresh，直接使用
+- 之后 stale_ttl 内为 stale：立即返回旧结果，同时由 `REVALIDATOR` 在后台刷新（同一 key 只有一个刷新）
+- 再之后过期，视为未命中
+工具超时 / 出错时写入短 ttl 的负缓存条目（status 为 timeout / error），窗口内不再重复调用失效的工具。
+"""
+import asyncio
+import hashlib
+import json
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+# 缓存结果的默认存活时间（秒）
+DEFAULT_CACHE_TTL = 3600.0
+# 过期后仍可作为 stale 结果返回（同时后台刷新）的时长（秒）
+DEFAULT_STALE_TTL = 86400.0
+# 工具超时 / 出错的负缓存时长（秒）
+DEFAULT_NEGATIVE_TTL = 30.0
+
+
+def normalize_task(task: str) -> str:
+    """统一全角 / 半角、大小写与空白，得到任务的规范文本。"""
+    return " ".join(unicodedata.normalize("NFKC", task).lower().split())
+
+
+def task_fingerprint(task: str) -> str:
+    """归一化任务文本的短哈希，作为缓存 key 的任务部分。"""
+    return hashlib.sha1(normalize_task(task).encode("utf-8")).hexdigest()[:16]
+
+
+def make_cache_key(task: str, step: str, tool_type: str) -> str:
+    return f"{task_fingerprint(task)}:{step}:{tool_type}"
+
+
+def estimate_size(value: Any) -> int:
+    """按 JSON 编码后的字节数估算条目大小。"""
+    try:
+        return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+    except (TypeError, ValueError):
+        return len(repr(value).encode("utf-8"))
+
+
+def wrap_persisted(value: Any, ttl: float | None, stale_ttl: float | None = 0.0) -> dict:
+    """写入持久化 state 前附加新鲜度元数据；`stale_ttl` 为 ttl 之后仍可作为 stale 结果返回的时长。"""
+    return {"value": value, "stored_at": time.time(), "ttl": ttl, "stale_ttl": stale_ttl}
+
+
+def read_persisted(raw: Any, now: float | None = None) -> tuple[Any, str | None]:
+    """读取持久化条目，返回 (值, "fresh" / "stale")；过期返回 (None, None)。没有元数据的旧条目视为 fresh。"""
+    if raw is None:
+        return None, None
+    if not isinstance(raw, dict) or "stored_at" not in raw:
+        return raw, "fresh"
+    ttl = raw.get("ttl")
+    age = (time.time() if now is None else now) - raw["stored_at"]
+    if ttl is None or age <= ttl:
+        return raw.get("value"), "fresh"
+    stale_ttl = raw.get("stale_ttl", 0.0)
+    if stale_ttl is None or age <= ttl + stale_ttl:
+        return raw.get("value"), "stale"
+    return None, None
+
+
+def unwrap_persisted(raw: Any, now: float | None = None) -> Any:
+    """只返回新鲜的持久化条目：stale / 过期返回 None；没有元数据的旧条目原样返回。"""
+    value, freshness = read_persisted(raw, now)
+    return value if freshness == "fresh" else None
+
+
+def negative_result(tool_type: str, status: str, message: str = "") -> dict:
+    """负缓存条目：与工具返回值同构，status 为 timeout / error，不会被选为最优结果。"""
+    return {"status": status, "type": tool_type, "confidence": 0.0, "content": "", "message": message}
+
+
+def is_negative(result: Any) -> bool:
+    return isinstance(result, dict) and result.get("status") in ("timeout", "error")
+
+
+class Revalidator:
+    """
+    stale-while-revalidate 的后台刷新：同一 key 同时只有一个刷新任务，
+    其余请求直接返回旧结果。刷新在调用方的事件循环中运行，退出循环前可 `await wait()`。
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.deduplicated = 0
+
+    def schedule(self, key: str, refresh: Callable[[], Awaitable[Any]]) -> bool:
+        """为 key 启动刷新；已有同 key 的刷新在途时返回 False。"""
+        task = self._tasks.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            self.deduplicated += 1
+            return False
+        task = asyncio.ensure_future(refresh())
+        self._tasks[key] = task
+        task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        self.started += 1
+        return True
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()
+
+    def pending(self) -> int:
+        return sum(1 for t in self._tasks.values() if not t.done())
+
+    async def wait(self, timeout: float | None = None) -> None:
+        """等待当前事件循环中在途的刷新完成（最多 `timeout` 秒）。"""
+        loop = asyncio.get_running_loop()
+        tasks = [t for t in self._tasks.values() if t.get_loop() is loop and not t.done()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+
+# 进程级共享：同一进程内所有 run 的后台刷新都经过这里
+REVALIDATOR = Revalidator()
+
+
+class BoundedCache:
+    """
+    有界内存缓存。`policy` 为 "lru"（最近最少使用）或 "lfu"（最不经常使用）。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 8 * 1024 * 1024,
+        ttl: float | None = DEFAULT_CACHE_TTL,
+        policy: str = "lru",
+    ):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"未知的淘汰策略：{policy}")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.policy = policy
+
+        # key -> (value, expires_at, size)
+        self._entries: dict[str, tuple[Any, float | None, int]] = {}
+        self._bytes = 0
+        # LRU：按访问顺序排列的 key
+        self._order: OrderedDict[str, None] = OrderedDict()
+        # LFU：访问频次 -> 同频次 key（按最近访问排序），以及当前最小频次
+        self._freq: dict[str, int] = {}
+        self._buckets: dict[int, OrderedDict[str, None]] = {}
+        self._min_freq = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # ---------------- 公共接口 ----------------
+
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at, _ = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._touch(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return  # 单个条目超过总上限，不缓存
+        if key in self._entries:
+            self._remove(key)
+        # 先腾出空间再插入，避免新条目（LFU 下频次最低）被立即淘汰
+        while self._entries and (
+            len(self._entries) >= self.max_entries or self._bytes + size > self.max_bytes
+        ):
+            self._evict()
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (value, expires_at, size)
+        self._bytes += size
+        self._insert(key)
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and (entry[1] is None or time.monotonic() < entry[1])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+    # ---------------- 淘汰策略 ----------------
+
+    def _insert(self, key: str) -> None:
+        if self.policy == "lru":
+            self._order[key] = None
+        else:
+            self._freq[key] = 1
+            self._buckets.setdefault(1, OrderedDict())[key] = None
+            self._min_freq = 1
+
+    def _touch(self, key: str) -> None:
+        if self.policy == "lru":
+            self._order.move_to_end(key)
+            return
+        freq = self._freq[key]
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = freq + 1
+        self._freq[key] = freq + 1
+        self._buckets.setdefault(freq + 1, OrderedDict())[key] = None
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+        if self.policy == "lru":
+            del self._order[key]
+            return
+        freq = self._freq.pop(key)
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = min(self._buckets, default=0)
+
+    def _evict(self) -> None:
+        if self.policy == "lru":
+            victim = next(iter(self._order))
+        else:
+            victim = next(iter(self._buckets[self._min_freq]))
+        self._remove(victim)
+        self.evictions += 1
@@ -0,0 +1,144 @@
+"""
+client.py
+
+`server.py` 的本地客户端：一条连接上可以同时提交多个任务，按请求 id 把响应分发给各自的调用方。
+
+    async with AgentClient(path="/tmp/agent.sock") as client:
+        async for event in client.stream("解释什么是 asyncio"):
+            print(event["event"])
+        done = await client.run("解释什么是 Agent", deadline=2.0)
+        print(done["final_result"])
+        print(await client.stats())
+
+    python -m agent_learning.client --socket /tmp/agent.sock "解释什么是 Agent" "解释什么是 asyncio"
+"""
+import argparse
+import asyncio
+import itertools
+import json
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+# 这些事件表示一个请求的响应已经结束
+FINAL_EVENTS = ("run_complete", "rejected", "error", "stats", "pong")
+
+
+class ServerRejected(RuntimeError):
+    """服务端过载，拒绝了请求（准入控制）；调用方可以稍后重试。"""
+
+
+class AgentClient:
+    def __init__(self, path: str | Path | None = None, host: str = "127.0.0.1", port: int | None = None):
+        if path is None and port is None:
+            raise ValueError("需要 unix socket 路径或 TCP 端口")
+        self.path = path
+        self.host = host
+        self.port = port
+        self._ids = itertools.count(1)
+        self._waiters: dict[str, asyncio.Queue] = {}
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._receiver: asyncio.Task | None = None
+
+    async def connect(self) -> "AgentClient":
+        if self.path is not None:
+            self._reader, self._writer = await asyncio.open_unix_connection(str(self.path))
+        else:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._receiver = asyncio.ensure_future(self._receive())
+        return self
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+        if self._receiver is not None:
+            self._receiver.cancel()
+            await asyncio.gather(self._receiver, return_exceptions=True)
+
+    async def __aenter__(self) -> "AgentClient":
+        return await self.connect()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def _receive(self) -> None:
+        try:
+            while line := await self._reader.readline():
+                message = json.loads(line)
+                queue = self._waiters.get(str(message.get("id")))
+                if queue is not None:
+                    queue.put_nowait(message)
+        finally:
+            # 连接断开：唤醒所有仍在等待的请求
+            for queue in self._waiters.values():
+                queue.put_nowait(None)
+
+    async def request(self, payload: dict) -> AsyncIterator[dict]:
+        """发送一个请求，逐条 yield 它的响应，直到结束事件。"""
+        rid = str(next(self._ids))
+        queue = self._waiters[rid] = asyncio.Queue()
+        try:
+            self._writer.write((json.dumps({"id": rid, **payload}, ensure_ascii=False) + "\n").encode("utf-8"))
+            await self._writer.drain()
+            while True:
+                message = await queue.get()
+                if message is None:
+                    raise ConnectionError("与 Agent 服务的连接已断开")
+                yield message
+                if message["event"] in FINAL_EVENTS:
+                    return
+        finally:
+            del self._waiters[rid]
+
+    async def stream(self, task: str, **options: Any) -> AsyncIterator[dict]:
+        async for event in self.request({"task": task, "options": options}):
+            yield event
+
+    async def run(self, task: str, **options: Any) -> dict:
+        """等待任务完成，返回 run_complete 事件；被拒绝时抛 ServerRejected，失败时抛 RuntimeError。"""
+        event = (await self._collect({"task": task, "options": options}))[-1]
+        if event["event"] == "rejected":
+            raise ServerRejected(f"服务端过载（running={event['running']}, queued={event['queued']}）")
+        if event["event"] == "error":
+            raise RuntimeError(event["message"])
+        return event
+
+    async def stats(self) -> dict:
+        return (await self._collect({"op": "stats"}))[-1]
+
+    async def ping(self) -> bool:
+        return (await self._collect({"op": "ping"}))[-1]["event"] == "pong"
+
+    async def _collect(self, payload: dict) -> list[dict]:
+        return [message async for message in self.request(payload)]
+
+
+async def _main(args: argparse.Namespace) -> None:
+    async with AgentClient(path=args.socket, host=args.host, port=args.port) as client:
+        results = await asyncio.gather(*(client.run(task) for task in args.tasks), return_exceptions=True)
+        for task, done in zip(args.tasks, results):
+            if isinstance(done, Exception):
+                print(f"任务失败：{task}（{done}）")
+            else:
+                print(f"任务完成：{task}（{done['total_time']:.2f}s）\n{done['final_result']}\n")
+        if args.stats:
+            print(json.dumps(await client.stats(), ensure_ascii=False, indent=2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Agent 服务客户端")
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", type=Path, help="unix socket 路径")
+    where.add_argument("--port", type=int, help="TCP 端口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--stats", action="store_true", help="完成后打印服务端统计")
+    parser.add_argument("tasks", nargs="+")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+deadline.py
+
+端到端时间预算：调用方为一次 run 给出总时限，规划 / 各 step 的工具调用 / 反思补救都从同一个 `Deadline` 取预算，
+剩余时间逐层传入每一个 `asyncio.wait_for`，因此最坏延迟由总时限约束，而不是 step 数 ×（工具超时 + 补救超时）。
+
+- `budget(cap, reserve)`：本阶段可用的时间，不超过 `cap`，并为后续阶段预留 `reserve` 秒（剩余不足时不再预留）
+- `share(fraction)`：总时限的一部分，用于给规划 / 反思阶段划定份额
+- 不限时（`Deadline(None)`）时所有方法退化为原有行为：`budget(cap)` 原样返回 cap
+
+    deadline = Deadline(2.0)
+    res = await call_tool("tech", task, timeout=TOOL_TIMEOUT, budget=deadline.budget())
+"""
+import asyncio
+import math
+import time
+
+# 规划阶段最多使用的总时限份额（LLM 规划超出后退回静态计划）
+PLAN_BUDGET_SHARE = 0.2
+# 执行阶段为反思 / 补救预留的总时限份额
+REFLECTION_BUDGET_SHARE = 0.15
+# 剩余预算低于该值（秒）或低于补救工具的平均延迟时跳过补救
+MIN_SUPPLEMENT_BUDGET = 0.05
+# step 整体的硬超时在剩余预算之外额外允许的时间（秒），只用于兜底
+DEADLINE_GRACE = 0.05
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """工具调用因总时限（而非工具自身的超时）被截断；不计入工具健康状况与负缓存。"""
+
+
+class Deadline:
+    """一次 run 的总时间预算（monotonic 时钟）。"""
+
+    def __init__(self, seconds: float | None = None):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.expires_at = self.started + seconds if seconds is not None else None
+
+    @property
+    def bounded(self) -> bool:
+        return self.expires_at is not None
+
+    def remaining(self) -> float:
+        if self.expires_at is None:
+            return math.inf
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def share(self, fraction: float) -> float:
+        return self.seconds * fraction if self.seconds is not None else 0.0
+
+    def budget(self, cap: float | None = None, reserve: float = 0.0) -> float | None:
+        """本阶段可用的时间（秒）；不限时返回 cap。"""
+        if self.expires_at is None:
+            return cap
+        left = self.remaining()
+        available = left - reserve if left > reserve else left
+        return available if cap is None else min(cap, available)
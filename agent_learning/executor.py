@@ -0,0 +1,119 @@
+"""
+executor.py
+
+单个 step 内候选工具的执行策略：
+- "all"：等待全部候选工具（原有行为）
+- "first_good"：同时启动全部候选，按完成顺序收集结果，
+  一旦出现“足够好”的结果就取消其余仍在等待的调用
+- "hedged"：先只启动首选工具；若它在历史延迟分位数内没有返回，
+  再启动下一个候选作为备份（对冲），同样在得到足够好的结果后提前返回
+
+历史延迟取自工具描述符的 `ToolHealth`：它只由 `_execute` 中的真实执行更新，
+缓存 / 预取 / 备忘中已完成的结果不会把分位数拉低。
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from agent_learning.tool_registry import TOOLS
+
+EXEC_MODES = ("all", "first_good", "hedged")
+
+# 对冲：首选工具超过其历史延迟的该分位数仍未返回时启动备份
+HEDGE_PERCENTILE = 0.95
+# 历史样本不足（或不是已注册工具）时使用的对冲等待时间（秒）
+DEFAULT_HEDGE_DELAY = 1.0
+
+ToolCall = tuple[str, Callable[[], Awaitable[Any]]]
+
+
+def hedge_delay(tool: str) -> float:
+    descriptor = TOOLS.get(tool)
+    delay = descriptor.health.latency_percentile(HEDGE_PERCENTILE) if descriptor is not None else None
+    return DEFAULT_HEDGE_DELAY if delay is None else delay
+
+
+async def execute_tools(
+    calls: list[ToolCall],
+    mode: str = "all",
+    good_enough: Callable[[Any], bool] | None = None,
+    on_result: Callable[[str, Any], None] | None = None,
+) -> tuple[list[tuple[str, Any]], list[str]]:
+    """
+    按 `mode` 执行候选工具调用；`on_result(工具名, 结果或异常)` 在每个调用完成时立即回调。
+    返回 ((工具名, 结果或异常) 列表, 被提前取消的工具名列表)；
+    "all" 模式按调用顺序排列结果，其余模式按完成顺序排列。
+    """
+    if mode not in EXEC_MODES:
+        raise ValueError(f"未知的执行模式：{mode}")
+
+    if mode == "all" or good_enough is None:
+        async def notify(name: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+            try:
+                res = await fn()
+            except Exception as e:
+                if on_result:
+                    on_result(name, e)
+                raise
+            if on_result:
+                on_result(name, res)
+            return res
+
+        results = await asyncio.gather(*(notify(name, fn) for name, fn in calls), return_exceptions=True)
+        return [(name, res) for (name, _), res in zip(calls, results)], []
+
+    queue = list(calls)
+    running: dict[asyncio.Task, tuple[str, float]] = {}
+    completed: list[tuple[str, Any]] = []
+    last_launch = 0.0
+
+    def launch() -> None:
+        nonlocal last_launch
+        name, fn = queue.pop(0)
+        last_launch = time.perf_counter()
+        running[asyncio.ensure_future(fn())] = (name, last_launch)
+
+    if mode == "first_good":
+        while queue:
+            launch()
+    else:
+        launch()
+
+    try:
+        while running:
+            timeout = None
+            if mode == "hedged" and queue:
+                newest = max(running.values(), key=lambda item: item[1])[0]
+                timeout = max(0.0, last_launch + hedge_delay(newest) - time.perf_counter())
+
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                launch()  # 对冲：首选工具过慢，启动备份
+                continue
+
+            satisfied = False
+            for fut in done:
+                name, _ = running.pop(fut)
+                if fut.cancelled():
+                    res: Any = asyncio.CancelledError()
+                elif fut.exception() is not None:
+                    res = fut.exception()
+                else:
+                    res = fut.result()
+                completed.append((name, res))
+                if on_result:
+                    on_result(name, res)
+                satisfied = satisfied or good_enough(res)
+
+            if satisfied:
+                break
+            if mode == "hedged" and queue and not running:
+                launch()  # 已启动的都不理想，立即尝试下一个
+    finally:
+        stragglers = [name for name, _ in running.values()]
+        for fut in running:
+            fut.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    return completed, stragglers
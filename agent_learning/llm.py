@@ -1,9 +1,157 @@
 # llm.py
-"""简要：模拟异步调用 LLM 的接口，用于本地调试与测试。"""
+"""
+简要：模拟异步调用 LLM 的接口，用于本地调试与测试。
+
+- `call_llm`：单条 prompt，一次往返（延迟 1 秒）
+- `LocalBatchBackend`：支持批量的本地替身后端，一次往返处理一批 prompt，
+  并发连接数有限（模拟真实服务的容量）
+- `LLMBatcher`：微批前端，把时间窗口内到达的请求（或攒满 `max_batch_size` 条）
+  合并成一次后端调用，再把结果分发回各个等待中的协程；支持单请求超时与取消
+"""
 import asyncio
+from typing import Awaitable, Callable
+
+from agent_learning.rate_limit import InflightLimiter
 
 
 async def call_llm(prompt: str) -> str:
     """异步模拟：接收 `prompt` 并返回模拟回复（延迟 1 秒）。"""
     await asyncio.sleep(1)
     return f"【模拟 LLM 回复】针对：{prompt}"
+
+
+BatchBackend = Callable[[list[str]], Awaitable[list[str]]]
+
+
+class LocalBatchBackend:
+    """
+    本地替身批量后端：每次调用耗时 `rtt + per_item * 批大小`，
+    同时最多 `max_concurrency` 个调用在途（超出的排队），返回与输入一一对应的回复。
+    """
+
+    def __init__(self, rtt: float = 1.0, per_item: float = 0.002, max_concurrency: int = 4):
+        self.rtt = rtt
+        self.per_item = per_item
+        self.calls = 0
+        self.prompts = 0
+        self._inflight = InflightLimiter(max_concurrency)
+
+    async def __call__(self, prompts: list[str]) -> list[str]:
+        await self._inflight.acquire()
+        try:
+            self.calls += 1
+            self.prompts += len(prompts)
+            await asyncio.sleep(self.rtt + self.per_item * len(prompts))
+            return [f"【模拟 LLM 回复】针对：{p}" for p in prompts]
+        finally:
+            self._inflight.release()
+
+
+# 默认 LLM 后端（本地替身）
+LLM_BACKEND = LocalBatchBackend()
+
+
+class LLMBatcher:
+    """
+    微批前端：
+    - 第一个请求到达时开启 `window` 秒的收集窗口，窗口结束或攒满 `max_batch_size` 条即发送
+    - 每批只调用一次后端，结果按顺序分发给等待者；后端异常传递给该批全部请求
+    - 单个请求超时 / 取消只影响它自己：尚未发送时直接从批中移除，已发送时丢弃其结果
+    """
+
+    def __init__(
+        self,
+        backend: BatchBackend | None = None,
+        window: float = 0.01,
+        max_batch_size: int = 32,
+        timeout: float | None = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size 必须 >= 1")
+        self.backend = backend if backend is not None else LLM_BACKEND
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._sending: set[asyncio.Task] = set()
+
+        self.requests = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.cancelled = 0
+
+    async def submit(self, prompt: str, timeout: float | None = None) -> str:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 旧事件循环遗留的批次与定时器不能跨循环使用
+            self._pending, self._timer, self._loop = [], None, loop
+
+        fut = loop.create_future()
+        self._pending.append((prompt, fut))
+        self.requests += 1
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            self.cancelled += 1
+            raise
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # 已超时 / 取消的请求不再发送
+        batch = [(p, f) for p, f in self._pending if not f.done()]
+        self._pending = []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._send(batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.batched_requests += len(batch)
+        try:
+            replies = await self.backend([p for p, _ in batch])
+            if len(replies) != len(batch):
+                raise RuntimeError(f"批量后端返回 {len(replies)} 条回复，期望 {len(batch)} 条")
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), reply in zip(batch, replies):
+            if not fut.done():
+                fut.set_result(reply)
+
+    async def flush(self) -> None:
+        """立即发送当前批次并等待所有在途批次完成。"""
+        self._flush()
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+            "cancelled": self.cancelled,
+        }
+
+
+# 进程级默认微批前端
+LLM_BATCHER = LLMBatcher()
+
+
+async def call_llm_batched(prompt: str, timeout: float | None = None) -> str:
+    """与 `call_llm` 相同的接口，经 `LLM_BATCHER` 合并后发送给批量后端。"""
+    return await LLM_BATCHER.submit(prompt, timeout)
@@ -0,0 +1,217 @@
+"""
+log_sink.py
+
+决策日志 / 指标的输出端（sink），所有磁盘 I/O 都不在事件循环线程中执行：
+- `JsonLinesSink`（默认，`DEFAULT_LOG_SINK` 为进程内共用的 `logs/decisions.jsonl`）：所有 run 共用一个
+  JSON-lines 文件，记录产生时即入队，由后台线程批量写入，按大小轮转，可选 gzip 压缩；单个 run 不在内存中累积日志
+- `PerTraceJsonSink`：兼容旧格式，每个 trace 一个 `decision_<trace>.json` 与 `metrics_<trace>.json`，
+  run 结束时在线程池中写出；需要时通过 `run_agent(..., log_sink=PerTraceJsonSink(...))` 选用
+
+记录可以是 dict，也可以是 `decision_log.DecisionRecord`（紧凑表示，写出时才转换为 dict）。
+"""
+import asyncio
+import gzip
+import json
+import queue
+import shutil
+import threading
+import time
+import weakref
+from pathlib import Path
+
+from agent_learning.decision_log import DecisionBuffer, DecisionLog, DecisionRecord, as_dict, record_trace_id
+
+LOGS_DIR = Path(__file__).resolve().parent / "logs"
+
+
+class LogSink:
+    """sink 接口：`emit` 必须是非阻塞的；`close_trace` 在 run 结束时调用。"""
+
+    def emit(self, record: dict | DecisionRecord) -> None:
+        raise NotImplementedError
+
+    def decision_log(self, trace_id: str) -> DecisionLog | DecisionBuffer:
+        """run 开始时调用，返回该 run 的决策记录器；默认逐条生成紧凑记录交给 `emit`。"""
+        return DecisionLog(trace_id, self.emit)
+
+    async def close_trace(self, trace_id: str, metrics: dict) -> tuple[Path | None, Path | None]:
+        """返回 (决策日志路径, 指标路径)。"""
+        raise NotImplementedError
+
+    def abort_trace(self, trace_id: str) -> None:
+        """run 异常中止时调用，丢弃该 trace 尚未落盘的状态。"""
+
+
+class PerTraceJsonSink(LogSink):
+    def __init__(self, logs_dir: str | Path = LOGS_DIR):
+        self.logs_dir = Path(logs_dir)
+        self._buffers: dict[str, list[dict | DecisionRecord]] = {}
+        # run 内的决策记录以列式缓冲，run 结束写出时才展开为 dict
+        self._columns: dict[str, DecisionBuffer] = {}
+
+    def emit(self, record: dict | DecisionRecord) -> None:
+        self._buffers.setdefault(record_trace_id(record), []).append(record)
+
+    def decision_log(self, trace_id: str) -> DecisionBuffer:
+        buffer = self._columns[trace_id] = DecisionBuffer(trace_id)
+        return buffer
+
+    def _write(
+        self, trace_id: str, columns: DecisionBuffer | None, records: list[dict | DecisionRecord], metrics: dict,
+    ) -> tuple[Path, Path]:
+        self.logs_dir.mkdir(parents=True, exist_ok=True)
+        entries = columns.to_dicts() if columns is not None else []
+        entries.extend(as_dict(r) for r in records)
+        decision_path = self.logs_dir / f"decision_{trace_id}.json"
+        with decision_path.open("w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+        metrics_path = self.logs_dir / f"metrics_{trace_id}.json"
+        with metrics_path.open("w", encoding="utf-8") as f:
+            json.dump(metrics, f, ensure_ascii=False, indent=2)
+        return decision_path, metrics_path
+
+    async def close_trace(self, trace_id: str, metrics: dict) -> tuple[Path | None, Path | None]:
+        columns = self._columns.pop(trace_id, None)
+        records = self._buffers.pop(trace_id, [])
+        return await asyncio.to_thread(self._write, trace_id, columns, records, metrics)
+
+    def abort_trace(self, trace_id: str) -> None:
+        self._columns.pop(trace_id, None)
+        self._buffers.pop(trace_id, None)
+
+
+class JsonLinesSink(LogSink):
+    """
+    后台线程写 JSON-lines：
+    - `emit` 只做一次入队；队列满时丢弃记录并计入 `dropped`，绝不阻塞事件循环
+    - 每 `batch_size` 条或每 `flush_interval` 秒写入并 flush 一次
+    - 文件超过 `max_bytes` 时轮转为 `<name>.<时间戳>.jsonl[.gz]`，保留最近 `backups` 个
+    指标以 `{"kind": "metrics", ...}` 记录写入同一文件。
+    """
+
+    CLOSE_TIMEOUT = 5.0
+
+    def __init__(
+        self,
+        path: str | Path = LOGS_DIR / "decisions.jsonl",
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        max_bytes: int = 64 * 1024 * 1024,
+        backups: int = 5,
+        compress: bool = False,
+        max_queue: int = 100_000,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.compress = compress
+        self.dropped = 0
+        self.written = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stop = object()
+        self._closed = False
+        self._writer = threading.Thread(target=self._writer_loop, name="JsonLinesSink", daemon=True)
+        self._writer.start()
+        self._finalizer = weakref.finalize(self, JsonLinesSink._close_at_exit, weakref.ref(self))
+
+    def emit(self, record: dict | DecisionRecord) -> None:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    async def close_trace(self, trace_id: str, metrics: dict) -> tuple[Path | None, Path | None]:
+        self.emit({"kind": "metrics", **metrics})
+        return self.path, self.path
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """阻塞到此前入队的记录都已写入文件（测试 / 进程退出前使用，不要在事件循环中调用）；超时返回 False。"""
+        if not self._writer.is_alive():
+            return False
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._finalizer.detach()
+        # 写线程已经退出（例如磁盘错误）时队列不会再被消费，放哨兵可能永远阻塞
+        if not self._writer.is_alive():
+            return
+        try:
+            self._queue.put(self._stop, timeout=self.CLOSE_TIMEOUT)
+        except queue.Full:
+            return
+        self._writer.join(self.CLOSE_TIMEOUT)
+
+    def __enter__(self) -> "JsonLinesSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---------------- 后台线程 ----------------
+
+    def _writer_loop(self) -> None:
+        f = self.path.open("a", encoding="utf-8")
+        try:
+            stopping = False
+            while not stopping:
+                batch = []
+                flushed: threading.Event | None = None
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is self._stop:
+                        stopping = True
+                        break
+                    if isinstance(item, threading.Event):
+                        flushed = item  # flush() 的标记：写完本批后通知
+                        break
+                    batch.append(item)
+                if batch:
+                    f.write("".join(json.dumps(as_dict(r), ensure_ascii=False) + "\n" for r in batch))
+                    f.flush()
+                    self.written += len(batch)
+                if flushed is not None:
+                    flushed.set()
+                if batch and f.tell() >= self.max_bytes:
+                    f.close()
+                    self._rotate()
+                    f = self.path.open("a", encoding="utf-8")
+        finally:
+            f.close()
+
+    def _rotate(self) -> None:
+        stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{time.time_ns() % 1_000_000:06d}"
+        rotated = self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}")
+        self.path.rename(rotated)
+        if self.compress:
+            with rotated.open("rb") as src, gzip.open(f"{rotated}.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            rotated.unlink()
+        old = sorted(self.path.parent.glob(f"{self.path.stem}.*{self.path.suffix}*"))
+        for stale in old[:-self.backups] if self.backups else old:
+            stale.unlink(missing_ok=True)
+
+    @staticmethod
+    def _close_at_exit(ref: "weakref.ref[JsonLinesSink]") -> None:
+        sink = ref()
+        if sink is not None:
+            sink.close()
+
+
+# 进程级共享：未指定 log_sink 的 run 都写入同一个 JSON-lines 文件，退出时由 finalizer 写完剩余记录
+DEFAULT_LOG_SINK: LogSink = JsonLinesSink()
@@ -1,26 +1,32 @@
 # main.py
 import asyncio
-from agent_learning.agent import run_agent
+from agent_learning.batch import BatchStats, run_agents
+from agent_learning.cache import REVALIDATOR
+from agent_learning.task import Task
 
 async def main():
-    """主函数，启动三个并发的Agent任务并处理结果。
+    """主函数，批量启动三个Agent任务并按完成顺序处理结果。
 
-    该函数创建三个异步任务，分别请求Agent解释'Agent'、'async'和'asyncio'的概念，
-    使用asyncio.gather并发执行所有任务，并在所有任务完成后打印结果。
+    该函数创建三个Task，分别请求Agent解释'Agent'、'async'和'asyncio'的概念，
+    通过run_agents以受限并发执行，每完成一个任务就立即打印结果，最后输出吞吐统计。
     """
-    # 定义三个并发执行的Agent任务，每个任务处理不同的查询请求
+    # 定义三个Agent任务，每个任务处理不同的查询请求
     tasks = [
-        run_agent("解释什么是 Agent"),
-        run_agent("解释什么是 async"),
-        run_agent("解释什么是 asyncio")
+        Task("1", "解释什么是 Agent"),
+        Task("2", "解释什么是 async"),
+        Task("3", "解释什么是 asyncio"),
     ]
 
-    # 并发执行所有任务并等待结果返回
-    results = await asyncio.gather(*tasks)
+    # 以受限并发执行所有任务，按完成顺序返回
+    stats = BatchStats()
+    async for task in run_agents(tasks, concurrency=8, stats=stats):
+        print(task.result)
+
+    # stale 结果的后台刷新在本事件循环中运行，退出前等待它们写回
+    await REVALIDATOR.wait()
 
     print("\n=== 所有任务完成 ===")
-    for r in results:
-        print(r)
+    print(stats.summary())
 
 if __name__ == "__main__":
     asyncio.run(main())
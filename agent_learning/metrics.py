@@ -0,0 +1,286 @@
+"""
+metrics.py
+
+运行期指标采集：在 run 执行过程中直接记录，而不是事后扫描 decision_log。
+- `RunMetrics`：单次 run 的指标，结束时写入 `logs/metrics_<trace>.json`
+- `METRICS`：进程级聚合（所有 run 合并），可导出 Prometheus 文本格式
+
+计数器与直方图都以 (名称, 标签) 为 key，直方图使用固定分桶，便于跨 run / 跨进程合并。
+"""
+import time
+from typing import Iterable
+
+# 延迟直方图分桶上界（秒），最后一个桶为 +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0)
+
+LabelKey = tuple[str, tuple[tuple[str, str], ...]]
+
+
+def _key(name: str, labels: dict[str, str]) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def merge(self, other: "Histogram") -> None:
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+
+    def percentile(self, q: float) -> float:
+        """在所在桶内线性插值估算分位数（桶边界收紧到观测到的 min / max）。"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        lower = self.min
+        for i, c in enumerate(self.counts):
+            upper = min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+            if c and seen + c >= target:
+                lower = max(lower, self.buckets[i - 1] if i else self.min)
+                return lower + (upper - lower) * (target - seen) / c
+            seen += c
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "buckets": list(self.buckets), "counts": list(self.counts),
+            "count": self.count, "sum": self.sum,
+            "min": self.min if self.count else None, "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        hist = cls(data["buckets"])
+        hist.counts = list(data["counts"])
+        hist.count = data["count"]
+        hist.sum = data["sum"]
+        hist.min = data["min"] if data.get("min") is not None else float("inf")
+        hist.max = data.get("max", 0.0)
+        return hist
+
+
+class MetricSet:
+    """带标签的计数器与直方图集合。"""
+
+    def __init__(self):
+        self.counters: dict[LabelKey, float] = {}
+        self.histograms: dict[LabelKey, Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = _key(name, labels)
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram()
+        hist.observe(value)
+
+    def counter(self, name: str, **labels: str) -> float:
+        """返回与给定标签匹配的所有计数之和（未指定的标签不参与过滤）。"""
+        wanted = {(k, str(v)) for k, v in labels.items()}
+        return sum(
+            value for (n, lbls), value in self.counters.items()
+            if n == name and wanted <= set(lbls)
+        )
+
+    def merge(self, other: "MetricSet") -> None:
+        for key, value in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, hist in other.histograms.items():
+            mine = self.histograms.get(key)
+            if mine is None:
+                mine = self.histograms[key] = Histogram(hist.buckets)
+            mine.merge(hist)
+
+    # ---------------- 序列化（跨进程合并用） ----------------
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": [[name, list(map(list, labels)), value] for (name, labels), value in self.counters.items()],
+            "histograms": [[name, list(map(list, labels)), h.to_dict()] for (name, labels), h in self.histograms.items()],
+        }
+
+    def merge_snapshot(self, data: dict) -> None:
+        other = MetricSet()
+        for name, labels, value in data.get("counters", []):
+            other.counters[(name, tuple(map(tuple, labels)))] = value
+        for name, labels, hist in data.get("histograms", []):
+            other.histograms[(name, tuple(map(tuple, labels)))] = Histogram.from_dict(hist)
+        self.merge(other)
+
+    # ---------------- Prometheus 文本导出 ----------------
+
+    def to_prometheus(self, prefix: str = "agent_") -> str:
+        def fmt_labels(labels: Iterable[tuple[str, str]]) -> str:
+            items = [f'{k}="{v}"' for k, v in labels]
+            return "{" + ",".join(items) + "}" if items else ""
+
+        lines: list[str] = []
+        for name in sorted({n for n, _ in self.counters}):
+            lines.append(f"# TYPE {prefix}{name} counter")
+            for (n, labels), value in sorted(self.counters.items()):
+                if n == name:
+                    lines.append(f"{prefix}{name}{fmt_labels(labels)} {value}")
+        for name in sorted({n for n, _ in self.histograms}):
+            lines.append(f"# TYPE {prefix}{name} histogram")
+            for (n, labels), hist in sorted(self.histograms.items(), key=lambda item: item[0]):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, c in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                    cumulative += c
+                    le = labels + (("le", str(bound)),)
+                    lines.append(f"{prefix}{name}_bucket{fmt_labels(le)} {cumulative}")
+                lines.append(f"{prefix}{name}_sum{fmt_labels(labels)} {hist.sum}")
+                lines.append(f"{prefix}{name}_count{fmt_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+def summarize(metrics: MetricSet, wall_seconds: float) -> dict:
+    """把计数器 / 直方图整理成速率、命中率与分位数。"""
+    steps = metrics.counter("steps_total")
+    calls = metrics.counter("tool_calls_total")
+    tool_seconds = metrics.counter("tool_seconds_total")
+
+    def rate(part: float, whole: float) -> float:
+        return part / whole if whole else 0.0
+
+    def cache_layer(layer: str) -> dict:
+        hits = metrics.counter("cache_lookups_total", layer=layer, result="hit")
+        misses = metrics.counter("cache_lookups_total", layer=layer, result="miss")
+        return {"hits": hits, "misses": misses, "hit_rate": rate(hits, hits + misses)}
+
+    tools = sorted({dict(lbls)["tool"] for n, lbls in metrics.histograms if n == "tool_latency_seconds"})
+    step_hist = metrics.histograms.get(_key("step_latency_seconds", {}))
+    return {
+        "wall_seconds": wall_seconds,
+        "tool_seconds": tool_seconds,
+        "tool_parallelism": rate(tool_seconds, wall_seconds),
+        "steps": steps,
+        "tool_calls": calls,
+        "supplement_rate": rate(metrics.counter("supplements_total"), steps),
+        "timeout_rate": rate(metrics.counter("tool_calls_total", status="timeout"), calls),
+        "error_rate": rate(metrics.counter("tool_calls_total", status="error"), calls),
+        "cache": {
+            "memory": cache_layer("memory"),
+            "persistent": cache_layer("persistent"),
+            "stale_results": metrics.counter("stale_results_total"),
+            "negative_hits": metrics.counter("negative_cache_hits_total"),
+        },
+        "deadline": {
+            "partial_results": metrics.counter("partial_results_total"),
+            "supplements_skipped": metrics.counter("supplements_skipped_total"),
+            "tool_calls_cut": metrics.counter("tool_calls_total", status="deadline"),
+        },
+        "prefetch": {
+            "used": metrics.counter("prefetch_calls_total", result="used"),
+            "wasted": metrics.counter("prefetch_calls_total", result="wasted"),
+            "saved_seconds": metrics.counter("prefetch_saved_seconds_total"),
+        },
+        "step_latency": step_hist.summary() if step_hist else Histogram().summary(),
+        "tool_latency": {
+            tool: metrics.histograms[_key("tool_latency_seconds", {"tool": tool})].summary()
+            for tool in tools
+        },
+    }
+
+
+class RunMetrics(MetricSet):
+    """
+    单次 run 的指标。指标名：
+    - tool_calls_total{tool,status}、tool_latency_seconds{tool}、tool_seconds_total
+    - step_latency_seconds、steps_total、supplements_total
+    - cache_lookups_total{layer,result}（layer: memory / persistent）
+    - stale_results_total（stale-while-revalidate 返回的旧结果）、negative_cache_hits_total
+    - partial_results_total、supplements_skipped_total（总时限不足）
+    - prefetch_calls_total{result}（used / wasted）、prefetch_saved_seconds_total
+    """
+
+    def __init__(self, trace_id: str):
+        super().__init__()
+        self.trace_id = trace_id
+        self.started = time.perf_counter()
+        self.wall_seconds = 0.0
+
+    def record_tool(self, tool: str, seconds: float, status: str) -> None:
+        self.inc("tool_calls_total", tool=tool, status=status)
+        self.inc("tool_seconds_total", seconds)
+        self.observe("tool_latency_seconds", seconds, tool=tool)
+
+    def record_step(self, seconds: float) -> None:
+        self.inc("steps_total")
+        self.observe("step_latency_seconds", seconds)
+
+    def record_cache(self, layer: str, hit: bool) -> None:
+        self.inc("cache_lookups_total", layer=layer, result="hit" if hit else "miss")
+
+    def record_supplement(self) -> None:
+        self.inc("supplements_total")
+
+    def record_prefetch(self, used: bool, saved_seconds: float = 0.0) -> None:
+        """预取调用被 step 消费（节省了已经跑过的那段延迟）或未被使用而取消 / 丢弃。"""
+        self.inc("prefetch_calls_total", result="used" if used else "wasted")
+        if used:
+            self.inc("prefetch_saved_seconds_total", saved_seconds)
+
+    def finish(self) -> None:
+        self.wall_seconds = time.perf_counter() - self.started
+        self.inc("runs_total")
+        self.inc("wall_seconds_total", self.wall_seconds)
+
+    def summary(self) -> dict:
+        """写入 metrics_<trace>.json 的内容。"""
+        return {"trace_id": self.trace_id, **summarize(self, self.wall_seconds)}
+
+
+class MetricsRegistry(MetricSet):
+    """进程级聚合：每个 run 结束时合并进来。"""
+
+    def record_run(self, run: RunMetrics) -> None:
+        self.merge(run)
+
+    def summary(self) -> dict:
+        return {
+            "runs": self.counter("runs_total"),
+            **summarize(self, self.counter("wall_seconds_total")),
+        }
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self.histograms.clear()
+
+
+METRICS = MetricsRegistry()
@@ -1,11 +1,225 @@
 # planner.py
 
-def plan_task(task: str) -> list[str]:
+import json
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from agent_learning.cache import task_fingerprint, unwrap_persisted, wrap_persisted
+from agent_learning.llm import call_llm_batched
+from agent_learning.state import SQLiteState
+from agent_learning.tool_registry import SingleFlight
+
+# 规划器版本：修改 prompt / 解析逻辑时递增，旧版本的缓存计划自动失效
+PLANNER_VERSION = "1"
+PLANNERS = ("static", "llm")
+
+# 计划缓存的默认存活时间（秒）；LLM 回复无法解析时回退的静态计划只缓存较短时间
+DEFAULT_PLAN_TTL = 24 * 3600.0
+DEFAULT_FALLBACK_TTL = 300.0
+
+
+@dataclass(frozen=True)
+class PlanStep:
     """
-    将用户任务拆分为可执行步骤
+    可执行步骤：`depends_on` 为所依赖步骤在计划中的下标
+    """
+    description: str
+    depends_on: tuple[int, ...] = ()
+
+
+def plan_task_graph(task: str) -> list[PlanStep]:
+    """
+    将用户任务拆分为带依赖关系的步骤（DAG）
+    没有依赖的步骤可以被调度器并发执行
     """
     return [
-        "理解问题的通用背景",
-        "分析相关技术原理",
-        "结合工程或项目实践进行说明"
+        PlanStep("理解问题的通用背景"),
+        PlanStep("分析相关技术原理"),
+        PlanStep("结合工程或项目实践进行说明"),
     ]
+
+
+def plan_task(task: str) -> list[str]:
+    """
+    将用户任务拆分为可执行步骤
+    """
+    return [step.description for step in plan_task_graph(task)]
+
+
+# <<================ LLM 规划 =================>>
+
+def build_plan_prompt(task: str) -> str:
+    return (
+        "请把下面的任务拆分为 2~6 个可执行步骤，只输出 JSON 数组，"
+        '每个元素形如 {"description": "步骤描述", "depends_on": [所依赖步骤的下标]}；'
+        "互不依赖的步骤 depends_on 为空数组。\n"
+        f"任务：{task}"
+    )
+
+
+_LIST_ITEM = re.compile(r"^\s*(?:\d+[.、)）]|[-*•])\s*(.+?)\s*$")
+
+
+def parse_plan(reply: str) -> list[PlanStep] | None:
+    """
+    解析 LLM 回复：优先解析 JSON 数组，其次解析编号 / 列表行；无法解析时返回 None。
+    只保留指向更早步骤的依赖，保证结果一定是 DAG。
+    """
+    steps: list[PlanStep] = []
+    start, end = reply.find("["), reply.rfind("]")
+    if 0 <= start < end:
+        try:
+            items = json.loads(reply[start:end + 1])
+        except ValueError:
+            items = None
+        if isinstance(items, list):
+            for i, item in enumerate(items):
+                if isinstance(item, str):
+                    item = {"description": item}
+                if not isinstance(item, dict) or not str(item.get("description", "")).strip():
+                    return None
+                deps = item.get("depends_on") or []
+                steps.append(PlanStep(
+                    str(item["description"]).strip(),
+                    tuple(sorted({d for d in deps if isinstance(d, int) and 0 <= d < i})),
+                ))
+            return steps or None
+
+    for line in reply.splitlines():
+        match = _LIST_ITEM.match(line)
+        if match:
+            steps.append(PlanStep(match.group(1)))
+    return steps or None
+
+
+def _encode(steps: list[PlanStep]) -> list[list]:
+    return [[s.description, list(s.depends_on)] for s in steps]
+
+
+def _decode(data: list[list]) -> tuple[PlanStep, ...]:
+    return tuple(PlanStep(desc, tuple(deps)) for desc, deps in data)
+
+
+class PlanCache:
+    """
+    计划缓存：key 为 规划器版本 + 归一化任务指纹。
+    - 内存层：有界 LRU（dict 查找，微秒级）
+    - 磁盘层（可选）：传入 `path` 时使用 SQLiteState，跨进程 / 跨重启复用
+    条目带 TTL；修改 `version` 即让旧计划全部失效。
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        ttl: float = DEFAULT_PLAN_TTL,
+        max_entries: int = 4096,
+        version: str = PLANNER_VERSION,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = version
+        self.store = SQLiteState(path) if path is not None else None
+        self._memory: OrderedDict[str, tuple[float, tuple[PlanStep, ...], str]] = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key(self, task: str) -> str:
+        return f"plan:{self.version}:{task_fingerprint(task)}"
+
+    def get(self, task: str) -> tuple[list[PlanStep], str] | None:
+        """返回 (步骤, 来源)；来源为写入时的 "llm" / "fallback"。"""
+        key = self._key(task)
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] >= time.monotonic():
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return list(entry[1]), entry[2]
+            del self._memory[key]
+
+        if self.store is not None:
+            stored = self.store.get(key)
+            raw = unwrap_persisted(stored)
+            if raw is not None:
+                steps = _decode(raw["steps"])
+                remaining = stored["ttl"] - (time.time() - stored["stored_at"])
+                self._remember(key, steps, raw["source"], remaining)
+                self.disk_hits += 1
+                return list(steps), raw["source"]
+
+        self.misses += 1
+        return None
+
+    def set(self, task: str, steps: list[PlanStep], source: str, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        key = self._key(task)
+        self._remember(key, tuple(steps), source, ttl)
+        if self.store is not None:
+            self.store.set(key, wrap_persisted({"steps": _encode(steps), "source": source}, ttl))
+
+    def _remember(self, key: str, steps: tuple[PlanStep, ...], source: str, ttl: float) -> None:
+        self._memory[key] = (time.monotonic() + ttl, steps, source)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        """清空内存层（磁盘层通过递增 version 失效）。"""
+        self._memory.clear()
+
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+# 进程级默认计划缓存（仅内存）；需要跨进程 / 跨重启复用时传入带 path 的 PlanCache
+PLAN_CACHE = PlanCache()
+# 同一任务的并发规划只请求一次 LLM
+_PLAN_FLIGHT = SingleFlight()
+
+
+async def plan_task_llm(
+    task: str,
+    cache: PlanCache | None = None,
+    llm: Callable[[str], Awaitable[str]] = call_llm_batched,
+    fallback_ttl: float = DEFAULT_FALLBACK_TTL,
+) -> tuple[list[PlanStep], str]:
+    """
+    请 LLM 拆解任务，返回 (步骤, 来源)：
+    来源为 "cache"（命中计划缓存）/ "llm"（解析成功）/ "fallback"（调用失败或无法解析，退回静态计划）
+    默认经进程级 `LLM_BATCHER` 发送：并发 run 的规划请求在收集窗口内合并为一次批量调用。
+    """
+    cache = cache if cache is not None else PLAN_CACHE
+    cached = cache.get(task)
+    if cached is not None:
+        return cached[0], "cache"
+
+    async def ask() -> tuple[list[PlanStep], str]:
+        try:
+            steps = parse_plan(await llm(build_plan_prompt(task)))
+        except Exception:
+            steps = None
+        if steps:
+            cache.set(task, steps, "llm")
+            return steps, "llm"
+        steps = plan_task_graph(task)
+        cache.set(task, steps, "fallback", ttl=fallback_ttl)
+        return steps, "fallback"
+
+    steps, source = await _PLAN_FLIGHT.do((id(cache), cache._key(task)), ask)
+    return list(steps), source
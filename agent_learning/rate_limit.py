@@ -0,0 +1,112 @@
+"""
+rate_limit.py
+
+工具级限流原语：
+- `TokenBucket`：令牌桶，限制每秒调用次数（允许 burst 突发）
+- `InflightLimiter`：限制同时在途的调用数
+- `ToolLimiter`：二者组合，`async with limiter:` 包住一次真实调用
+
+这些原语不绑定事件循环（不使用 asyncio.Semaphore），
+因此模块级实例可以在多次 `asyncio.run` 之间复用。
+"""
+import asyncio
+import contextlib
+import time
+from collections import deque
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ToolLimits:
+    """在 registry 中为工具声明的限流参数；None 表示不限制。"""
+    rate: float | None = None          # 每秒令牌数
+    burst: int = 1                     # 令牌桶容量
+    max_inflight: int | None = None    # 最大在途调用数
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class InflightLimiter:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.inflight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        if self.inflight < self.limit and not self._waiters:
+            self.inflight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut  # release() 把名额直接转交给我们
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()  # 名额已转交但调用方已放弃，继续传给下一个
+            else:
+                # 被取消后、恢复执行前 release() 可能已经把这个 future 弹出队列
+                with contextlib.suppress(ValueError):
+                    self._waiters.remove(fut)
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.inflight -= 1
+
+
+class ToolLimiter:
+    """组合在途上限与令牌桶：先占在途名额，再取令牌。"""
+
+    def __init__(self, limits: ToolLimits):
+        self.limits = limits
+        self.bucket = TokenBucket(limits.rate, limits.burst) if limits.rate else None
+        self.inflight = InflightLimiter(limits.max_inflight) if limits.max_inflight else None
+
+    async def __aenter__(self) -> "ToolLimiter":
+        if self.inflight:
+            await self.inflight.acquire()
+        if self.bucket:
+            try:
+                await self.bucket.acquire()
+            except BaseException:
+                if self.inflight:
+                    self.inflight.release()
+                raise
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self.inflight:
+            self.inflight.release()
+
+    def stats(self) -> dict:
+        return {
+            "inflight": self.inflight.inflight if self.inflight else None,
+            "queued": self.inflight.queued if self.inflight else 0,
+        }
@@ -0,0 +1,75 @@
+"""
+scheduler.py
+
+按依赖关系（DAG）调度 Planner 产出的步骤：
+所有依赖已完成的步骤会被同时启动，结果按计划顺序返回。
+"""
+import asyncio
+from typing import Awaitable, Callable, Sequence, TypeVar
+
+from agent_learning.planner import PlanStep
+
+T = TypeVar("T")
+
+
+def _check_graph(steps: Sequence[PlanStep]) -> None:
+    """校验依赖下标合法且不存在环，否则抛出 ValueError。"""
+    n = len(steps)
+    indegree = [0] * n
+    for idx, step in enumerate(steps):
+        # 手工构造的 PlanStep 可能重复列出同一依赖；每个依赖只在完成时减一次入度
+        for dep in set(step.depends_on):
+            if not 0 <= dep < n or dep == idx:
+                raise ValueError(f"步骤 {idx} 的依赖下标非法：{dep}")
+            indegree[idx] += 1
+
+    ready = [i for i in range(n) if indegree[i] == 0]
+    visited = 0
+    while ready:
+        cur = ready.pop()
+        visited += 1
+        for idx, step in enumerate(steps):
+            if cur in step.depends_on:
+                indegree[idx] -= 1
+                if indegree[idx] == 0:
+                    ready.append(idx)
+    if visited != n:
+        raise ValueError("计划中存在循环依赖")
+
+
+async def run_dag(
+    steps: Sequence[PlanStep],
+    run_step: Callable[[int, PlanStep], Awaitable[T]],
+) -> list[T]:
+    """
+    并发执行所有“就绪”的步骤，返回与 `steps` 顺序一致的结果列表。
+    任一步骤抛出异常时，取消其余正在运行的步骤并向上抛出。
+    """
+    _check_graph(steps)
+
+    results: list = [None] * len(steps)
+    waiting = {idx: set(step.depends_on) for idx, step in enumerate(steps)}
+    running: dict[asyncio.Task, int] = {}
+
+    def start_ready() -> None:
+        for idx in [i for i, deps in waiting.items() if not deps]:
+            del waiting[idx]
+            running[asyncio.ensure_future(run_step(idx, steps[idx]))] = idx
+
+    start_ready()
+    try:
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                idx = running.pop(fut)
+                results[idx] = fut.result()
+                for deps in waiting.values():
+                    deps.discard(idx)
+            start_ready()
+    finally:
+        for fut in running:
+            fut.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    return results
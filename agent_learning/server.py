@@ -0,0 +1,322 @@
+"""
+server.py
+
+常驻的 Agent 服务：一个进程、一个事件循环持续接收任务，而不是每个任务启动一次 main.py。
+跨请求保持热状态：内存缓存（`BoundedCache`）、持久化 store（`SQLiteState` 只打开一次）、
+计划缓存、工具描述符与执行池、进程级 `METRICS`，以及可选的 `ToolPolicy`。
+
+协议为 JSON lines（每行一个 JSON 对象），同一连接上可以同时有多个请求，响应按 `id` 区分：
+
+    请求  {"id": "1", "task": "解释什么是 asyncio", "options": {"deadline": 2.0}}
+          {"id": "2", "op": "stats"}      {"id": "3", "op": "ping"}
+    响应  run_agent_stream 的每个事件带上请求的 id 逐条写回，以 run_complete 结束；
+          过载时 {"id": ..., "event": "rejected", "reason": "overloaded", ...}，
+          请求不合法 / run 失败时 {"id": ..., "event": "error", "message": ...}
+
+准入控制：最多 `max_concurrency` 个 run 同时执行，另有最多 `max_queue` 个请求排队等待；
+两者都满时新请求立即被拒绝，而不是无限排队拖慢所有请求。
+客户端断开后，它已提交的请求仍会跑完（结果进入缓存），只是不再写回。
+
+    python -m agent_learning.server --socket /tmp/agent.sock --state logs/state.db
+    python -m agent_learning.server --port 8765
+    python -m agent_learning.server --stdio < requests.jsonl     # 响应写到 stdout，日志输出改到 stderr
+
+客户端见 `client.py`；与一次性进程的对比：`python -m agent_learning.benchmarks.server_bench`。
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from agent_learning.agent import run_agent_stream
+from agent_learning.cache import DEFAULT_CACHE_TTL, REVALIDATOR, BoundedCache
+from agent_learning.log_sink import JsonLinesSink, LogSink
+from agent_learning.metrics import METRICS, Histogram, MetricSet
+from agent_learning.state import SQLiteState
+from agent_learning.tool_policy import ToolPolicy
+from agent_learning.tool_pools import pool_stats
+
+# 请求可以逐个覆盖的 run_agent_stream 参数；缓存 / store / sink 等热状态由服务端统一持有
+REQUEST_OPTIONS = ("exec_mode", "planner", "deadline", "prefetch", "similarity_threshold")
+
+Send = Callable[[dict], Awaitable[None]]
+
+
+def encode(message: dict) -> bytes:
+    return (json.dumps(message, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+class AgentServer:
+    """
+    持有跨请求的热状态并执行请求；传输层（unix socket / TCP / stdio）只负责读写 JSON lines。
+    `options` 是所有请求的默认 run_agent_stream 参数。
+    """
+
+    def __init__(
+        self,
+        state_path: str | Path | None = None,
+        max_concurrency: int = 16,
+        max_queue: int = 64,
+        cache_ttl: float | None = DEFAULT_CACHE_TTL,
+        log_sink: LogSink | None = None,
+        tool_policy: ToolPolicy | None = None,
+        **options: Any,
+    ):
+        if max_concurrency < 1 or max_queue < 0:
+            raise ValueError("max_concurrency 必须 >= 1，max_queue 必须 >= 0")
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.store = SQLiteState(state_path) if state_path is not None else None
+        self.cache = BoundedCache(ttl=cache_ttl)
+        self.log_sink = log_sink
+        self.tool_policy = tool_policy
+        self.options = options
+        self.metrics = MetricSet()
+        self.running = 0
+        self.queued = 0
+        self.started = time.perf_counter()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._inflight: set[asyncio.Task] = set()
+        self._closing = False
+
+    # ---------------- 请求处理 ----------------
+
+    def admit(self) -> bool:
+        """执行槽与等待队列都满（或正在关闭）时拒绝新请求。"""
+        return not self._closing and self.running + self.queued < self.max_concurrency + self.max_queue
+
+    def submit(self, request: dict, send: Send) -> asyncio.Task:
+        """在后台处理一个请求；服务关闭时会等待这些任务完成。"""
+        task = asyncio.ensure_future(self.handle(request, send))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+        return task
+
+    async def handle(self, request: dict, send: Send) -> None:
+        rid = request.get("id")
+        op = request.get("op", "run")
+        if op == "ping":
+            await send({"id": rid, "event": "pong"})
+            return
+        if op == "stats":
+            await send({"id": rid, "event": "stats", **self.stats()})
+            return
+        task = request.get("task")
+        options = request.get("options") or {}
+        if op != "run" or not isinstance(task, str) or not task.strip():
+            await self._reject(send, rid, "error", message=f"无效请求：需要非空的 task（op={op!r}）")
+            return
+        if not isinstance(options, dict) or set(options) - set(REQUEST_OPTIONS):
+            await self._reject(send, rid, "error", message=f"不支持的 options，可选 {REQUEST_OPTIONS}")
+            return
+        if not self.admit():
+            await self._reject(send, rid, "rejected", reason="overloaded",
+                               running=self.running, queued=self.queued)
+            return
+
+        received = time.perf_counter()
+        self.metrics.inc("server_requests_total", result="accepted")
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        self.metrics.observe("server_queue_seconds", time.perf_counter() - received)
+        try:
+            async for event in run_agent_stream(
+                task,
+                persistent_state=self.store,
+                cache=self.cache,
+                log_sink=self.log_sink,
+                tool_policy=self.tool_policy,
+                **{**self.options, **options},
+            ):
+                await send({"id": rid, **event})
+            self.metrics.inc("server_requests_total", result="completed")
+        except Exception as e:
+            self.metrics.inc("server_requests_total", result="failed")
+            await send({"id": rid, "event": "error", "message": f"{type(e).__name__}: {e}"})
+        finally:
+            self.running -= 1
+            self._slots.release()
+            self.metrics.observe("server_request_seconds", time.perf_counter() - received)
+
+    async def _reject(self, send: Send, rid: Any, event: str, **fields: Any) -> None:
+        self.metrics.inc("server_requests_total", result=event)
+        await send({"id": rid, "event": event, **fields})
+
+    def stats(self) -> dict:
+        def hist(name: str) -> dict:
+            return self.metrics.histograms.get((name, ()), Histogram()).summary()
+
+        def requests(result: str) -> float:
+            return self.metrics.counter("server_requests_total", result=result)
+
+        return {
+            "server": {
+                "uptime_s": time.perf_counter() - self.started,
+                "running": self.running,
+                "queued": self.queued,
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                **{result: requests(result) for result in ("accepted", "completed", "failed", "rejected", "error")},
+                "queue_latency": hist("server_queue_seconds"),
+                "request_latency": hist("server_request_seconds"),
+            },
+            "agent": METRICS.summary(),
+            "memory_cache": self.cache.stats(),
+            "tool_pools": pool_stats(used_only=True),
+            **({"tool_policy": self.tool_policy.stats()} if self.tool_policy is not None else {}),
+        }
+
+    # ---------------- 传输 ----------------
+
+    async def serve_lines(
+        self, readline: Callable[[], Awaitable[bytes]], write: Callable[[bytes], Awaitable[None]],
+    ) -> None:
+        """
+        处理一条 JSON-lines 连接直到 EOF：每行一个请求，在后台并发处理，
+        响应经同一把锁写回（各行不会交错）。EOF 后等待该连接的请求全部完成。
+        """
+        lock = asyncio.Lock()
+        closed = False
+        pending: set[asyncio.Task] = set()
+
+        async def send(message: dict) -> None:
+            nonlocal closed
+            if closed:
+                return
+            async with lock:
+                try:
+                    await write(encode(message))
+                except (ConnectionError, BrokenPipeError):
+                    closed = True
+
+        while True:
+            try:
+                line = await readline()
+            except (ConnectionError, ValueError):
+                break  # 连接被重置 / 单行超出读取上限
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("请求必须是 JSON 对象")
+            except ValueError as e:
+                await send({"id": None, "event": "error", "message": f"无法解析的请求：{e}"})
+                continue
+            task = self.submit(request, send)
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _serve_stream(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        async def write(data: bytes) -> None:
+            writer.write(data)
+            await writer.drain()
+
+        try:
+            await self.serve_lines(reader.readline, write)
+        finally:
+            writer.close()
+            with contextlib.suppress(Exception):
+                await writer.wait_closed()
+
+    async def start(self, path: str | Path | None = None, host: str = "127.0.0.1",
+                    port: int | None = None) -> asyncio.AbstractServer:
+        """监听 unix socket（`path`）或 TCP（`host:port`，port=0 时由系统分配）。"""
+        if path is not None:
+            return await asyncio.start_unix_server(self._serve_stream, path=str(path))
+        return await asyncio.start_server(self._serve_stream, host=host, port=port or 0)
+
+    async def serve_stdio(self) -> None:
+        """从 stdin 读请求、向 stdout 写响应；stdin 可以是重定向的普通文件，因此在线程中逐行读取。"""
+        out = sys.stdout.buffer
+
+        async def write(data: bytes) -> None:
+            out.write(data)
+            out.flush()
+
+        # run_agent 的进度输出不能混进协议流
+        with contextlib.redirect_stdout(sys.stderr):
+            await self.serve_lines(lambda: asyncio.to_thread(sys.stdin.buffer.readline), write)
+
+    # ---------------- 关闭 ----------------
+
+    async def close(self) -> None:
+        """停止接收新请求，等待在途请求与后台刷新完成，再落盘 / 关闭热状态。"""
+        self._closing = True
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        await REVALIDATOR.wait()
+        if self.tool_policy is not None:
+            self.tool_policy.close()
+        if self.store is not None:
+            self.store.close()
+        if isinstance(self.log_sink, JsonLinesSink):
+            self.log_sink.close()
+
+
+async def serve(server: AgentServer, path: str | Path | None = None, host: str = "127.0.0.1",
+                port: int | None = None, stdio: bool = False) -> None:
+    """运行到 EOF（stdio）或 SIGINT / SIGTERM（socket），然后优雅关闭。"""
+    try:
+        if stdio:
+            await server.serve_stdio()
+            return
+        listener = await server.start(path, host, port)
+        where = path or "{}:{}".format(*listener.sockets[0].getsockname()[:2])
+        print(f"Agent 服务已启动：{where}", file=sys.stderr, flush=True)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            with contextlib.suppress(NotImplementedError):
+                loop.add_signal_handler(sig, stop.set)
+        async with listener:
+            await stop.wait()
+            listener.close()
+    finally:
+        await server.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="常驻 Agent 服务（JSON lines）")
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", type=Path, help="unix socket 路径")
+    where.add_argument("--port", type=int, help="TCP 端口（0 表示随机）")
+    where.add_argument("--stdio", action="store_true", help="从 stdin 读请求，响应写到 stdout")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--state", type=Path, help="SQLiteState 路径（跨请求 / 跨重启复用工具结果）")
+    parser.add_argument("--policy", type=Path, help="ToolPolicy 统计的 SQLite 路径")
+    parser.add_argument("--log-dir", type=Path, help="决策日志写入 <dir>/server.jsonl（默认写入进程共用的 logs/decisions.jsonl）")
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--exec-mode", default="all")
+    parser.add_argument("--planner", default="static")
+    args = parser.parse_args(argv)
+
+    server = AgentServer(
+        state_path=args.state,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        log_sink=JsonLinesSink(args.log_dir / "server.jsonl") if args.log_dir else None,
+        tool_policy=ToolPolicy(path=args.policy) if args.policy else None,
+        exec_mode=args.exec_mode,
+        planner=args.planner,
+    )
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(serve(server, args.socket, args.host, args.port, args.stdio))
+
+
+if __name__ == "__main__":
+    main()
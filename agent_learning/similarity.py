@@ -0,0 +1,343 @@
+"""
+similarity.py
+
+近似匹配的任务索引：让“解释什么是 asyncio”与“解释一下 asyncio 是什么”这类近似任务
+复用彼此在持久化 state 中的工具结果。
+
+- 任务文本归一化后，中文等非字母数字部分取字符 n-gram，英文 / 数字按整词作为特征（权重更高，
+  避免 asyncio / async 这类只差几个字母的关键词被判为相似），
+  经带符号哈希映射为定长向量并做 L2 归一化（余弦相似度 = 点积）
+- 向量存放在 NumPy 矩阵中；规模较小时一次矩阵-向量乘积完成精确 top-k
+- 规模较大时用随机超平面 LSH（多表 + 单比特多探测）：签名按表排序后附带一张桶起始偏移表，
+  每个探测 O(1) 定位桶，只对候选行做向量化余弦计算，1M 条目下查询仍在亚毫秒级
+- 新条目先进入内存中的 tail（精确扫描），攒满后合并进有序的 base；在事件循环中插入时，
+  合并（拼接 base 并重新排序全部签名）在线程中进行，完成后再换入，`add` 在循环上保持 O(1)；
+  `save` / `load` 使用 .npy 文件，`load(mmap=True)` 通过内存映射按需读取
+
+依赖 numpy（可选依赖，未安装时构造索引会抛出 ImportError）。
+"""
+import asyncio
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Iterable
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖
+    np = None
+
+from agent_learning.cache import normalize_task, task_fingerprint
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.75
+# 英文 / 数字整词特征的权重（相对字符 n-gram）
+WORD_WEIGHT = 3.0
+
+_WORD = re.compile(r"[a-z0-9_]+")
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("相似度索引需要 numpy：pip install numpy")
+
+
+def _features(text: str, sizes: tuple[int, ...]) -> list[tuple[str, float]]:
+    """(特征, 权重)：英文 / 数字整词，以及其余字符连续片段内的字符 n-gram（忽略空白与词序）。"""
+    normalized = normalize_task(text)
+    features = [(word, WORD_WEIGHT) for word in _WORD.findall(normalized)]
+    for run in _WORD.sub(" ", normalized).split():
+        features.extend((run[i:i + n], 1.0) for n in sizes for i in range(len(run) - n + 1))
+    return features
+
+
+def vectorize(text: str, dim: int = 128, ngrams: tuple[int, ...] = (1, 2)) -> "np.ndarray":
+    """
+    带符号哈希特征向量（float32，L2 归一化）。
+    用 blake2b 而不是 crc32：crc 是线性的，"100" / "125" 与 "topic100" / "topic125" 这类
+    等长特征的低位会成对互换，导致不同任务得到完全相同的向量。
+    """
+    _require_numpy()
+    vec = np.zeros(dim, dtype=np.float32)
+    for feature, weight in _features(text, ngrams):
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=4).digest(), "little")
+        vec[h % dim] += weight if h & 0x80000000 else -weight
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class SimilarityIndex:
+    """
+    任务文本 -> 向量的增量索引。同一归一化任务只收录一次。
+
+    参数：
+    - dim / ngrams：向量维度与字符 n-gram 长度
+    - tables / bits：LSH 表数与每表签名位数（bits <= 16）
+    - exact_limit：base 不超过该行数时做全量精确搜索
+    - tail_limit：tail 超过该行数时合并进 base（重新排序签名）
+    - max_bucket：每个探测桶最多取的候选行数，限制高度聚集数据上的查询开销
+    - max_candidates：按命中次数保留的候选行数上限，只对这些行计算余弦
+    """
+
+    def __init__(
+        self,
+        dim: int = 128,
+        ngrams: tuple[int, ...] = (1, 2),
+        tables: int = 24,
+        bits: int = 16,
+        seed: int = 0,
+        exact_limit: int = 20_000,
+        tail_limit: int = 4096,
+        max_bucket: int = 128,
+        max_candidates: int = 512,
+    ):
+        _require_numpy()
+        if not 1 <= bits <= 16:
+            raise ValueError("bits 必须在 1~16 之间")
+        self.dim = dim
+        self.ngrams = tuple(ngrams)
+        self.tables = tables
+        self.bits = bits
+        self.seed = seed
+        self.exact_limit = exact_limit
+        self.tail_limit = tail_limit
+        self.max_bucket = max_bucket
+        self.max_candidates = max_candidates
+
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((tables * bits, dim)).astype(np.float32)
+        self._weights = (1 << np.arange(bits)).astype(np.uint16)
+        # 单比特多探测：原签名 + 每一位翻转后的签名
+        self._flips = np.concatenate([[0], 1 << np.arange(bits)]).astype(np.uint16)
+
+        # base：已排序、可内存映射
+        self._base_vectors = np.zeros((0, dim), dtype=np.float32)
+        self._base_sigs = np.zeros((0, tables), dtype=np.uint16)
+        # 各表按签名排序后的行号依次拼接；桶 key 为 (表号 << 16 | 签名)
+        self._order = np.zeros(0, dtype=np.int32)
+        # 桶 key 在 _order 中的起始偏移：桶 key 的行为 _order[_bucket_starts[key]:_bucket_starts[key + 1]]
+        self._bucket_starts = np.zeros((tables << 16) + 1, dtype=np.int64)
+        # tail：按容量翻倍增长的内存数组
+        self._tail_vectors = np.zeros((64, dim), dtype=np.float32)
+        self._tail_sigs = np.zeros((64, tables), dtype=np.uint16)
+        self._tail_n = 0
+
+        self.texts: list[str] = []
+        self._rows: dict[str, int] = {}
+        # 后台合并：进行中的任务，以及每次换入 base 时递增的代数（用于丢弃过期的合并结果）
+        self._compacting: asyncio.Task | None = None
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    # ---------------- 向量与签名 ----------------
+
+    def vectorize(self, text: str) -> "np.ndarray":
+        return vectorize(text, self.dim, self.ngrams)
+
+    def _signatures(self, vectors: "np.ndarray") -> "np.ndarray":
+        """(n, dim) -> (n, tables) 的 LSH 签名。"""
+        bits = (vectors @ self._planes.T > 0).reshape(len(vectors), self.tables, self.bits)
+        return (bits * self._weights).sum(axis=2, dtype=np.uint32).astype(np.uint16)
+
+    # ---------------- 插入 ----------------
+
+    def add(self, text: str) -> int:
+        """收录一条任务，返回其行号；已收录的任务直接返回原行号。"""
+        fp = task_fingerprint(text)
+        row = self._rows.get(fp)
+        if row is not None:
+            return row
+        self._append(self.vectorize(text)[None, :], [text], [fp])
+        return self._rows[fp]
+
+    def add_many(self, texts: Iterable[str]) -> None:
+        fresh, fps, seen = [], [], set()
+        for text in texts:
+            fp = task_fingerprint(text)
+            if fp not in self._rows and fp not in seen:
+                seen.add(fp)
+                fresh.append(text)
+                fps.append(fp)
+        if fresh:
+            vectors = np.stack([self.vectorize(t) for t in fresh])
+            self._append(vectors, fresh, fps)
+
+    def _append(self, vectors: "np.ndarray", texts: list[str], fps: list[str]) -> None:
+        needed = self._tail_n + len(vectors)
+        if needed > len(self._tail_vectors):
+            capacity = max(needed, 2 * len(self._tail_vectors))
+            self._tail_vectors = _grow(self._tail_vectors, capacity)
+            self._tail_sigs = _grow(self._tail_sigs, capacity)
+        self._tail_vectors[self._tail_n:needed] = vectors
+        self._tail_sigs[self._tail_n:needed] = self._signatures(vectors)
+        self._tail_n = needed
+        for text, fp in zip(texts, fps):
+            self._rows[fp] = len(self.texts)
+            self.texts.append(text)
+        # 批量插入只在最后合并一次
+        if self._tail_n >= self.tail_limit:
+            self._request_compaction()
+
+    def _request_compaction(self) -> None:
+        """有事件循环时在线程中合并（不阻塞其他 run / 服务端请求）；离线构建时直接合并。"""
+        if self._compacting is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.compact()
+            return
+        self._compacting = loop.create_task(self._compact_in_thread())
+
+    async def _compact_in_thread(self) -> None:
+        try:
+            n, generation = self._tail_n, self._generation
+            # tail 在合并期间仍会追加（甚至扩容），线程只读取这里复制出的前 n 行与当前的 base
+            built = await asyncio.to_thread(
+                _merge, self._base_vectors, self._base_sigs,
+                self._tail_vectors[:n].copy(), self._tail_sigs[:n].copy(), self.tables,
+            )
+            if generation == self._generation:
+                self._install(built, n)
+        finally:
+            self._compacting = None
+        if self._tail_n >= self.tail_limit:
+            self._request_compaction()
+
+    async def wait_compacted(self) -> None:
+        """等待进行中的后台合并完成（例如关闭服务前、测试中）。"""
+        while self._compacting is not None:
+            await asyncio.shield(self._compacting)
+
+    def compact(self) -> None:
+        """同步地把整个 tail 合并进 base 并重建各表的有序签名；进行中的后台合并结果随之作废。"""
+        if not self._tail_n:
+            return
+        n = self._tail_n
+        self._install(
+            _merge(self._base_vectors, self._base_sigs, self._tail_vectors[:n], self._tail_sigs[:n], self.tables), n,
+        )
+
+    def _install(self, built: tuple, n: int) -> None:
+        """换入合并好的 base，tail 中前 n 行已并入 base，其余行前移。"""
+        self._base_vectors, self._base_sigs, self._order, self._bucket_starts = built
+        rest = self._tail_n - n
+        self._tail_vectors[:rest] = self._tail_vectors[n:self._tail_n]
+        self._tail_sigs[:rest] = self._tail_sigs[n:self._tail_n]
+        self._tail_n = rest
+        self._generation += 1
+
+    # ---------------- 查询 ----------------
+
+    def _base_candidates(self, q: "np.ndarray") -> "np.ndarray":
+        """LSH 候选行：每表探测原签名及其单比特翻转，命中桶过大时截断。"""
+        probes = self._signatures(q[None, :])[0][:, None] ^ self._flips[None, :]
+        keys = (probes.astype(np.int64) | (np.arange(self.tables, dtype=np.int64) << 16)[:, None]).ravel()
+        lo = self._bucket_starts[keys]
+        hi = self._bucket_starts[keys + 1]
+        lengths = np.minimum(hi - lo, self.max_bucket)
+        total = int(lengths.sum())
+        if not total:
+            return np.zeros(0, dtype=np.int32)
+        # 把各个 [lo, lo + length) 区间展开成一个下标数组（无 Python 循环）
+        starts = np.repeat(lo - np.cumsum(lengths) + lengths, lengths)
+        rows, hits = np.unique(self._order[starts + np.arange(total)], return_counts=True)
+        if len(rows) > self.max_candidates:
+            # 真正相近的行会在多张表 / 多个探测中重复命中，只保留命中次数最多的候选
+            rows = rows[np.argpartition(-hits, self.max_candidates - 1)[:self.max_candidates]]
+        return rows
+
+    def search(self, text: str, k: int = 5) -> list[tuple[str, float]]:
+        """返回与 `text` 余弦相似度最高的 k 条 (任务文本, 相似度)，按相似度降序。"""
+        if not self.texts:
+            return []
+        q = self.vectorize(text)
+        n_base = len(self._base_vectors)
+
+        if n_base <= self.exact_limit:
+            rows = np.arange(n_base)
+            base_scores = self._base_vectors @ q
+        else:
+            rows = self._base_candidates(q)
+            base_scores = self._base_vectors[rows] @ q
+        tail_scores = self._tail_vectors[:self._tail_n] @ q
+
+        scores = np.concatenate([base_scores, tail_scores])
+        all_rows = np.concatenate([rows, np.arange(n_base, n_base + self._tail_n)])
+        if not len(scores):
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.texts[int(all_rows[i])], float(scores[i])) for i in top]
+
+    def nearest(self, text: str, threshold: float = DEFAULT_SIMILARITY_THRESHOLD, k: int = 5) -> list[tuple[str, float]]:
+        """相似度不低于 threshold 的近似任务（不含 `text` 本身）。"""
+        own = task_fingerprint(text)
+        return [
+            (other, score) for other, score in self.search(text, k + 1)
+            if score >= threshold and task_fingerprint(other) != own
+        ][:k]
+
+    # ---------------- 持久化 ----------------
+
+    def save(self, path: str | Path) -> None:
+        """写入目录 `path`：向量 / 签名 / 桶索引为 .npy，任务文本为 JSON-lines。"""
+        self.compact()
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "vectors.npy", self._base_vectors)
+        np.save(path / "sigs.npy", self._base_sigs)
+        np.save(path / "order.npy", self._order)
+        np.save(path / "bucket_starts.npy", self._bucket_starts)
+        with (path / "texts.jsonl").open("w", encoding="utf-8") as f:
+            f.writelines(json.dumps(t, ensure_ascii=False) + "\n" for t in self.texts)
+        meta = {
+            "dim": self.dim, "ngrams": list(self.ngrams), "tables": self.tables, "bits": self.bits,
+            "seed": self.seed, "exact_limit": self.exact_limit, "tail_limit": self.tail_limit,
+            "max_bucket": self.max_bucket, "max_candidates": self.max_candidates,
+        }
+        (path / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: str | Path, mmap: bool = True) -> "SimilarityIndex":
+        """从 `save` 写出的目录加载；mmap=True 时大数组以只读内存映射打开，新插入进入内存 tail。"""
+        _require_numpy()
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        index = cls(**{**meta, "ngrams": tuple(meta["ngrams"])})
+        mode = "r" if mmap else None
+        index._base_vectors = np.load(path / "vectors.npy", mmap_mode=mode)
+        index._base_sigs = np.load(path / "sigs.npy", mmap_mode=mode)
+        index._order = np.load(path / "order.npy", mmap_mode=mode)
+        index._bucket_starts = np.load(path / "bucket_starts.npy", mmap_mode=mode)
+        with (path / "texts.jsonl").open(encoding="utf-8") as f:
+            index.texts = [json.loads(line) for line in f]
+        index._rows = {task_fingerprint(t): i for i, t in enumerate(index.texts)}
+        return index
+
+
+def _merge(
+    base_vectors: "np.ndarray", base_sigs: "np.ndarray", tail_vectors: "np.ndarray", tail_sigs: "np.ndarray",
+    tables: int,
+) -> tuple["np.ndarray", "np.ndarray", "np.ndarray", "np.ndarray"]:
+    """拼接 base 与 tail，返回新的 (向量, 签名, 各表有序行号, 桶起始偏移)；不修改输入，可在线程中运行。"""
+    vectors = np.concatenate([base_vectors, tail_vectors])
+    sigs = np.concatenate([base_sigs, tail_sigs])
+    sigs_by_table = np.ascontiguousarray(sigs.T)
+    order = np.argsort(sigs_by_table, axis=1, kind="stable")
+    table_prefix = (np.arange(tables, dtype=np.uint32) << 16)[:, None]
+    sorted_keys = (np.take_along_axis(sigs_by_table, order, axis=1) | table_prefix).ravel()
+    # 查询时在上千万条有序 key 上逐个二分查找会频繁缓存未命中，合并时预先算好每个桶的偏移
+    bucket_starts = np.searchsorted(
+        sorted_keys, np.arange((tables << 16) + 1, dtype=np.uint32),
+    ).astype(np.int64)
+    return vectors, sigs, order.astype(np.int32).ravel(), bucket_starts
+
+
+def _grow(array: "np.ndarray", capacity: int) -> "np.ndarray":
+    grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
@@ -3,9 +3,15 @@ state.py
 
 简单的本地文件持久化 state 存储，用于跨任务或跨 run 的短期记忆演示。
 接口非常小：`get(key)`, `set(key, value)`, `save()`。
-实现为每次写入都会刷新文件（便于演示和测试）。
+- `FileState`：每次写入都会刷新整个 JSON 文件（便于演示和测试）。
+- `SQLiteState`：同样的接口，写入追加到 SQLite（WAL）并批量提交，适合长期运行。
 """
 import json
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from pathlib import Path
 from typing import Any
 
@@ -38,3 +44,236 @@ class FileState:
 
     def all(self) -> dict:
         return dict(self._data)
+
+
+class SQLiteState:
+    """
+    基于 SQLite（WAL 模式）的持久化 state，接口与 FileState 一致。
+
+    - `set` 只写内存缓冲，后台线程按批量 / 按时间提交（批量 fsync），摊还 O(1)
+    - 内存索引缓存已读 / 已写的 key，命中时不访问磁盘；未命中时走独立的只读连接，
+      WAL 下读不被写锁阻塞（其他进程持有写锁、后台线程在等锁提交时，`get` 仍然立即返回）
+    - 多进程共享同一个文件时由 SQLite 文件锁保证写入安全；
+      其他进程提交后通过 `PRAGMA data_version` 失效本地索引
+    - 后台线程定期做 WAL checkpoint 与增量 vacuum（compaction）
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        batch_size: int = 512,
+        flush_interval: float = 0.5,
+        compact_interval: float = 60.0,
+        refresh_interval: float = 0.05,
+        index_limit: int = 100_000,
+        migrate_from: str | Path | None = None,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self.refresh_interval = refresh_interval
+        self.index_limit = index_limit
+
+        self._lock = threading.Lock()          # 保护写连接
+        self._read_lock = threading.Lock()     # 保护读连接
+        self._buffer_lock = threading.Lock()   # 保护写缓冲的交换
+        self._flush_lock = threading.Lock()    # 保证批次按顺序提交
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID"
+        )
+        self._reader = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._reader.execute("PRAGMA query_only=ON")
+
+        self._pending: dict[str, Any] = {}
+        self._index: OrderedDict[str, Any] = OrderedDict()
+        self._data_version = self._read_data_version()
+        self._last_refresh = time.monotonic()
+
+        if migrate_from is not None:
+            self.migrate_from_json(migrate_from)
+
+        self._closed = False
+        self._wakeup = threading.Event()
+        self._writer = threading.Thread(
+            target=self._writer_loop, name=f"SQLiteState-{self.path.name}", daemon=True
+        )
+        self._writer.start()
+        # 进程退出前把缓冲写完（finalize 默认在解释器退出时执行）
+        self._finalizer = weakref.finalize(self, SQLiteState._flush_at_exit, weakref.ref(self))
+
+    # ---------------- 公共接口 ----------------
+
+    def get(self, key: str) -> Any:
+        pending = self._pending  # 交换后旧缓冲不再被修改，取本地引用即可
+        if key in pending:
+            return pending[key]
+        self._maybe_refresh()
+        if key in self._index:
+            return self._index[key]
+        with self._read_lock:
+            row = self._reader.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value = json.loads(row[0])
+        self._remember(key, value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._buffer_lock:
+            self._pending[key] = value
+            full = len(self._pending) >= self.batch_size
+        self._remember(key, value)
+        if full:
+            self._wakeup.set()
+
+    def save(self) -> None:
+        """同步提交缓冲中的全部写入。"""
+        self._flush()
+
+    def all(self) -> dict:
+        self._flush()
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM kv").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def compact(self) -> None:
+        """截断 WAL 并回收空闲页。"""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("PRAGMA incremental_vacuum")
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join()
+        self._flush()
+        with self._lock:
+            self._conn.close()
+        with self._read_lock:
+            self._reader.close()
+        self._finalizer.detach()
+
+    def __enter__(self) -> "SQLiteState":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __bool__(self) -> bool:
+        # 定义了 __len__ 的对象在为空时为假；store 本身总是"存在"的，`if store:` 不应把空库当成没有 store
+        return True
+
+    def __len__(self) -> int:
+        self._flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+
+    # ---------------- 迁移 ----------------
+
+    def migrate_from_json(self, json_path: str | Path) -> int:
+        """
+        从 FileState 的 JSON 文件导入数据；仅当目标库为空时执行，返回导入条数。
+        """
+        json_path = Path(json_path)
+        if not json_path.exists():
+            return 0
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM kv LIMIT 1").fetchone():
+                return 0
+        try:
+            data = json.loads(json_path.read_text(encoding="utf-8"))
+        except Exception:
+            return 0
+        rows = [(k, json.dumps(v, ensure_ascii=False)) for k, v in data.items()]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", rows)
+            self._conn.execute("COMMIT")
+            self._data_version = self._read_data_version()
+        return len(rows)
+
+    # ---------------- 内部实现 ----------------
+
+    def _remember(self, key: str, value: Any) -> None:
+        if key not in self._index and len(self._index) >= self.index_limit:
+            self._index.popitem(last=False)
+        self._index[key] = value
+
+    def _read_data_version(self) -> int:
+        # data_version 在读连接上读取：本进程写连接的提交也会改变它，见 _flush
+        with self._read_lock:
+            return self._reader.execute("PRAGMA data_version").fetchone()[0]
+
+    def _maybe_refresh(self) -> None:
+        """其他进程提交过写入时，丢弃可能过期的内存索引（按 refresh_interval 限频）。"""
+        now = time.monotonic()
+        if now - self._last_refresh < self.refresh_interval:
+            return
+        self._last_refresh = now
+        version = self._read_data_version()
+        if version != self._data_version:
+            self._data_version = version
+            self._index.clear()
+
+    def _flush(self) -> None:
+        with self._flush_lock:
+            if not self._pending:
+                return
+            # 先交换缓冲，后续 set 写入新的字典，不与提交互相阻塞
+            with self._buffer_lock:
+                batch, self._pending = self._pending, {}
+            rows = [(k, json.dumps(v, ensure_ascii=False)) for k, v in batch.items()]
+            try:
+                with self._lock:
+                    self._conn.execute("BEGIN IMMEDIATE")
+                    # 持有写锁时其他进程无法提交：版本没变说明此前没有外部写入，
+                    # 提交后可以把自己这次提交造成的版本变化记为已知，不必丢弃内存索引
+                    unchanged = self._read_data_version() == self._data_version
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", rows
+                    )
+                    self._conn.execute("COMMIT")
+                    if unchanged:
+                        self._data_version = self._read_data_version()
+            except Exception:
+                # 提交失败时放回缓冲，等待下一轮重试（新写入优先）
+                with self._lock:
+                    if self._conn.in_transaction:
+                        self._conn.execute("ROLLBACK")
+                with self._buffer_lock:
+                    batch.update(self._pending)
+                    self._pending = batch
+
+    def _writer_loop(self) -> None:
+        last_compact = time.monotonic()
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._flush()
+            if time.monotonic() - last_compact >= self.compact_interval:
+                last_compact = time.monotonic()
+                try:
+                    self.compact()
+                except Exception:
+                    pass
+
+    @staticmethod
+    def _flush_at_exit(ref: "weakref.ref[SQLiteState]") -> None:
+        store = ref()
+        if store is not None and not store._closed:
+            try:
+                store.close()
+            except Exception:
+                pass
@@ -8,7 +8,8 @@ from typing import List
 
 @dataclass
 class Task:
-    """代表一个任务：包含 id、描述和可选结果字段。"""
+    """代表一个任务：包含 id、描述和可选结果字段；status 在执行后填写为 "ok" 或 "failed"。"""
     task_id: str
     description: str
     result: str | None = None
+    status: str | None = None
@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+import pytest
+
+from agent_learning import tool_registry
+from agent_learning.agent import run_agent_stream
+from agent_learning.tool_registry import SingleFlight, ToolDescriptor
+
+TOOL_NAMES = ("general", "tech", "project")
+
+
+@pytest.fixture
+def install_tools(monkeypatch):
+    """返回 `install(delay=, confidence=, content=)`：用固定延迟和置信度的假工具替换三个注册工具，
+    换上新的 SINGLE_FLIGHT，并返回按调用顺序记录工具名的列表。
+
+    `confidence` 可以是统一的数值，也可以是 {工具名: 置信度}；`content` 是可引用 {name}、{query} 的模板。
+    """
+    def install(delay=0.01, confidence=0.9, content="{name} 结果"):
+        calls = []
+
+        def make_tool(name):
+            async def tool(query: str):
+                calls.append(name)
+                await asyncio.sleep(delay)
+                score = confidence[name] if isinstance(confidence, dict) else confidence
+                return {"status": "ok", "type": name, "confidence": score,
+                        "content": content.format(name=name, query=query)}
+            return tool
+
+        for name in TOOL_NAMES:
+            monkeypatch.setitem(tool_registry.TOOLS, name, ToolDescriptor(name, make_tool(name)))
+        monkeypatch.setattr(tool_registry, "SINGLE_FLIGHT", SingleFlight())
+        return calls
+
+    return install
+
+
+@pytest.fixture
+def run_stream():
+    """返回 `run(task, **options) -> (events, elapsed)`：在新的事件循环里跑完一次 run_agent_stream，收集全部事件并计时。"""
+    def run(task, **options):
+        async def collect():
+            return [e async for e in run_agent_stream(task, **options)]
+
+        started = time.perf_counter()
+        events = asyncio.run(collect())
+        return events, time.perf_counter() - started
+
+    return run
@@ -9,6 +9,7 @@ ROOT = pathlib.Path(__file__).resolve().parents[2]
 sys.path.insert(0, str(ROOT))
 
 from agent_learning.agent import run_agent, TOOL_TIMEOUT
+from agent_learning.cache import make_cache_key
 import agent_learning.tool as tool_module
 
 
@@ -45,7 +46,7 @@ def test_tool_timeout(monkeypatch):
 
 
 def test_state_cache_avoids_call(monkeypatch):
-    # 当 initial_state 中已有 step:tool 的返回时，相关工具不应被调用
+    # 当 initial_state 中已有 任务指纹:step:tool 的返回时，相关工具不应被调用
     called = {"flag": False}
 
     async def failing_tool(query: str):
@@ -56,8 +57,9 @@ def test_state_cache_avoids_call(monkeypatch):
     # 把 general 工具替换为会设置 flag 的实现
     monkeypatch.setattr(tool_module, "search_general_knowledge", failing_tool)
 
-    # 构造 initial_state，模拟已缓存了该 step:general 的结果
-    initial_state = {"理解问题的通用背景:general": {"status": "ok", "type": "general", "confidence": 0.9, "content": "缓存内容"}}
+    # 构造 initial_state，模拟已缓存了该任务 step:general 的结果
+    key = make_cache_key("测试缓存", "理解问题的通用背景", "general")
+    initial_state = {key: {"status": "ok", "type": "general", "confidence": 0.9, "content": "缓存内容"}}
 
     result = asyncio.run(run_agent("测试缓存", initial_state=initial_state))
     # 工具不应被真正调用
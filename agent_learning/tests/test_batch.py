@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+from agent_learning import batch as batch_module
+from agent_learning.batch import BatchStats, run_agents
+from agent_learning.rate_limit import InflightLimiter, ToolLimiter, ToolLimits
+from agent_learning.task import Task
+
+
+def test_run_agents_bounds_concurrency_and_streams_in_completion_order(monkeypatch):
+    active = {"now": 0, "peak": 0}
+
+    async def fake_run_agent(task: str, **options):
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(0.2 if task == "慢" else 0.01)
+        active["now"] -= 1
+        return f"完成：{task}"
+
+    monkeypatch.setattr(batch_module, "run_agent", fake_run_agent)
+    tasks = [Task("0", "慢")] + [Task(str(i), f"快{i}") for i in range(1, 10)]
+    stats = BatchStats()
+
+    async def collect():
+        return [t async for t in run_agents(tasks, concurrency=3, stats=stats)]
+
+    finished = asyncio.run(collect())
+    assert active["peak"] == 3
+    assert finished[-1].task_id == "0"
+    assert all(t.result == f"完成：{t.description}" for t in tasks)
+    summary = stats.summary()
+    assert summary["completed"] == 10 and summary["failed"] == 0
+    assert summary["throughput_per_s"] > 0
+
+
+def test_failed_task_is_reported(monkeypatch):
+    async def failing(task: str, **options):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(batch_module, "run_agent", failing)
+    stats = BatchStats()
+
+    async def collect():
+        return [t async for t in run_agents([Task("1", "x")], stats=stats)]
+
+    (task,) = asyncio.run(collect())
+    assert task.result.startswith("任务失败")
+    assert stats.failed == 1
+
+
+def test_tool_limiter_caps_inflight_and_rate():
+    limiter = ToolLimiter(ToolLimits(rate=50, burst=5, max_inflight=2))
+    active = {"now": 0, "peak": 0}
+
+    async def call():
+        async with limiter:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            await asyncio.sleep(0.01)
+            active["now"] -= 1
+
+    async def main():
+        await asyncio.gather(*(call() for _ in range(15)))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - start
+    assert active["peak"] == 2
+    # 15 次调用、突发 5 次，其余 10 次受 50/s 速率限制，至少约 0.2s
+    assert elapsed >= 0.18
+
+
+def test_waiter_cancelled_before_release_raises_cancelled_error():
+    limiter = InflightLimiter(1)
+
+    async def main():
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)  # waiter 进入等待队列
+        # 取消后、waiter 恢复执行前先 release：release 弹出已取消的 future 并收回名额
+        waiter.cancel()
+        limiter.release()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        return limiter.inflight, limiter.queued
+
+    assert asyncio.run(main()) == (0, 0)
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+from agent_learning.cache import (
+    BoundedCache,
+    Revalidator,
+    make_cache_key,
+    read_persisted,
+    task_fingerprint,
+    unwrap_persisted,
+    wrap_persisted,
+)
+
+
+def test_fingerprint_normalizes_whitespace_and_width():
+    assert task_fingerprint("解释什么是  Agent") == task_fingerprint(" 解释什么是 ａｇｅｎｔ ")
+    assert make_cache_key("任务一", "s", "tech") != make_cache_key("任务二", "s", "tech")
+
+
+def test_ttl_expiry_counts_as_miss():
+    cache = BoundedCache(ttl=0.05)
+    cache.set("k", {"v": 1})
+    assert cache.get("k") == {"v": 1}
+    time.sleep(0.06)
+    assert cache.get("k") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["expirations"] == 1
+
+
+def test_lru_evicts_least_recently_used():
+    cache = BoundedCache(max_entries=2, policy="lru")
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lfu_evicts_least_frequently_used():
+    cache = BoundedCache(max_entries=2, policy="lfu")
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.get("a")
+    cache.get("b")
+    cache.set("c", 3)
+    assert "a" in cache and "c" in cache and "b" not in cache
+
+
+def test_byte_limit_evicts():
+    cache = BoundedCache(max_bytes=100)
+    cache.set("a", "x" * 60)
+    cache.set("b", "y" * 60)
+    assert "a" not in cache and "b" in cache
+    assert cache.size_bytes <= 100
+
+
+def test_persisted_wrapper_expires():
+    raw = wrap_persisted({"v": 1}, ttl=10)
+    assert unwrap_persisted(raw) == {"v": 1}
+    assert unwrap_persisted(raw, now=raw["stored_at"] + 11) is None
+
+
+def test_persisted_entry_goes_fresh_stale_expired():
+    raw = wrap_persisted({"v": 1}, ttl=10, stale_ttl=20)
+    t0 = raw["stored_at"]
+    assert read_persisted(raw, now=t0 + 5) == ({"v": 1}, "fresh")
+    assert read_persisted(raw, now=t0 + 25) == ({"v": 1}, "stale")
+    assert unwrap_persisted(raw, now=t0 + 25) is None
+    assert read_persisted(raw, now=t0 + 31) == (None, None)
+    assert read_persisted({"legacy": True}) == ({"legacy": True}, "fresh")
+
+
+def test_revalidator_runs_one_refresh_per_key():
+    revalidator = Revalidator()
+    runs = []
+
+    async def refresh():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+
+    async def main():
+        assert revalidator.schedule("k", refresh)
+        assert not revalidator.schedule("k", refresh)
+        assert revalidator.schedule("other", refresh)
+        await revalidator.wait()
+        assert revalidator.schedule("k", refresh)
+        await revalidator.wait()
+
+    asyncio.run(main())
+    assert len(runs) == 3 and revalidator.deduplicated == 1 and revalidator.pending() == 0
@@ -0,0 +1,82 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from agent_learning import tool_registry
+from agent_learning.deadline import Deadline, DeadlineExceeded
+from agent_learning.log_sink import PerTraceJsonSink
+from agent_learning.tool_registry import call_tool
+
+
+def decision_log(events):
+    return json.loads(Path(events[-1]["decision_path"]).read_text(encoding="utf-8"))
+
+
+def test_deadline_bounds_run_and_returns_partial_result(install_tools, run_stream, tmp_path):
+    install_tools(delay=1.0, confidence=0.5)
+    events, elapsed = run_stream("总时限任务", deadline=0.3, log_sink=PerTraceJsonSink(tmp_path))
+
+    assert elapsed < 0.5
+    done = events[-1]
+    assert done["event"] == "run_complete" and done["partial"] is True
+    entries = decision_log(events)
+    partial = [e for e in entries if e.get("action") == "partial_result"]
+    assert partial and partial[0]["deadline"] == 0.3
+    assert any(e.get("status") == "deadline" for e in entries)
+    # 被总时限截断的调用不计为工具超时
+    assert all(tool_registry.TOOLS[name].health.timeout_rate == 0 for name in ("general", "tech", "project"))
+
+
+def test_supplement_is_skipped_when_budget_is_low(install_tools, run_stream, tmp_path):
+    calls = install_tools(confidence=0.5)
+    # 补救工具历史平均延迟 1 秒，剩余预算不足以完成一次补救
+    tool_registry.TOOLS["tech"].health.ewma_latency = 1.0
+    events, elapsed = run_stream("补救预算任务", deadline=0.5, log_sink=PerTraceJsonSink(tmp_path))
+
+    assert elapsed < 0.5
+    assert events[-1]["partial"] is True
+    assert not any(e["event"] == "supplement" for e in events)
+    entries = decision_log(events)
+    assert any(e.get("action") == "supplement_skipped" and e["reason"] == "deadline" for e in entries)
+    assert "general 结果" in events[-1]["final_result"]
+    # 每个工具只有 step 内的一次调用（相同 query 被 single-flight 合并），没有补救调用
+    assert sorted(calls) == ["general", "project", "tech"]
+
+    # 不限时：行为与原来一致
+    events, _ = run_stream("补救预算任务")
+    assert events[-1]["partial"] is False
+    assert any(e["event"] == "supplement" for e in events)
+
+
+def test_each_caller_budget_only_bounds_its_own_wait(install_tools):
+    calls = install_tools(delay=0.5)
+
+    async def main():
+        # 相同 (tool, query) 被合并为一次真实调用：由 A 发起，A 的预算只截断 A 的等待，不影响没有时限的 B
+        short = asyncio.ensure_future(call_tool("tech", "q", timeout=3, budget=0.1))
+        await asyncio.sleep(0.01)
+        unbounded = asyncio.ensure_future(call_tool("tech", "q", timeout=3))
+        return await asyncio.gather(short, unbounded, return_exceptions=True)
+
+    short, unbounded = asyncio.run(main())
+    assert isinstance(short, DeadlineExceeded)
+    assert unbounded["type"] == "tech"
+    assert calls == ["tech"]
+    health = tool_registry.TOOLS["tech"].health
+    assert health.timeout_rate == 0 and health.state == "closed"
+
+
+def test_exhausted_budget_fails_fast_without_calling_the_tool(install_tools):
+    calls = install_tools()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(call_tool("tech", "q", timeout=3, budget=0.0))
+    assert calls == []
+
+    unbounded = Deadline(None)
+    assert unbounded.budget(3.0) == 3.0 and unbounded.share(0.5) == 0.0
+    bounded = Deadline(1.0)
+    assert bounded.budget(3.0) <= 1.0
+    assert 0.5 < bounded.budget(reserve=0.4) <= 0.6
+    assert bounded.budget(reserve=5.0) > 0.9  # 剩余不足以预留时不再预留
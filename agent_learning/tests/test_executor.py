@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+
+from agent_learning import executor, tool_registry
+from agent_learning.executor import execute_tools, hedge_delay
+from agent_learning.tool_registry import ToolDescriptor
+
+
+def _tool(delay: float, confidence: float, log: list | None = None):
+    async def call():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append("cancelled")
+            raise
+        return {"status": "ok", "confidence": confidence}
+    return call
+
+
+def _good(res) -> bool:
+    return isinstance(res, dict) and res.get("confidence", 0) >= 0.6
+
+
+def test_first_good_returns_without_waiting_for_stragglers():
+    log = []
+    calls = [("slow", _tool(1.0, 0.9, log)), ("fast", _tool(0.05, 0.8))]
+
+    start = time.perf_counter()
+    results, cancelled = asyncio.run(execute_tools(calls, mode="first_good", good_enough=_good))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.5
+    assert [name for name, _ in results] == ["fast"]
+    assert cancelled == ["slow"]
+    assert log == ["cancelled"]
+
+
+def test_first_good_keeps_waiting_when_early_results_are_weak():
+    calls = [("weak", _tool(0.01, 0.3)), ("strong", _tool(0.05, 0.9))]
+    results, cancelled = asyncio.run(execute_tools(calls, mode="first_good", good_enough=_good))
+    assert [name for name, _ in results] == ["weak", "strong"]
+    assert cancelled == []
+
+
+def test_hedged_starts_backup_after_delay(monkeypatch):
+    monkeypatch.setattr(executor, "DEFAULT_HEDGE_DELAY", 0.05)
+    started = []
+
+    def tracked(name, delay, confidence):
+        inner = _tool(delay, confidence)
+
+        async def call():
+            started.append(name)
+            return await inner()
+        return call
+
+    calls = [("primary", tracked("primary", 1.0, 0.9)), ("backup", tracked("backup", 0.05, 0.8))]
+    start = time.perf_counter()
+    results, cancelled = asyncio.run(execute_tools(calls, mode="hedged", good_enough=_good))
+
+    assert time.perf_counter() - start < 0.5
+    assert started == ["primary", "backup"]
+    assert [name for name, _ in results] == ["backup"]
+    assert cancelled == ["primary"]
+
+
+def test_hedged_does_not_start_backup_when_primary_is_fast():
+    calls = [("primary", _tool(0.01, 0.9)), ("backup", _tool(0.01, 0.9))]
+    results, cancelled = asyncio.run(execute_tools(calls, mode="hedged", good_enough=_good))
+    assert [name for name, _ in results] == ["primary"]
+    assert cancelled == []
+
+
+def test_hedge_delay_comes_from_real_executions_only(monkeypatch):
+    monkeypatch.setitem(tool_registry.TOOLS, "tech", ToolDescriptor("tech", _tool(0, 0.9)))
+    health = tool_registry.TOOLS["tech"].health
+    assert hedge_delay("tech") == executor.DEFAULT_HEDGE_DELAY
+    for _ in range(20):
+        health.record_success(0.2)
+    assert hedge_delay("tech") == pytest.approx(0.2)
+
+    # 已经完成的（缓存 / 预取 / 备忘）结果经过执行层时不会记录成 0 秒的延迟样本
+    async def ready():
+        return {"status": "ok", "confidence": 0.9}
+
+    asyncio.run(execute_tools([("tech", ready)] * 10, mode="all"))
+    assert hedge_delay("tech") == pytest.approx(0.2)
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        asyncio.run(execute_tools([], mode="fastest"))
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from agent_learning.llm import LLMBatcher, LocalBatchBackend
+
+
+def test_requests_in_window_share_one_backend_call():
+    backend = LocalBatchBackend(rtt=0.01, per_item=0.0)
+    batcher = LLMBatcher(backend, window=0.02, max_batch_size=4)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(f"p{i}") for i in range(10)))
+
+    replies = asyncio.run(main())
+    assert replies == [f"【模拟 LLM 回复】针对：p{i}" for i in range(10)]
+    # 攒满 4 条立即发送：4 + 4 + 窗口结束时剩余的 2
+    assert backend.calls == 3
+    assert batcher.stats()["mean_batch_size"] == pytest.approx(10 / 3)
+
+
+def test_timed_out_and_cancelled_requests_are_dropped_from_batch():
+    sent: list[list[str]] = []
+
+    async def backend(prompts):
+        sent.append(prompts)
+        return [p.upper() for p in prompts]
+
+    batcher = LLMBatcher(backend, window=0.05)
+
+    async def main():
+        waiting = asyncio.ensure_future(batcher.submit("cancel-me"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        impatient = batcher.submit("late", timeout=0.01)
+        ok = batcher.submit("ok")
+        return await asyncio.gather(impatient, ok, return_exceptions=True)
+
+    impatient, ok = asyncio.run(main())
+    assert isinstance(impatient, asyncio.TimeoutError)
+    assert ok == "OK"
+    assert sent == [["ok"]]
+    assert batcher.stats()["cancelled"] == 2
+
+
+def test_backend_errors_fan_out_to_whole_batch():
+    async def broken(prompts):
+        raise RuntimeError("backend down")
+
+    async def short(prompts):
+        return prompts[:1]
+
+    async def main(backend):
+        batcher = LLMBatcher(backend, window=0.01)
+        return await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(main(broken)))
+    assert all("期望 2 条" in str(r) for r in asyncio.run(main(short)))
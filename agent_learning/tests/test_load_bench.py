@@ -0,0 +1,29 @@
+from agent_learning import tool_registry
+from agent_learning.benchmarks.load import SyntheticTool, compare, run_benchmark
+
+
+def test_load_benchmark_reports_each_level_and_restores_tools(tmp_path):
+    original = dict(tool_registry.TOOLS)
+    profile = [
+        SyntheticTool("general", dist="fixed", mean=0.001, confidence=0.9),
+        SyntheticTool("tech", dist="uniform", mean=0.002, spread=0.001, confidence=0.9),
+        SyntheticTool("project", dist="exponential", mean=0.001, failure_rate=1.0),
+    ]
+
+    report = run_benchmark([1, 5], profile, min_tasks=5, logs_dir=tmp_path)
+
+    assert [level["concurrency"] for level in report["levels"]] == [1, 5]
+    for level in report["levels"]:
+        assert level["batch"]["completed"] == 5
+        assert level["batch"]["throughput_per_s"] > 0
+        assert level["loop_lag"]["samples"] >= 0
+    # project 工具总是失败；熔断打开后第二个级别不再调用它
+    assert report["levels"][0]["agent"]["error_rate"] > 0
+    assert report["levels"][1]["agent"]["error_rate"] == 0
+    assert report["meta"]["profile"][0]["name"] == "general"
+    assert dict(tool_registry.TOOLS) == original
+
+    slower = {"levels": [dict(level, batch=dict(level["batch"], throughput_per_s=level["batch"]["throughput_per_s"] / 2))
+                         for level in report["levels"]]}
+    assert compare(slower, report)
+    assert not compare(report, report)
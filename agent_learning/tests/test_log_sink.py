@@ -0,0 +1,122 @@
+import asyncio
+import gzip
+import json
+import time
+
+import pytest
+
+from agent_learning import tool_registry
+from agent_learning.agent import run_agent
+from agent_learning.log_sink import JsonLinesSink, PerTraceJsonSink
+
+
+def _read_lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_jsonl_sink_writes_in_background(tmp_path):
+    path = tmp_path / "decisions.jsonl"
+    with JsonLinesSink(path, flush_interval=0.01) as sink:
+        for i in range(10):
+            sink.emit({"trace_id": "t", "i": i})
+    assert [r["i"] for r in _read_lines(path)] == list(range(10))
+    assert sink.written == 10 and sink.dropped == 0
+
+
+def test_jsonl_sink_rotates_and_compresses(tmp_path):
+    path = tmp_path / "decisions.jsonl"
+    with JsonLinesSink(path, batch_size=10, max_bytes=200, backups=2, compress=True) as sink:
+        for i in range(100):
+            sink.emit({"trace_id": "t", "payload": "x" * 20, "i": i})
+
+    rotated = sorted(tmp_path.glob("decisions.*.jsonl.gz"))
+    assert 1 <= len(rotated) <= 2
+    with gzip.open(rotated[0], "rt", encoding="utf-8") as f:
+        assert json.loads(f.readline())["trace_id"] == "t"
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    sink = JsonLinesSink(tmp_path / "d.jsonl", max_queue=1, flush_interval=5, batch_size=1000)
+    for i in range(1000):
+        sink.emit({"i": i})
+    assert sink.dropped > 0
+    sink.close()
+
+
+def test_flush_waits_for_queued_records(tmp_path):
+    path = tmp_path / "d.jsonl"
+    with JsonLinesSink(path, flush_interval=5, batch_size=1000) as sink:
+        sink.emit({"i": 1})
+        assert sink.flush(timeout=5)
+        assert _read_lines(path) == [{"i": 1}]
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_close_returns_when_writer_died_with_full_queue(tmp_path):
+    sink = JsonLinesSink(tmp_path / "d.jsonl", max_queue=1, flush_interval=0.01)
+    sink.emit({"bad": object()})  # 无法序列化：写线程异常退出
+    sink._writer.join(5)
+    assert not sink._writer.is_alive()
+    sink.emit({"i": 1})  # 队列已满且不会再被消费
+    started = time.perf_counter()
+    sink.close()
+    assert time.perf_counter() - started < 1.0
+
+def test_run_agent_streams_records_to_jsonl(tmp_path, monkeypatch):
+    async def fast(query: str):
+        return {"status": "ok", "type": "general", "confidence": 0.9, "content": "快"}
+
+    for name in ("general", "tech", "project"):
+        monkeypatch.setitem(tool_registry.TOOLS, name, fast)
+
+    path = tmp_path / "decisions.jsonl"
+    with JsonLinesSink(path, flush_interval=0.01) as sink:
+        out = asyncio.run(run_agent("jsonl 测试", log_sink=sink))
+    assert str(path) in out
+
+    records = _read_lines(path)
+    assert any(r.get("action") == "step_complete" for r in records)
+    metrics = [r for r in records if r.get("kind") == "metrics"]
+    assert len(metrics) == 1 and "timeout_rate" in metrics[0]
+
+
+def test_per_trace_sink_discards_aborted_trace(tmp_path):
+    sink = PerTraceJsonSink(tmp_path)
+    sink.emit({"trace_id": "t", "action": "x"})
+    sink.abort_trace("t")
+    decision, metrics = asyncio.run(sink.close_trace("t", {"trace_id": "t"}))
+    assert json.loads(decision.read_text(encoding="utf-8")) == []
+
+
+def _log_sample(log):
+    log(action="plan", planner="static", steps=["a", "b"])
+    log("a", candidate_tools=["tech", "general"])
+    log("a", "cache_hit", tool="tech")
+    log("a", tool="general", status="ok", confidence=0.8)
+    log("b", "no_valid_result")
+
+
+def test_compact_records_serialize_to_original_shape(tmp_path):
+    expected = [
+        {"trace_id": "t", "action": "plan", "planner": "static", "steps": ["a", "b"]},
+        {"trace_id": "t", "step": "a", "candidate_tools": ["tech", "general"]},
+        {"trace_id": "t", "step": "a", "tool": "tech", "action": "cache_hit"},
+        {"trace_id": "t", "step": "a", "tool": "general", "status": "ok", "confidence": 0.8},
+        {"trace_id": "t", "step": "b", "action": "no_valid_result"},
+    ]
+
+    def without_time(records):
+        assert all(isinstance(r.pop("time"), float) for r in records)
+        return records
+
+    # 列式缓冲（PerTraceJsonSink）
+    sink = PerTraceJsonSink(tmp_path)
+    _log_sample(sink.decision_log("t"))
+    decision, _ = asyncio.run(sink.close_trace("t", {}))
+    assert without_time(json.loads(decision.read_text(encoding="utf-8"))) == expected
+
+    # 逐条紧凑记录（JsonLinesSink）
+    path = tmp_path / "decisions.jsonl"
+    with JsonLinesSink(path, flush_interval=0.01) as jsonl:
+        _log_sample(jsonl.decision_log("t"))
+    assert without_time(_read_lines(path)) == expected
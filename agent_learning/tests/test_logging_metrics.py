@@ -1,9 +1,9 @@
 import re
-from pathlib import Path
 import json
 import asyncio
 
 from agent_learning.agent import run_agent
+from agent_learning.log_sink import DEFAULT_LOG_SINK
 
 
 def test_decision_log_and_metrics_written():
@@ -13,16 +13,16 @@ def test_decision_log_and_metrics_written():
     assert m, "无法在输出中找到 trace_id"
     trace_id = m.group(1)
 
-    logs_dir = Path(__file__).resolve().parents[1] / "logs"
-    decision_path = logs_dir / f"decision_{trace_id}.json"
-    metrics_path = logs_dir / f"metrics_{trace_id}.json"
+    # 默认 sink：所有 run 共用 logs/decisions.jsonl，由后台线程写入
+    assert DEFAULT_LOG_SINK.flush(timeout=5)
+    path = DEFAULT_LOG_SINK.path
+    assert f"【决策日志】 {path}" in out, f"决策日志路径缺失: {path}"
 
-    assert decision_path.exists(), f"决策日志文件缺失: {decision_path}"
-    assert metrics_path.exists(), f"指标文件缺失: {metrics_path}"
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    records = [r for r in records if r.get("trace_id") == trace_id]
+    dec = [r for r in records if r.get("kind") != "metrics"]
+    met = [r for r in records if r.get("kind") == "metrics"]
 
-    dec = json.loads(decision_path.read_text(encoding="utf-8"))
-    met = json.loads(metrics_path.read_text(encoding="utf-8"))
-
-    assert isinstance(dec, list)
-    assert "trace_id" in met and met["trace_id"] == trace_id
-    assert "supplement_rate" in met and "timeout_rate" in met
+    assert dec, "决策日志中没有该 trace 的记录"
+    assert len(met) == 1
+    assert "supplement_rate" in met[0] and "timeout_rate" in met[0]
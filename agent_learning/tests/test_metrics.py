@@ -0,0 +1,67 @@
+import asyncio
+import json
+import re
+from pathlib import Path
+
+from agent_learning import agent as agent_module
+from agent_learning import tool_registry
+from agent_learning.agent import run_agent
+from agent_learning.log_sink import PerTraceJsonSink
+from agent_learning.metrics import METRICS, Histogram, MetricSet, RunMetrics
+
+
+def test_histogram_percentiles_and_merge():
+    a, b = Histogram(), Histogram()
+    for i in range(1, 51):
+        a.observe(i / 100)
+    for i in range(51, 101):
+        b.observe(i / 100)
+    a.merge(b)
+    summary = a.summary()
+    assert summary["count"] == 100
+    assert abs(summary["p50"] - 0.5) < 0.02
+    assert abs(summary["p99"] - 0.99) < 0.02
+
+
+def test_snapshot_roundtrip_and_prometheus_text():
+    run = RunMetrics("t")
+    run.record_tool("tech", 0.2, "ok")
+    run.record_tool("tech", 3.0, "timeout")
+    run.record_cache("memory", hit=True)
+
+    merged = MetricSet()
+    merged.merge_snapshot(json.loads(json.dumps(run.snapshot())))
+    assert merged.counter("tool_calls_total", tool="tech") == 2
+    assert merged.counter("tool_calls_total", status="timeout") == 1
+
+    text = merged.to_prometheus()
+    assert 'agent_tool_calls_total{status="timeout",tool="tech"} 1' in text
+    assert 'agent_tool_latency_seconds_bucket{tool="tech",le="+Inf"} 2' in text
+    assert 'agent_tool_latency_seconds_count{tool="tech"} 2' in text
+
+
+def test_run_metrics_file_reports_rates(monkeypatch, tmp_path):
+    async def slow(query: str):
+        await asyncio.sleep(1)
+        return {"status": "ok", "type": "tech", "confidence": 0.9, "content": "慢"}
+
+    async def fast(query: str):
+        return {"status": "ok", "type": "general", "confidence": 0.9, "content": "快"}
+
+    monkeypatch.setattr(agent_module, "TOOL_TIMEOUT", 0.1)
+    monkeypatch.setitem(tool_registry.TOOLS, "tech", slow)
+    monkeypatch.setitem(tool_registry.TOOLS, "general", fast)
+    monkeypatch.setitem(tool_registry.TOOLS, "project", fast)
+    runs_before = METRICS.counter("runs_total")
+
+    out = asyncio.run(run_agent("指标测试", log_sink=PerTraceJsonSink(tmp_path)))
+    path = re.search(r"【指标文件】 (\S+)", out).group(1)
+    met = json.loads(Path(path).read_text(encoding="utf-8"))
+
+    # 第二、三步各调用一次 tech（被 single-flight 合并但各自计时），都超时
+    assert met["tool_calls"] == 5
+    assert met["timeout_rate"] == 2 / 5
+    assert met["supplement_rate"] == 0
+    assert met["cache"]["memory"]["misses"] == 5
+    assert set(met["tool_latency"]) == {"general", "project", "tech"}
+    assert METRICS.counter("runs_total") == runs_before + 1
@@ -31,3 +31,176 @@ def test_persistent_state_prevents_second_call(tmp_path, monkeypatch):
     result2 = asyncio.run(run_agent("持久化测试", persistent_state=store))
     assert called["flag"] is False
     assert "任务完成" in result2
+
+
+def test_persistent_cache_is_scoped_to_task(tmp_path, install_tools):
+    # 不同任务即使 step 相同也不应命中彼此的持久化结果
+    install_tools(content="结果：{query}")
+
+    store = FileState(tmp_path / "persist_state.json")
+    asyncio.run(run_agent("任务 A", persistent_state=store))
+    result = asyncio.run(run_agent("任务 B", persistent_state=store))
+
+    assert "结果：任务 B" in result
+    assert "结果：任务 A" not in result
+
+
+def test_run_against_new_empty_sqlite_store_persists_results(tmp_path, install_tools):
+    from agent_learning.state import SQLiteState
+
+    queries = install_tools(delay=0, content="结果：{query}")
+
+    with SQLiteState(tmp_path / "state.db") as store:
+        assert len(store) == 0 and store
+        asyncio.run(run_agent("空库任务", persistent_state=store))
+        assert len(store) > 0
+        calls = len(queries)
+        asyncio.run(run_agent("空库任务", persistent_state=store))
+        assert len(queries) - calls < calls  # 各 step 的最佳结果从 store 读回
+
+
+def test_stale_results_are_served_while_one_background_refresh_runs(tmp_path, monkeypatch):
+    from agent_learning import tool_registry
+    from agent_learning.agent import run_agent_stream
+    from agent_learning.cache import REVALIDATOR
+
+    calls = []
+
+    async def slow_tool(q: str):
+        calls.append(q)
+        await asyncio.sleep(0.2)
+        return {"status": "ok", "type": "general", "confidence": 0.9, "content": f"第 {len(calls)} 次结果"}
+
+    monkeypatch.setitem(tool_registry.TOOLS, "general", slow_tool)
+    store = FileState(tmp_path / "persist_state.json")
+
+    async def run(task):
+        return [e async for e in run_agent_stream(task, persistent_state=store, cache_ttl=0.0)]
+
+    async def main():
+        await run("理解背景")
+        assert len(calls) == 1
+        # cache_ttl=0：条目立刻变为 stale，并发的两个 run 都立即拿到旧结果，只触发一次刷新
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        runs = await asyncio.gather(run("理解背景"), run("理解背景"))
+        elapsed = loop.time() - started
+        await REVALIDATOR.wait()
+        return runs, elapsed
+
+    runs, elapsed = asyncio.run(main())
+    assert elapsed < 0.2
+    for events in runs:
+        sources = {e["source"] for e in events if e["event"] == "tool_result"}
+        assert sources == {"stale_cache"}
+        assert "第 1 次结果" in events[-1]["final_result"]
+    assert len(calls) == 2
+    assert "第 2 次结果" in asyncio.run(run_agent("理解背景", persistent_state=store))
+
+
+def test_recent_failures_are_negatively_cached(tmp_path, monkeypatch):
+    from agent_learning import tool_registry
+    from agent_learning.agent import run_agent_stream
+
+    calls = []
+
+    async def dead_tool(q: str):
+        calls.append(q)
+        raise RuntimeError("backend down")
+
+    async def fast_tool(q: str):
+        return {"status": "ok", "type": "tech", "confidence": 0.9, "content": "ok"}
+
+    for name in ("tech", "project"):
+        monkeypatch.setitem(tool_registry.TOOLS, name, fast_tool)
+    monkeypatch.setitem(tool_registry.TOOLS, "general", dead_tool)
+    store = FileState(tmp_path / "persist_state.json")
+
+    def run(**options):
+        async def collect():
+            return [e async for e in run_agent_stream("理解背景", persistent_state=store, **options)]
+        return asyncio.run(collect())
+
+    run()
+    failed = len(calls)
+    assert failed >= 1
+    events = run()
+    # 窗口内不再调用失效的工具，直接按失败处理
+    assert len(calls) == failed
+    general = [(e["source"], e["status"]) for e in events if e["event"] == "tool_result" and e["tool"] == "general"]
+    assert general and set(general) == {("negative_cache", "error")}
+
+    # 负缓存关闭时每次都重新调用
+    store = FileState(tmp_path / "short.json")
+    run(negative_ttl=0.0)
+    run(negative_ttl=0.0)
+    assert len(calls) >= failed + 2
+
+
+def test_failed_refresh_keeps_low_confidence_stale_entry_stale(tmp_path, monkeypatch, install_tools):
+    from agent_learning import tool_registry
+    from agent_learning.agent import run_agent_stream
+    from agent_learning.cache import REVALIDATOR, make_cache_key, read_persisted, wrap_persisted
+    from agent_learning.tool_registry import ToolDescriptor
+
+    step = "分析相关技术原理"
+    calls = install_tools(confidence={"general": 0.3, "tech": 0.9, "project": 0.9})
+
+    async def dead_tool(q: str):
+        calls.append("tech")
+        raise RuntimeError("backend down")
+
+    monkeypatch.setitem(tool_registry.TOOLS, "tech", ToolDescriptor("tech", dead_tool))
+    store = FileState(tmp_path / "persist_state.json")
+    key = make_cache_key("过期刷新失败", step, "tech")
+    # ttl=0：条目立刻变为 stale；置信度不足，是本 step 的最佳结果但仍要补救（补救工具正是 tech）
+    stale = {"status": "ok", "type": "tech", "confidence": 0.5, "content": "旧的技术结果"}
+    store.set(key, wrap_persisted(stale, 0.0, 3600))
+
+    async def main():
+        events = [e async for e in run_agent_stream("过期刷新失败", persistent_state=store)]
+        await REVALIDATOR.wait()
+        return events
+
+    events = asyncio.run(main())
+    sources = [e["source"] for e in events if e["event"] == "tool_result" and e["step"] == step and e["tool"] == "tech"]
+    assert sources == ["stale_cache"]
+    assert "旧的技术结果" in events[-1]["final_result"]
+    assert "tech" in calls  # 后台刷新确实调用过且失败了
+    # 刷新失败、补救复用的也是缓存：条目保持 stale，不会被当作新结果重新持久化
+    value, freshness = read_persisted(store.get(key))
+    assert value == stale and freshness == "stale"
+
+
+def test_throttled_but_healthy_tool_is_not_negatively_cached(tmp_path, monkeypatch):
+    from agent_learning import agent as agent_module
+    from agent_learning import tool_registry
+    from agent_learning.cache import is_negative, read_persisted
+    from agent_learning.rate_limit import ToolLimits
+    from agent_learning.state import SQLiteState
+    from agent_learning.tool_registry import SingleFlight, ToolDescriptor
+
+    def make_tool(name):
+        async def tool(q: str):
+            await asyncio.sleep(0.3)
+            return {"status": "ok", "type": name, "confidence": 0.9, "content": f"{name}：{q}"}
+        return tool
+
+    for name in ("general", "tech", "project"):
+        monkeypatch.setitem(
+            tool_registry.TOOLS, name, ToolDescriptor(name, make_tool(name), limits=ToolLimits(max_inflight=1))
+        )
+    monkeypatch.setattr(tool_registry, "SINGLE_FLIGHT", SingleFlight())
+    monkeypatch.setattr(agent_module, "TOOL_TIMEOUT", 0.5)
+
+    async def main(store):
+        # 每个工具同时只能执行一个调用：排队远超 0.5s，但每次执行只要 0.3s
+        await asyncio.gather(*(run_agent(f"限流任务 {i}", persistent_state=store) for i in range(4)))
+
+    with SQLiteState(tmp_path / "state.db") as store:
+        asyncio.run(main(store))
+        values = [read_persisted(raw)[0] for raw in store.all().values()]
+    assert values and not any(is_negative(value) for value in values)
+    for name in ("general", "tech", "project"):
+        health = tool_registry.TOOLS[name].health
+        assert health.state == "closed" and health.timeout_rate == 0
@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+import pytest
+
+from agent_learning import llm, tool_registry
+from agent_learning.agent import run_agent_stream
+from agent_learning.llm import LLMBatcher, LocalBatchBackend
+from agent_learning.planner import PlanCache, PlanStep, parse_plan, plan_task_graph, plan_task_llm
+
+
+def test_parse_plan_json_lines_and_garbage():
+    steps = parse_plan('好的：[{"description": "背景", "depends_on": []},'
+                       ' {"description": "原理", "depends_on": [0, 5]}]')
+    # 指向自身之后的依赖被丢弃，保证是 DAG
+    assert steps == [PlanStep("背景"), PlanStep("原理", (0,))]
+    assert parse_plan("1. 背景\n2、原理\n- 实践") == [PlanStep("背景"), PlanStep("原理"), PlanStep("实践")]
+    assert parse_plan("【模拟 LLM 回复】无法拆解") is None
+
+
+def test_llm_plan_is_cached_by_normalized_task_and_single_flighted():
+    calls = {"n": 0}
+
+    async def fake_llm(prompt: str) -> str:
+        calls["n"] += 1
+        await asyncio.sleep(0.05)
+        return '["查阅资料", "总结"]'
+
+    cache = PlanCache()
+
+    async def main():
+        first = await asyncio.gather(*(plan_task_llm("解释 Agent", cache, fake_llm) for _ in range(5)))
+        again = await plan_task_llm("  解释   agent ", cache, fake_llm)
+        return first, again
+
+    first, again = asyncio.run(main())
+    assert calls["n"] == 1
+    assert {source for _, source in first} == {"llm"}
+    assert again == ([PlanStep("查阅资料"), PlanStep("总结")], "cache")
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        cache.get("解释 Agent")
+    assert (time.perf_counter() - started) / 1000 < 100e-6
+
+
+def test_unparseable_reply_falls_back_to_static_plan_with_short_ttl():
+    async def junk(prompt: str) -> str:
+        return "无法理解"
+
+    cache = PlanCache()
+    steps, source = asyncio.run(plan_task_llm("任务", cache, junk, fallback_ttl=0.0))
+    assert source == "fallback" and steps == plan_task_graph("任务")
+    time.sleep(0.01)
+    assert cache.get("任务") is None
+
+
+def test_disk_cache_survives_restart_and_is_invalidated_by_version(tmp_path):
+    path = tmp_path / "plans.db"
+    cache = PlanCache(path)
+    cache.set("持久化计划", [PlanStep("a"), PlanStep("b", (0,))], "llm")
+    cache.close()
+
+    reopened = PlanCache(path)
+    assert reopened.get("持久化计划") == ([PlanStep("a"), PlanStep("b", (0,))], "llm")
+    assert reopened.stats()["disk_hits"] == 1
+    reopened.close()
+
+    bumped = PlanCache(path, version="2")
+    assert bumped.get("持久化计划") is None
+    bumped.close()
+
+
+def test_run_agent_uses_cached_llm_plan(monkeypatch):
+    async def tool(query: str):
+        return {"status": "ok", "type": "general", "confidence": 0.9, "content": "内容"}
+
+    for name in ("general", "tech", "project"):
+        monkeypatch.setitem(tool_registry.TOOLS, name, tool)
+    cache = PlanCache()
+    cache.set("LLM 规划", [PlanStep("收集资料"), PlanStep("整理结论", (0,))], "llm")
+
+    async def collect():
+        return [e async for e in run_agent_stream("LLM 规划", planner="llm", plan_cache=cache)]
+
+    events = asyncio.run(collect())
+    assert events[0]["steps"] == ["收集资料", "整理结论"]
+    assert events[-1]["event"] == "run_complete"
+
+    async def unknown_planner():
+        async for _ in run_agent_stream("x", planner="unknown"):
+            pass
+
+    with pytest.raises(ValueError):
+        asyncio.run(unknown_planner())
+
+
+def test_concurrent_llm_plans_share_one_batched_call(monkeypatch):
+    async def tool(query: str):
+        return {"status": "ok", "type": "general", "confidence": 0.9, "content": "内容"}
+
+    for name in ("general", "tech", "project"):
+        monkeypatch.setitem(tool_registry.TOOLS, name, tool)
+    backend = LocalBatchBackend(rtt=0.05)
+    monkeypatch.setattr(llm, "LLM_BATCHER", LLMBatcher(backend, window=0.02))
+    cache = PlanCache()
+
+    async def run(task):
+        return [e async for e in run_agent_stream(task, planner="llm", plan_cache=cache)]
+
+    async def main():
+        return await asyncio.gather(*(run(f"并发规划 {i}") for i in range(5)))
+
+    for events in asyncio.run(main()):
+        assert events[-1]["event"] == "run_complete"
+    # 五个 run 的规划请求在同一个收集窗口内到达，只发出一次批量后端调用
+    assert backend.calls == 1 and backend.prompts == 5
@@ -0,0 +1,50 @@
+from agent_learning.metrics import METRICS
+from agent_learning.planner import PlanCache, PlanStep
+from agent_learning.tracing import Tracer
+
+# 串行依赖的计划：没有预取时每个 step 的工具都要等前一个 step 完成才发起
+CHAIN = [
+    PlanStep("理解问题的通用背景"),
+    PlanStep("分析相关技术原理", (0,)),
+    PlanStep("结合工程或项目实践进行说明", (1,)),
+]
+
+
+def chain_options(task):
+    cache = PlanCache()
+    cache.set(task, CHAIN, "llm")
+    return {"planner": "llm", "plan_cache": cache}
+
+
+def test_prefetch_overlaps_dependent_steps(install_tools, run_stream):
+    calls = install_tools(delay=0.1)
+    baseline_events, baseline = run_stream("串行任务", **chain_options("串行任务"))
+
+    calls.clear()
+    METRICS.reset()
+    events, elapsed = run_stream("串行任务（预取）", prefetch=4, **chain_options("串行任务（预取）"))
+    assert events[-1]["final_result"] == baseline_events[-1]["final_result"]
+    # 后续 step 的工具在第一个 step 执行期间就已发起：三个串行 step 约等于一次工具延迟
+    assert elapsed < baseline - 0.1
+    assert len(calls) <= 5
+    assert METRICS.counter("prefetch_calls_total", result="used") == 4
+    assert METRICS.counter("prefetch_calls_total", result="wasted") == 0
+    assert METRICS.counter("prefetch_saved_seconds_total") > 0.15
+
+
+def test_prefetch_budget_and_unused_calls_are_cancelled(install_tools, run_stream):
+    install_tools(delay=0.05)
+    tracer = Tracer()
+    METRICS.reset()
+    # hedged 模式下首选工具足够好，不会启动备份：为备份工具预取的调用未被消费，step 结束时取消
+    events, _ = run_stream("预取预算", prefetch=1, exec_mode="hedged", tracer=tracer, **chain_options("预取预算"))
+    assert events[-1]["event"] == "run_complete"
+    used = METRICS.counter("prefetch_calls_total", result="used")
+    wasted = METRICS.counter("prefetch_calls_total", result="wasted")
+    assert used >= 1 and wasted >= 1
+    assert METRICS.summary()["prefetch"]["wasted"] == wasted
+
+    # 预算为 1：预取调用之间互不重叠
+    spans = sorted((s for s in tracer.spans if s.name == "prefetch"), key=lambda s: s.start_ns)
+    assert len(spans) == used + wasted
+    assert all(a.end_ns <= b.start_ns for a, b in zip(spans, spans[1:]))
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import pytest
+
+from agent_learning.planner import PlanStep, plan_task, plan_task_graph
+from agent_learning.scheduler import run_dag
+
+
+def test_independent_steps_run_concurrently():
+    steps = [PlanStep("a"), PlanStep("b"), PlanStep("c")]
+
+    async def run_step(idx, step):
+        await asyncio.sleep(0.2)
+        return step.description
+
+    start = time.perf_counter()
+    results = asyncio.run(run_dag(steps, run_step))
+    elapsed = time.perf_counter() - start
+
+    # 结果按计划顺序返回，总耗时约等于单个步骤耗时
+    assert results == ["a", "b", "c"]
+    assert elapsed < 0.4
+
+
+def test_dependencies_are_respected():
+    steps = [PlanStep("a"), PlanStep("b", depends_on=(0,)), PlanStep("c")]
+    finished = []
+
+    async def run_step(idx, step):
+        await asyncio.sleep(0.05 if step.description != "a" else 0.1)
+        finished.append(step.description)
+        return idx
+
+    results = asyncio.run(run_dag(steps, run_step))
+    assert results == [0, 1, 2]
+    assert finished.index("a") < finished.index("b")
+
+
+def test_cycle_is_rejected():
+    steps = [PlanStep("a", depends_on=(1,)), PlanStep("b", depends_on=(0,))]
+
+    async def run_step(idx, step):
+        return idx
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_dag(steps, run_step))
+
+
+def test_repeated_dependency_is_not_a_cycle():
+    steps = [PlanStep("a"), PlanStep("b", depends_on=(0, 0))]
+
+    async def run_step(idx, step):
+        return idx
+
+    assert asyncio.run(run_dag(steps, run_step)) == [0, 1]
+
+
+def test_plan_task_keeps_string_interface():
+    assert plan_task("任意任务") == [s.description for s in plan_task_graph("任意任务")]
@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import pytest
+
+from agent_learning.client import AgentClient, ServerRejected
+from agent_learning.server import AgentServer
+
+
+async def with_server(tmp_path, scenario, **options):
+    server = AgentServer(state_path=tmp_path / "state.db", **options)
+    path = tmp_path / "s.sock"
+    listener = await server.start(path)
+    try:
+        async with AgentClient(path=path) as client:
+            return await scenario(server, client)
+    finally:
+        listener.close()
+        await listener.wait_closed()
+        await server.close()
+
+
+def test_server_streams_events_and_keeps_state_warm(install_tools, tmp_path):
+    calls = install_tools()
+
+    async def scenario(server, client):
+        events = [e async for e in client.stream("常驻服务任务")]
+        first_calls = len(calls)
+        # 同一连接上的第二个请求复用服务端常驻的缓存：各 step 的最佳结果不再调用工具
+        done = await client.run("常驻服务任务")
+        assert len(calls) - first_calls < first_calls
+        assert await client.ping()
+        return events, done, await client.stats()
+
+    events, done, stats = asyncio.run(with_server(tmp_path, scenario))
+    assert events[0]["event"] == "run_started" and events[-1]["event"] == "run_complete"
+    assert len({e["id"] for e in events}) == 1
+    assert done["event"] == "run_complete" and done["final_result"]
+    assert stats["server"]["completed"] == 2 and stats["server"]["rejected"] == 0
+    assert stats["agent"]["cache"]["persistent"]["hits"] >= 3
+    assert stats["memory_cache"]["entries"] >= 3
+
+
+def test_admission_control_rejects_when_overloaded(install_tools, tmp_path):
+    install_tools(delay=0.2)
+
+    async def scenario(server, client):
+        results = await asyncio.gather(
+            *(client.run(f"过载任务 {i}") for i in range(4)), return_exceptions=True
+        )
+        return results, await client.stats()
+
+    results, stats = asyncio.run(with_server(tmp_path, scenario, max_concurrency=1, max_queue=1))
+    rejected = [r for r in results if isinstance(r, ServerRejected)]
+    completed = [r for r in results if isinstance(r, dict)]
+    # 一个执行、一个排队，其余立即被拒绝
+    assert len(completed) == 2 and len(rejected) == 2
+    assert stats["server"]["rejected"] == 2
+    assert stats["server"]["queue_latency"]["count"] == 2
+
+
+def test_invalid_requests_get_error_responses(install_tools, tmp_path):
+    install_tools()
+    server = AgentServer()
+    lines = [
+        b"not json\n",
+        json.dumps({"id": "a", "task": ""}).encode() + b"\n",
+        json.dumps({"id": "b", "task": "t", "options": {"cache": None}}).encode() + b"\n",
+        json.dumps({"id": "c", "task": "合法任务", "options": {"deadline": 5}}).encode() + b"\n",
+    ]
+    written = []
+
+    async def readline():
+        return lines.pop(0) if lines else b""
+
+    async def write(data):
+        written.append(json.loads(data))
+
+    async def main():
+        await server.serve_lines(readline, write)
+        await server.close()
+
+    asyncio.run(main())
+    errors = [m for m in written if m["event"] == "error"]
+    assert [m["id"] for m in errors] == [None, "a", "b"]
+    assert written[-1]["id"] == "c" and written[-1]["event"] == "run_complete"
+    with pytest.raises(ValueError):
+        AgentServer(max_concurrency=0)
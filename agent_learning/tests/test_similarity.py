@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from agent_learning import tool_registry
+from agent_learning.agent import run_agent_stream
+from agent_learning.similarity import SimilarityIndex, vectorize
+from agent_learning.state import SQLiteState
+
+
+def test_near_duplicate_tasks_are_similar_but_different_keywords_are_not():
+    a = vectorize("解释什么是 asyncio")
+    assert float(a @ vectorize("解释一下 asyncio 是什么")) >= 0.75
+    assert float(a @ vectorize("解释什么是 async")) < 0.75
+    assert float(a @ vectorize("  解释什么是 AsyncIO ")) == pytest.approx(1.0)
+
+
+def test_nearest_excludes_the_task_itself():
+    index = SimilarityIndex()
+    index.add_many(["解释什么是 asyncio", "如何部署 Kubernetes 集群", "Redis 缓存淘汰策略"])
+    assert index.add("解释什么是 asyncio") == 0
+    assert len(index) == 3
+
+    matches = index.nearest("解释一下 asyncio 是什么")
+    assert [task for task, _ in matches] == ["解释什么是 asyncio"]
+    assert index.nearest("解释什么是 asyncio") == []
+
+
+def test_lsh_search_finds_rewritten_tasks():
+    tasks = [f"主题 {i} 的 topic{i} 设计与实现" for i in range(3000)]
+    index = SimilarityIndex(exact_limit=0, tail_limit=512)
+    index.add_many(tasks)
+    index.compact()
+
+    found = sum(index.search(f"请说明主题 {i} 的 topic{i} 设计与实现", k=1)[0][0] == tasks[i]
+                for i in range(0, 3000, 100))
+    assert found >= 28
+
+
+def test_compaction_runs_off_the_event_loop():
+    index = SimilarityIndex(exact_limit=0, tail_limit=64)
+    index.add_many([f"基础任务 {i} base{i}" for i in range(2000)])
+    assert index._tail_n == 0
+
+    async def main():
+        for i in range(64):
+            index.add(f"新任务 {i} fresh{i}")
+        # 攒满 tail 后合并在线程中进行：add 立即返回，期间查询仍能看到 tail 中的新条目
+        assert index._compacting is not None and index._tail_n == 64
+        assert index.search("新任务 63 fresh63", k=1)[0][0] == "新任务 63 fresh63"
+        index.add("合并期间插入 during")
+        await index.wait_compacted()
+
+    asyncio.run(main())
+    assert len(index._base_vectors) >= 2064 and len(index._base_vectors) + index._tail_n == 2065
+    assert index.search("新任务 5 fresh5", k=1)[0][0] == "新任务 5 fresh5"
+    assert index.search("合并期间插入 during", k=1)[0][0] == "合并期间插入 during"
+    assert index.add("基础任务 7 base7") == 7
+
+
+def test_save_and_mmap_load_then_insert(tmp_path):
+    index = SimilarityIndex(exact_limit=0)
+    index.add_many([f"任务 {i} keyword{i}" for i in range(500)])
+    index.save(tmp_path / "index")
+
+    loaded = SimilarityIndex.load(tmp_path / "index", mmap=True)
+    assert len(loaded) == 500
+    assert isinstance(loaded._base_vectors, np.memmap)
+    assert loaded.search("任务 42 keyword42", k=1)[0][0] == "任务 42 keyword42"
+
+    loaded.add("全新的任务 fresh")
+    assert loaded.search("全新的任务 fresh", k=1)[0][0] == "全新的任务 fresh"
+    assert loaded.add("任务 7 keyword7") == 7
+
+
+def test_agent_reuses_results_of_similar_task(monkeypatch, tmp_path):
+    calls = {"n": 0}
+
+    def make_tool(name):
+        async def tool(query: str):
+            calls["n"] += 1
+            return {"status": "ok", "type": name, "confidence": 0.9, "content": f"{name}:{query}"}
+        return tool
+
+    for name in ("general", "tech", "project"):
+        monkeypatch.setitem(tool_registry.TOOLS, name, make_tool(name))
+    store = SQLiteState(tmp_path / "state.db")
+    index = SimilarityIndex()
+
+    async def run(task):
+        return [e async for e in run_agent_stream(task, persistent_state=store, similarity=index)]
+
+    asyncio.run(run("解释什么是 asyncio"))
+    assert calls["n"] > 0 and len(index) == 1
+
+    # 每个 step 的最优结果都写入了 persistent_state，近似任务的每个 step 都能直接复用
+    events = asyncio.run(run("解释一下 asyncio 是什么"))
+    reused = {e["index"] for e in events if e["event"] == "tool_result" and e["source"] == "similar_cache"}
+    assert reused == {0, 1, 2}
+    assert "general:解释什么是 asyncio" in events[-1]["final_result"]
+    assert len(index) == 2
+
+    events = asyncio.run(run("解释什么是 async"))
+    assert all(e["source"] != "similar_cache" for e in events if e["event"] == "tool_result")
+    store.close()
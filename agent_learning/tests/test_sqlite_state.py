@@ -0,0 +1,73 @@
+import json
+import multiprocessing
+
+from agent_learning.state import SQLiteState
+
+
+def test_set_get_roundtrip_survives_reopen(tmp_path):
+    path = tmp_path / "state.db"
+    with SQLiteState(path) as store:
+        store.set("a", {"confidence": 0.8})
+        assert store.get("a") == {"confidence": 0.8}
+        assert store.get("missing") is None
+
+    with SQLiteState(path) as store:
+        assert store.get("a") == {"confidence": 0.8}
+        assert store.all() == {"a": {"confidence": 0.8}}
+
+
+def test_migrate_from_json_file_state(tmp_path):
+    legacy = tmp_path / "persist_state.json"
+    legacy.write_text(json.dumps({"k1": {"v": 1}, "k2": {"v": 2}}), encoding="utf-8")
+
+    with SQLiteState(tmp_path / "state.db", migrate_from=legacy) as store:
+        assert store.get("k2") == {"v": 2}
+        # 目标库非空时不会重复导入
+        assert store.migrate_from_json(legacy) == 0
+
+
+def _writer(path: str, prefix: str, n: int) -> None:
+    with SQLiteState(path, batch_size=16) as store:
+        for i in range(n):
+            store.set(f"{prefix}:{i}", i)
+
+
+def test_multi_process_writers_do_not_lose_data(tmp_path):
+    path = str(tmp_path / "shared.db")
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_writer, args=(path, f"p{i}", 200)) for i in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    with SQLiteState(path) as store:
+        assert len(store) == 600
+
+
+def test_reads_do_not_wait_for_a_blocked_writer(tmp_path):
+    import sqlite3
+    import threading
+    import time
+
+    path = tmp_path / "state.db"
+    with SQLiteState(path, refresh_interval=0.0) as store:
+        store.set("a", 1)
+        store.save()
+        # 另一个进程（这里用另一个连接模拟）持有写锁，后台提交卡在 BEGIN IMMEDIATE 上
+        other = sqlite3.connect(str(path), isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        store.set("b", 2)
+        flusher = threading.Thread(target=store.save)
+        flusher.start()
+        try:
+            time.sleep(0.1)
+            started = time.perf_counter()
+            assert store.get("missing") is None
+            assert store.get("b") == 2
+            assert time.perf_counter() - started < 0.5
+        finally:
+            other.execute("COMMIT")
+            other.close()
+            flusher.join()
+        assert store.all() == {"a": 1, "b": 2}
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from agent_learning import tool_registry
+from agent_learning.agent import run_agent_stream
+
+
+def _patch_tools(monkeypatch, delays: dict[str, float]):
+    def make(name: str, delay: float):
+        async def tool(query: str):
+            await asyncio.sleep(delay)
+            return {"status": "ok", "type": name, "confidence": 0.9, "content": f"{name} 内容"}
+        return tool
+
+    for name, delay in delays.items():
+        monkeypatch.setitem(tool_registry.TOOLS, name, make(name, delay))
+
+
+def test_stream_yields_events_before_slowest_step(monkeypatch):
+    _patch_tools(monkeypatch, {"general": 0.05, "tech": 0.5, "project": 0.5})
+
+    async def collect():
+        start = time.perf_counter()
+        seen = []
+        async for event in run_agent_stream("流式测试"):
+            seen.append((event["event"], time.perf_counter() - start, event))
+        return seen
+
+    seen = asyncio.run(collect())
+    kinds = [kind for kind, _, _ in seen]
+    assert kinds[0] == "run_started" and kinds[-1] == "run_complete"
+    assert {"step_started", "tool_result", "best_chosen", "step_complete"} <= set(kinds)
+
+    # 第一个 step_complete（通用背景步骤）远早于整个 run 结束
+    first_complete = next(t for kind, t, _ in seen if kind == "step_complete")
+    run_complete = seen[-1][1]
+    assert first_complete < 0.3 < run_complete
+
+    # final_result 仍按计划顺序拼接
+    final = seen[-1][2]["final_result"]
+    assert final.index("general 内容") < final.index("tech 内容") < final.index("project 内容")
+
+
+def test_closing_stream_early_cancels_running_steps(monkeypatch):
+    _patch_tools(monkeypatch, {"general": 0.01, "tech": 5, "project": 5})
+
+    async def first_step_only():
+        stream = run_agent_stream("提前结束")
+        async for event in stream:
+            if event["event"] == "step_complete":
+                break
+        await stream.aclose()
+        return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+    start = time.perf_counter()
+    leftover = asyncio.run(first_step_only())
+    assert time.perf_counter() - start < 2
+    assert leftover == []
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import re
+from pathlib import Path
+
+from agent_learning import tool_registry
+from agent_learning.agent import run_agent
+from agent_learning.cache import make_cache_key, unwrap_persisted
+from agent_learning.log_sink import PerTraceJsonSink
+from agent_learning.state import FileState
+
+
+def _low(tool_type: str):
+    async def tool(query: str):
+        await asyncio.sleep(0.05)
+        return {"status": "ok", "type": tool_type, "confidence": 0.3, "content": f"{tool_type} 低置信"}
+    return tool
+
+
+def test_supplement_reuses_run_memo_and_is_cached(tmp_path, monkeypatch):
+    tech_calls = {"n": 0}
+
+    async def tech(query: str):
+        tech_calls["n"] += 1
+        await asyncio.sleep(0.05)
+        return {"status": "ok", "type": "tech", "confidence": 0.5, "content": "技术补充"}
+
+    monkeypatch.setitem(tool_registry.TOOLS, "tech", tech)
+    monkeypatch.setitem(tool_registry.TOOLS, "general", _low("general"))
+    monkeypatch.setitem(tool_registry.TOOLS, "project", _low("project"))
+    store = FileState(tmp_path / "state.json")
+
+    out = asyncio.run(run_agent("补救复用测试", persistent_state=store, log_sink=PerTraceJsonSink(tmp_path)))
+    log_path = re.search(r"【决策日志】 (\S+)", out).group(1)
+    records = json.loads(Path(log_path).read_text(encoding="utf-8"))
+    met = json.loads(Path(re.search(r"【指标文件】 (\S+)", out).group(1)).read_text(encoding="utf-8"))
+
+    # 三个步骤都需要补救，但都复用了执行层已发起的 tech 调用
+    reused = [r for r in records if r.get("action") == "supplement_reused"]
+    assert len(reused) == 3
+    assert {r["source"] for r in reused} <= {"inflight", "finished"}
+    assert met["supplement_rate"] == 1
+    assert met["tool_calls"] == 5  # 只有执行层的 5 次调用
+    assert tech_calls["n"] == 1    # 并发的相同调用被 single-flight 合并
+    assert out.count("技术补充") == 5  # 第二、三步的最优结果本身就是 tech
+
+    # 补救结果写入持久化状态（第一步的候选工具里没有 tech）
+    step = "理解问题的通用背景"
+    assert unwrap_persisted(store.get(make_cache_key("补救复用测试", step, "tech")))["content"] == "技术补充"
+
+
+def test_supplement_does_not_write_back_or_learn_cache_hits(tmp_path, monkeypatch):
+    from agent_learning.cache import wrap_persisted
+    from agent_learning.tool_policy import ToolPolicy
+
+    async def dead(query: str):
+        raise RuntimeError("backend down")
+
+    monkeypatch.setitem(tool_registry.TOOLS, "tech", dead)
+    monkeypatch.setitem(tool_registry.TOOLS, "general", _low("general"))
+    monkeypatch.setitem(tool_registry.TOOLS, "project", _low("project"))
+
+    # 第二、三步的 tech 命中持久化缓存并登记进 memo；第一步（只有 general）补救 tech 时复用的正是这条缓存
+    task = "缓存补救测试"
+    store = FileState(tmp_path / "state.json")
+    cached = {"status": "ok", "type": "tech", "confidence": 0.9, "content": "缓存的技术结果"}
+    for cached_step in ("分析相关技术原理", "结合工程或项目实践进行说明"):
+        store.set(make_cache_key(task, cached_step, "tech"), wrap_persisted(cached, ttl=3600))
+
+    policy = ToolPolicy()
+    out = asyncio.run(run_agent(task, persistent_state=store, tool_policy=policy,
+                                log_sink=PerTraceJsonSink(tmp_path)))
+    assert out.count("缓存的技术结果") == 3
+
+    # 复用的缓存结果不会以新的时间戳写到第一步的 key 下，也不会被当作新样本学习
+    step = "理解问题的通用背景"
+    assert store.get(make_cache_key(task, step, "tech")) is None
+    assert "tech" not in policy.stats(step)
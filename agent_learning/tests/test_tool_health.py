@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from agent_learning import agent as agent_module
+from agent_learning import tool_registry
+from agent_learning.agent import choose_candidate_tools
+from agent_learning.tool_registry import (
+    CircuitOpenError,
+    SingleFlight,
+    ToolDescriptor,
+    ToolHealth,
+    call_tool,
+)
+
+
+def test_adaptive_timeout_follows_observed_latency():
+    desc = ToolDescriptor("t", lambda q: None, min_timeout=0.01)
+    # 样本不足时使用调用方给出的上限
+    assert desc.timeout(3.0) == 3.0
+
+    for _ in range(ToolHealth.MIN_SAMPLES):
+        desc.health.record_success(0.1)
+    assert desc.timeout(3.0) == pytest.approx(0.1 * ToolHealth.TIMEOUT_MULTIPLIER)
+    # 上限依然生效
+    assert desc.timeout(0.05) == 0.05
+    assert desc.health.ewma_latency == pytest.approx(0.1)
+
+
+def test_breaker_opens_after_consecutive_failures_and_half_opens(monkeypatch):
+    health = ToolHealth()
+    now = {"t": 100.0}
+    monkeypatch.setattr(tool_registry.time, "monotonic", lambda: now["t"])
+
+    for _ in range(ToolHealth.FAILURE_THRESHOLD):
+        assert health.try_acquire()
+        health.record_failure(timed_out=True)
+    assert health.state == "open"
+    assert not health.available()
+    assert health.timeout_rate > 0
+
+    now["t"] += ToolHealth.COOLDOWN
+    assert health.available()
+    assert health.try_acquire()          # 半开探测
+    assert health.state == "half_open"
+    assert not health.try_acquire()      # 同一时间只放行一个探测
+
+    health.record_failure(timed_out=False)  # 探测失败，重新打开
+    assert health.state == "open"
+    now["t"] += ToolHealth.COOLDOWN
+    assert health.try_acquire()
+    health.record_success(0.01)             # 探测成功，关闭
+    assert health.state == "closed"
+    assert health.error_rate > 0
+
+
+def test_open_breaker_rejects_calls_and_is_skipped_by_decision_layer(monkeypatch):
+    calls = {"n": 0}
+
+    async def broken(query: str):
+        calls["n"] += 1
+        raise RuntimeError("backend down")
+
+    monkeypatch.setitem(tool_registry.TOOLS, "tech", broken)
+    monkeypatch.setattr(tool_registry, "SINGLE_FLIGHT", SingleFlight())
+
+    async def main():
+        for i in range(ToolHealth.FAILURE_THRESHOLD):
+            with pytest.raises(RuntimeError):
+                await call_tool("tech", f"q{i}")
+        with pytest.raises(CircuitOpenError):
+            await call_tool("tech", "q-next")
+
+    asyncio.run(main())
+    assert calls["n"] == ToolHealth.FAILURE_THRESHOLD
+    assert choose_candidate_tools("分析相关技术原理") == ["general"]
+    assert tool_registry.TOOLS.stats()["tech"]["state"] == "open"
+
+
+def test_slow_tool_times_out_at_adaptive_deadline(monkeypatch):
+    async def tool(query: str):
+        await asyncio.sleep(1.0 if query == "slow" else 0.01)
+        return {"status": "ok", "type": "general", "confidence": 0.9, "content": query}
+
+    monkeypatch.setitem(tool_registry.TOOLS, "general", tool)
+    monkeypatch.setattr(tool_registry, "SINGLE_FLIGHT", SingleFlight())
+
+    async def main():
+        for i in range(ToolHealth.MIN_SAMPLES):
+            await call_tool("general", f"q{i}", timeout=agent_module.TOOL_TIMEOUT)
+        started = asyncio.get_running_loop().time()
+        with pytest.raises(asyncio.TimeoutError):
+            await call_tool("general", "slow", timeout=agent_module.TOOL_TIMEOUT)
+        return asyncio.get_running_loop().time() - started
+
+    elapsed = asyncio.run(main())
+    # 远小于 TOOL_TIMEOUT：超时由观测到的延迟决定（下限 min_timeout）
+    assert elapsed < 0.5
+    assert tool_registry.TOOLS["general"].health.timeout_rate > 0
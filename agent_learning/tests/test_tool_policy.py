@@ -0,0 +1,99 @@
+import json
+from pathlib import Path
+
+from agent_learning.log_sink import PerTraceJsonSink
+from agent_learning.state import FileState
+from agent_learning.tool_policy import ToolPolicy
+
+CONFIDENCE = {"general": 0.4, "tech": 0.8, "project": 0.7}
+
+
+def decisions(events):
+    entries = json.loads(Path(events[-1]["decision_path"]).read_text(encoding="utf-8"))
+    return {e["step"]: e for e in entries if "candidate_tools" in e}
+
+
+def test_policy_narrows_to_minimal_sufficient_set():
+    policy = ToolPolicy(explore=0, min_samples=5)
+    step = "分析相关技术原理"
+    for i in range(4):
+        policy.record(step, "tech", "ok", 0.8)
+        policy.record(step, "general", "ok", 0.4)
+    # 样本不足：保持路由给出的全量扇出
+    assert policy.select(step, ["tech", "general"]) == ["tech", "general"]
+
+    for i in range(6):
+        policy.record(step, "tech", "ok", 0.8)
+        policy.record(step, "general", "ok", 0.4)
+    assert policy.select(step, ["tech", "general"]) == ["tech"]
+    assert policy.expected(step, ["tech"])["p_clear"] >= 0.9
+    assert policy.stats()["narrowed"] == 1
+
+    # 工具开始失败后统计随之变化，重新扇出
+    for i in range(10):
+        policy.record(step, "tech", "error", 0.0)
+    assert set(policy.select(step, ["tech", "general"])) == {"tech", "general"}
+
+
+def test_agent_learns_from_runs_and_persists(install_tools, run_stream, tmp_path):
+    calls = install_tools(delay=0.001, confidence=CONFIDENCE)
+    path = tmp_path / "policy.db"
+    policy = ToolPolicy(path=path, explore=0)
+    for i in range(10):
+        run_stream(f"策略学习任务 {i}", tool_policy=policy)
+    policy.close()
+
+    # 新进程（新实例）从 SQLite 读回统计
+    policy = ToolPolicy(path=path, explore=0)
+    calls.clear()
+    events, _ = run_stream("策略学习任务 终", tool_policy=policy, log_sink=PerTraceJsonSink(tmp_path))
+    policy.close()
+    steps = decisions(events)
+
+    # 技术 step：tech 足够，不再扇出到 general
+    assert steps["分析相关技术原理"]["candidate_tools"] == ["tech"]
+    assert steps["分析相关技术原理"]["pruned_tools"] == ["general"]
+    # 通用 step：路由只给出 general（置信度不足，每次都要补救），学到的 tech 直接替代它
+    assert steps["理解问题的通用背景"]["candidate_tools"] == ["tech"]
+    assert not any(e["event"] == "supplement" for e in events)
+    assert "general" not in calls
+
+
+def test_fit_from_decision_log_files(install_tools, run_stream, tmp_path):
+    install_tools(delay=0.001, confidence=CONFIDENCE)
+    sink = PerTraceJsonSink(tmp_path)
+    paths = [run_stream(f"回放任务 {i}", log_sink=sink)[0][-1]["decision_path"] for i in range(8)]
+
+    policy = ToolPolicy(explore=0)
+    learned = policy.fit_decision_files(paths)
+    assert learned >= 8 * 5
+    stats = policy.stats("分析相关技术原理")
+    assert stats["tech"]["n"] == 8 and stats["general"]["p_clear"] < 0.2
+    assert policy.select("分析相关技术原理", ["tech", "general"]) == ["tech"]
+
+
+def test_replay_skips_cached_cut_and_cancelled_results(install_tools, run_stream, tmp_path):
+    step = "分析相关技术原理"
+    entries = [
+        {"step": step, "tool": "tech", "status": "ok", "confidence": 0.8},
+        {"step": step, "tool": "tech", "status": "ok", "confidence": 0.8, "cached": True},
+        {"step": step, "tool": "general", "status": "timeout", "confidence": 0.0, "cached": True},  # 负缓存
+        {"step": step, "tool": "general", "status": "deadline", "confidence": 0.0},
+        {"step": step, "tool": "general", "status": "cancelled", "confidence": 0.0},
+    ]
+    policy = ToolPolicy(explore=0)
+    assert policy.fit_decision_log(entries) == 1
+    assert policy.stats(step)["tech"]["n"] == 1 and "general" not in policy.stats(step)
+
+    # 第二次运行时 tech 的最佳结果来自持久化缓存：回放只学习真实调用的 general
+    install_tools(delay=0.001, confidence=CONFIDENCE)
+    store = FileState(tmp_path / "state.json")
+    sink = PerTraceJsonSink(tmp_path)
+    for _ in range(2):
+        events, _ = run_stream("回放缓存任务", persistent_state=store, log_sink=sink)
+    log = json.loads(Path(events[-1]["decision_path"]).read_text(encoding="utf-8"))
+    assert any(e.get("cached") and e["step"] == step and e["tool"] == "tech" for e in log)
+
+    policy = ToolPolicy(explore=0)
+    policy.fit_decision_log(log)
+    assert "tech" not in policy.stats(step) and policy.stats(step)["general"]["n"] == 1
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from agent_learning import tool_registry
+from agent_learning.agent import run_agent_stream
+from agent_learning.tool_pools import ToolPool
+from agent_learning.tool_registry import SingleFlight, ToolDescriptor, call_tool
+
+
+def test_blocking_thread_tool_does_not_freeze_the_loop(monkeypatch):
+    def blocking_search(query: str):
+        time.sleep(0.2)
+        return {"status": "ok", "type": "tech", "confidence": 0.9, "content": query}
+
+    for name in ("general", "tech", "project"):
+        monkeypatch.setitem(tool_registry.TOOLS, name, ToolDescriptor(name, blocking_search, kind="thread"))
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        tick = asyncio.ensure_future(ticker())
+        events = [e async for e in run_agent_stream("阻塞工具任务")]
+        tick.cancel()
+        return events
+
+    events = asyncio.run(main())
+    assert events[-1]["event"] == "run_complete"
+    assert any(e["event"] == "tool_result" and e["status"] == "ok" for e in events)
+    # 工具在线程池中阻塞时，事件循环上的其他协程仍按时运行
+    gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+    assert gaps and max(gaps) < 0.1
+
+
+def test_timeout_and_cancellation_with_pooled_tools(monkeypatch):
+    pool = ToolPool("thread", max_workers=1)
+    monkeypatch.setitem(tool_registry.POOLS, "thread", pool)
+    monkeypatch.setattr(tool_registry, "SINGLE_FLIGHT", SingleFlight())
+    release = threading.Event()
+    ran = []
+
+    def stuck(query: str):
+        ran.append(query)
+        release.wait(2)
+        return {"status": "ok", "type": "tech", "confidence": 0.9, "content": query}
+
+    monkeypatch.setitem(tool_registry.TOOLS, "tech", ToolDescriptor("tech", stuck, kind="thread", min_timeout=0.01))
+
+    async def main():
+        # 第一个调用占住唯一的 worker 并超时，第二个在排队中被取消
+        first = asyncio.ensure_future(call_tool("tech", "running", timeout=0.1))
+        await asyncio.sleep(0.02)
+        second = asyncio.ensure_future(call_tool("tech", "queued", timeout=5))
+        await asyncio.sleep(0.02)
+        assert pool.stats()["queue_depth"] == 1
+        second.cancel()
+        with pytest.raises(asyncio.TimeoutError):
+            await first
+        with pytest.raises(asyncio.CancelledError):
+            await second
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    assert time.perf_counter() - started < 1
+    release.set()
+    pool.shutdown()
+    assert ran == ["running"]
+    stats = pool.stats()
+    assert stats["cancelled"] == 1 and stats["max_queue_depth"] == 1 and stats["queue_depth"] == 0
+    assert tool_registry.TOOLS["tech"].health.timeout_rate > 0
+
+
+def test_process_tool_runs_in_spawned_worker():
+    pool = ToolPool("process", max_workers=1)
+    # 进程池中的函数必须可 pickle：这里直接用 json.loads 当作"CPU 密集"工具
+    desc = ToolDescriptor("parse", json.loads, kind="process")
+    payload = json.dumps({"status": "ok", "confidence": 0.8})
+
+    async def main():
+        return await pool.run(desc.func, payload)
+
+    try:
+        assert asyncio.run(main()) == {"status": "ok", "confidence": 0.8}
+    finally:
+        pool.shutdown()
+    assert pool.stats()["completed"] == 1
+
+    with pytest.raises(ValueError):
+        ToolDescriptor("bad", json.loads, kind="fiber")
@@ -0,0 +1,65 @@
+import asyncio
+
+from agent_learning import tool_registry
+from agent_learning.tool_registry import SingleFlight, call_tool
+
+
+def test_concurrent_identical_calls_share_one_execution(monkeypatch):
+    calls = {"n": 0}
+
+    async def slow_tool(query: str):
+        calls["n"] += 1
+        await asyncio.sleep(0.1)
+        return {"status": "ok", "type": "tech", "confidence": 0.8, "content": query}
+
+    monkeypatch.setitem(tool_registry.TOOLS, "tech", slow_tool)
+    monkeypatch.setattr(tool_registry, "SINGLE_FLIGHT", SingleFlight())
+
+    async def main():
+        return await asyncio.gather(
+            call_tool("tech", "q1"), call_tool("tech", "q1"), call_tool("tech", "q2")
+        )
+
+    results = asyncio.run(main())
+    assert [r["content"] for r in results] == ["q1", "q1", "q2"]
+    assert calls["n"] == 2
+    # 统计按工具聚合，不为每个 query 保留条目
+    stats = tool_registry.SINGLE_FLIGHT.stats
+    assert stats == {"tech": {"calls": 3, "executed": 2, "deduplicated": 1}}
+    assert tool_registry.SINGLE_FLIGHT.hit_rate() == 1 / 3
+
+
+def test_waiter_timeout_does_not_cancel_other_waiters():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def main():
+        impatient = asyncio.wait_for(flight.do("k", work), timeout=0.01)
+        patient = flight.do("k", work)
+        return await asyncio.gather(impatient, patient, return_exceptions=True)
+
+    impatient, patient = asyncio.run(main())
+    assert isinstance(impatient, asyncio.TimeoutError)
+    assert patient == "done"
+
+
+def test_last_waiter_leaving_cancels_execution():
+    flight = SingleFlight()
+    finished = {"flag": False}
+
+    async def work():
+        await asyncio.sleep(0.2)
+        finished["flag"] = True
+
+    async def main():
+        try:
+            await asyncio.wait_for(flight.do("k", work), timeout=0.01)
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.sleep(0.3)
+
+    asyncio.run(main())
+    assert finished["flag"] is False
@@ -0,0 +1,99 @@
+import asyncio
+import gc
+import json
+import time
+
+from agent_learning import tool_registry
+from agent_learning.agent import run_agent_stream
+from agent_learning.tracing import Tracer
+
+
+def test_spans_nest_and_inherit_across_tasks():
+    tracer = Tracer()
+
+    async def child(name):
+        with tracer.span("tool", tool=name):
+            await asyncio.sleep(0.01)
+
+    async def main():
+        with tracer.span("step", trace_id="t1", step="分析"):
+            await asyncio.gather(child("a"), child("b"))
+
+    asyncio.run(main())
+    by_name = {}
+    for span in tracer.spans:
+        by_name.setdefault(span.name, []).append(span)
+    step, = by_name["step"]
+    tools = by_name["tool"]
+    assert {(s.trace_id, s.step) for s in tools} == {("t1", "分析")}
+    assert {s.tool for s in tools} == {"a", "b"}
+    # 并发的两个工具位于不同的轨道，且时间上重叠
+    assert len({s.lane for s in tools} | {step.lane}) == 3
+    assert max(s.start_ns for s in tools) < min(s.end_ns for s in tools)
+    assert all(step.start_ns <= s.start_ns and s.end_ns <= step.end_ns for s in tools)
+
+
+def test_finished_tasks_release_their_lanes():
+    tracer = Tracer()
+
+    async def one():
+        with tracer.span("tool"):
+            await asyncio.sleep(0)
+
+    async def main():
+        # 依次运行的任务：前一个被回收后 id 可能被复用，但每个任务仍有自己的轨道
+        for _ in range(50):
+            await asyncio.ensure_future(one())
+
+    asyncio.run(main())
+    gc.collect()
+    assert len({s.lane for s in tracer.spans}) == 50
+    assert len(tracer._lanes) <= 1   # 只剩下（可能仍存活的）主线程
+
+
+def test_span_records_exception_and_disabled_tracer_is_cheap():
+    tracer = Tracer()
+    try:
+        with tracer.span("boom"):
+            raise ValueError("x")
+    except ValueError:
+        pass
+    assert tracer.spans[0].args == {"error": "ValueError"}
+
+    disabled = Tracer(enabled=False)
+    n = 100_000
+    started = time.perf_counter()
+    for _ in range(n):
+        with disabled.span("decision", step="s") as span:
+            span.set(hit=True)
+    assert (time.perf_counter() - started) / n < 2e-6
+    assert disabled.spans == []
+
+
+def test_agent_run_exports_chrome_trace(monkeypatch, tmp_path):
+    async def tool(query: str):
+        await asyncio.sleep(0.02)
+        return {"status": "ok", "type": "tech", "confidence": 0.9, "content": "内容"}
+
+    for name in ("general", "tech", "project"):
+        monkeypatch.setitem(tool_registry.TOOLS, name, tool)
+    tracer = Tracer()
+
+    async def collect():
+        return [e async for e in run_agent_stream("追踪任务", tracer=tracer)]
+
+    events = asyncio.run(collect())
+    trace_id = events[-1]["trace_id"]
+    names = {s.name for s in tracer.spans}
+    assert {"run", "plan", "step", "decision", "cache_read", "execution",
+            "tool", "reflection", "state_write"} <= names
+    assert {s.trace_id for s in tracer.spans} == {trace_id}
+    assert all(s.step for s in tracer.spans if s.name in ("decision", "execution", "tool"))
+
+    path = tracer.export_chrome_trace(tmp_path / "trace.json")
+    data = json.loads(path.read_text(encoding="utf-8"))
+    complete = [e for e in data["traceEvents"] if e["ph"] == "X"]
+    assert len(complete) == len(tracer.spans)
+    assert all(e["dur"] >= 0 and e["pid"] == 1 for e in complete)
+    assert {e["args"]["name"] for e in data["traceEvents"] if e["ph"] == "M"} == {f"trace {trace_id}"}
+    assert tracer.summary()["tool"]["count"] >= 1
@@ -0,0 +1,81 @@
+import asyncio
+import os
+
+from agent_learning.batch import BatchStats
+from agent_learning.benchmarks.load import install_profile
+from agent_learning.cache import task_fingerprint
+from agent_learning.state import SQLiteState
+from agent_learning.task import Task
+from agent_learning.workers import WorkerPool
+
+PROFILE = [
+    {"name": "general", "dist": "fixed", "mean": 0.001, "confidence": 0.9},
+    {"name": "tech", "dist": "fixed", "mean": 0.001, "confidence": 0.9},
+    {"name": "project", "dist": "fixed", "mean": 0.001, "confidence": 0.9},
+]
+
+
+def test_worker_pool_shards_tasks_shares_store_and_merges_metrics(tmp_path):
+    db = tmp_path / "state.db"
+    tasks = [Task(str(i), f"多进程任务 {i % 4}") for i in range(8)]
+    stats = BatchStats()
+
+    with WorkerPool(
+        workers=2, concurrency=4, state_path=db, log_dir=tmp_path,
+        initializer=install_profile, initargs=(PROFILE,),
+    ) as pool:
+        done = []
+        for task in pool.run(tasks, stats=stats):
+            done.append(task)
+            # 指标随每个结果发回：运行期间 supervisor 就能看到已完成任务的指标
+            assert pool.metrics.counter("runs_total") >= len(done)
+
+    assert sorted(t.task_id for t in done) == [str(i) for i in range(8)]
+    assert all(t.result.startswith("任务完成") and t.status == "ok" for t in done)
+    assert stats.completed == 8 and stats.failed == 0
+    # 所有 worker 的指标都合并回 supervisor
+    assert pool.metrics.counter("runs_total") == 8
+    assert not any(proc.is_alive() for proc in pool._procs)
+
+    with SQLiteState(db) as store:
+        assert len(store) > 0
+    assert list(tmp_path.glob("decisions.w*.jsonl"))
+
+
+def install_crashing_profile(specs):
+    """worker 的 initializer：任务描述含"崩溃"时 general 工具直接结束进程。"""
+    from agent_learning import tool_registry
+
+    install_profile(specs)
+    healthy = tool_registry.TOOLS["general"]
+
+    async def general(query: str):
+        if "崩溃" in query:
+            # 稍等片刻再退出：避免在 feeder 线程还持有 outbox 写锁时结束进程
+            await asyncio.sleep(0.2)
+            os._exit(1)
+        return await healthy(query)
+
+    tool_registry.TOOLS["general"] = general
+
+
+def test_crashed_worker_is_reported_while_others_keep_producing(tmp_path):
+    profile = [{**spec, "mean": 0.1} for spec in PROFILE]
+    # 其余任务都分片到另一个 worker：它在崩溃后持续产出结果，outbox 不会空闲
+    crashed_worker = int(task_fingerprint("崩溃任务"), 16) % 2
+    descriptions = (f"持续任务 {i}" for i in range(1000))
+    others = [d for d in descriptions if int(task_fingerprint(d), 16) % 2 != crashed_worker][:15]
+    tasks = [Task("crash", "崩溃任务")] + [Task(str(i), d) for i, d in enumerate(others)]
+
+    with WorkerPool(
+        workers=2, concurrency=1, state_path=tmp_path / "state.db",
+        initializer=install_crashing_profile, initargs=(profile,),
+    ) as pool:
+        pool.wait_ready()
+        done = list(pool.run(tasks))
+
+    assert len(done) == len(tasks)
+    crashed = next(t for t in done if t.task_id == "crash")
+    assert crashed.status == "failed" and "异常退出" in crashed.result
+    # 崩溃的 worker 在另一个 worker 仍持续产出结果时就被发现：之后的任务都交给存活的 worker 完成
+    assert done[-1].status == "ok"
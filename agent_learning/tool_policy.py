@@ -0,0 +1,228 @@
+"""
+tool_policy.py
+
+基于历史结果的工具选择策略：替代"每个 step 固定扇出到关键词路由给出的全部工具"。
+
+- 按 (step, tool) 累计运行统计：调用次数、越过 `need_more_info` 阈值（且 status 为 ok）的次数、
+  平均置信度、延迟 EWMA；统计来自每次 run 的工具结果，也可以从已有的 decision_log 文件回放（`fit_decision_log`）
+- 越过阈值的概率用 Beta(1, 1) 先验的后验均值估计；按概率从高到低（同概率时延迟低者优先）贪心加入工具，
+  直到"至少一个工具越过阈值"的概率达到 `target`，即预期能越过阈值的最小工具集合
+- 任一候选样本数不足 `min_samples` 时保持原有的全量扇出以收集统计；
+  另以 `explore` 的概率额外加入一个未选中的候选，使被冷落的工具的统计不会永远停留在旧值
+- 传入 `path` 时统计写入 SQLiteState（每个 step 一个 key），跨 run / 跨进程 / 跨重启复用
+
+    policy = ToolPolicy(path="logs/tool_policy.db")
+    await run_agent(task, tool_policy=policy)
+
+对比关键词路由与学习策略的每任务 tool-seconds：`python -m agent_learning.benchmarks.tool_policy_bench`。
+"""
+import json
+import random
+from pathlib import Path
+from typing import Any, Iterable
+
+from agent_learning.cache import task_fingerprint
+from agent_learning.state import SQLiteState
+
+POLICY_VERSION = "v1"
+# 与 agent.need_more_info 一致：置信度低于该值需要补救
+CONFIDENCE_THRESHOLD = 0.6
+# 延迟 EWMA 的平滑系数
+LATENCY_ALPHA = 0.2
+# 决策日志中不代表工具质量、回放时跳过的状态（在线学习同样不记录它们）
+_NOT_LEARNED = ("deadline", "cancelled")
+
+
+class ToolArm:
+    """单个 (step, tool) 的运行统计。`window` 限制有效样本数，使统计能跟上工具质量的变化。"""
+    __slots__ = ("n", "wins", "confidence_sum", "latency")
+
+    def __init__(self, n: float = 0.0, wins: float = 0.0, confidence_sum: float = 0.0,
+                 latency: float | None = None):
+        self.n = n
+        self.wins = wins
+        self.confidence_sum = confidence_sum
+        self.latency = latency
+
+    def record(self, cleared: bool, confidence: float, latency: float | None, window: int) -> None:
+        if self.n >= window:
+            # 超出窗口后按比例缩减旧样本，相当于指数遗忘
+            scale = (window - 1) / self.n
+            self.n *= scale
+            self.wins *= scale
+            self.confidence_sum *= scale
+        self.n += 1
+        self.wins += cleared
+        self.confidence_sum += confidence
+        if latency is not None:
+            self.latency = latency if self.latency is None else self.latency + LATENCY_ALPHA * (latency - self.latency)
+
+    @property
+    def p_clear(self) -> float:
+        """越过阈值的概率（Beta(1, 1) 先验的后验均值）。"""
+        return (self.wins + 1) / (self.n + 2)
+
+    @property
+    def mean_confidence(self) -> float:
+        return self.confidence_sum / self.n if self.n else 0.0
+
+    def to_list(self) -> list:
+        return [self.n, self.wins, self.confidence_sum, self.latency]
+
+    @classmethod
+    def from_list(cls, data: list) -> "ToolArm":
+        return cls(*data)
+
+
+class ToolPolicy:
+    """
+    按 (step, tool) 统计学习的工具选择：`select` 收窄候选，`record` 记录结果，`save` 持久化。
+    关键词路由给出的候选是冷启动时的扇出集合；样本足够后也会选用该 step 上表现好的其他工具。
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        threshold: float = CONFIDENCE_THRESHOLD,
+        target: float = 0.9,
+        min_samples: int = 5,
+        explore: float = 0.05,
+        window: int = 200,
+        seed: int | None = None,
+        version: str = POLICY_VERSION,
+    ):
+        self.threshold = threshold
+        self.target = target
+        self.min_samples = min_samples
+        self.explore = explore
+        self.window = window
+        self.version = version
+        self.store = SQLiteState(path) if path is not None else None
+        self._rng = random.Random(seed)
+        self._arms: dict[str, dict[str, ToolArm]] = {}   # step 指纹 -> tool -> 统计
+        self._dirty: set[str] = set()
+        self.selections = 0
+        self.narrowed = 0
+
+    def _key(self, step: str) -> str:
+        return task_fingerprint(step)
+
+    def _step_arms(self, step: str) -> dict[str, ToolArm]:
+        key = self._key(step)
+        arms = self._arms.get(key)
+        if arms is None:
+            arms = {}
+            if self.store is not None:
+                stored = self.store.get(f"policy:{self.version}:{key}")
+                if stored:
+                    arms = {tool: ToolArm.from_list(data) for tool, data in stored.items()}
+            self._arms[key] = arms
+        return arms
+
+    # ---------------- 选择 ----------------
+
+    def select(self, step: str, candidates: list[str], available: Iterable[str] = ()) -> list[str]:
+        """
+        选出预期能越过阈值的最小工具集合，按优先级排序（首个为首选工具）。
+        候选为路由给出的 `candidates`，加上 `available` 中在该 step 上已有足够样本的其他工具
+        （例如补救时调用过的工具），因此学到的结果可以替代关键词路由。
+        """
+        self.selections += 1
+        arms = self._step_arms(step)
+        if any(t not in arms or arms[t].n < self.min_samples for t in candidates):
+            return list(candidates)  # 冷启动：按路由全量扇出收集统计
+        pool = list(candidates) + [
+            t for t in available if t not in candidates and t in arms and arms[t].n >= self.min_samples
+        ]
+        if len(pool) <= 1:
+            return pool
+
+        ranked = sorted(pool, key=lambda t: (-arms[t].p_clear, arms[t].latency or 0.0))
+        chosen: list[str] = []
+        miss = 1.0
+        for tool in ranked:
+            chosen.append(tool)
+            miss *= 1 - arms[tool].p_clear
+            if 1 - miss >= self.target:
+                break
+        rest = [t for t in ranked if t not in chosen]
+        if rest and self._rng.random() < self.explore:
+            chosen.append(self._rng.choice(rest))
+        if set(chosen) != set(candidates):
+            self.narrowed += 1
+        return chosen
+
+    def expected(self, step: str, tools: list[str]) -> dict[str, Any]:
+        """给决策日志用：所选工具集合越过阈值的预期概率。"""
+        arms = self._step_arms(step)
+        miss = 1.0
+        for tool in tools:
+            arm = arms.get(tool)
+            miss *= 1 - (arm.p_clear if arm is not None else 0.5)
+        return {"p_clear": 1 - miss}
+
+    # ---------------- 学习 ----------------
+
+    def record(self, step: str, tool: str, status: str | None, confidence: float,
+               latency: float | None = None) -> None:
+        arms = self._step_arms(step)
+        arm = arms.get(tool)
+        if arm is None:
+            arm = arms[tool] = ToolArm()
+        cleared = status == "ok" and confidence >= self.threshold
+        arm.record(cleared, confidence if status == "ok" else 0.0, latency, self.window)
+        self._dirty.add(self._key(step))
+
+    def fit_decision_log(self, entries: Iterable[dict]) -> int:
+        """从 decision_log 记录回放工具结果（含 step / tool / status / confidence 的条目），返回学习的条数。
+
+        与在线学习一致，只回放真实调用：缓存命中（含负缓存，标记为 cached）、被总时限截断（deadline）
+        和被提前返回取消（cancelled）的条目不代表工具质量，跳过。
+        """
+        learned = 0
+        for entry in entries:
+            if entry.get("cached") or entry.get("status") in _NOT_LEARNED:
+                continue
+            if "status" in entry and entry.get("step") and entry.get("tool") and "action" not in entry:
+                self.record(entry["step"], entry["tool"], entry["status"], entry.get("confidence", 0.0))
+                learned += 1
+        return learned
+
+    def fit_decision_files(self, paths: Iterable[str | Path]) -> int:
+        """读取 PerTraceJsonSink 写出的 decision_<trace>.json（JSON 数组）或 JsonLinesSink 的 JSON-lines 文件。"""
+        learned = 0
+        for path in paths:
+            text = Path(path).read_text(encoding="utf-8")
+            if text.lstrip().startswith("["):
+                entries = json.loads(text)
+            else:
+                entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+            learned += self.fit_decision_log(entries)
+        return learned
+
+    # ---------------- 持久化 ----------------
+
+    def save(self) -> None:
+        """把有变化的 step 统计写入 store（写入由 SQLiteState 的后台线程批量提交）。"""
+        if self.store is None:
+            self._dirty.clear()
+            return
+        for key in self._dirty:
+            arms = self._arms.get(key, {})
+            self.store.set(f"policy:{self.version}:{key}", {t: a.to_list() for t, a in arms.items()})
+        self._dirty.clear()
+
+    def close(self) -> None:
+        self.save()
+        if self.store is not None:
+            self.store.close()
+
+    def stats(self, step: str | None = None) -> dict:
+        """整体计数；给定 step 时返回该 step 各工具的统计。"""
+        if step is not None:
+            return {
+                tool: {"n": arm.n, "p_clear": arm.p_clear, "mean_confidence": arm.mean_confidence,
+                       "latency": arm.latency}
+                for tool, arm in self._step_arms(step).items()
+            }
+        return {"steps": len(self._arms), "selections": self.selections, "narrowed": self.narrowed}
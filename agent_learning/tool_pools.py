@@ -0,0 +1,128 @@
+"""
+tool_pools.py
+
+同步 / CPU 密集型工具的执行池。工具描述符通过 `kind` 声明执行方式：
+- "async"：协程函数，直接在事件循环上执行（原有行为）
+- "thread"：阻塞的同步函数（本地文件搜索、SQLite 查询等），提交到进程内共享的有界线程池
+- "process"：CPU 密集的同步函数（分词、解析等），提交到共享的进程池（spawn 启动，函数与参数必须可 pickle）
+
+`ToolPool.run()` 返回可 await 的 Future，因此 `_execute` 中的 `asyncio.wait_for` 超时与取消照常生效：
+- 仍在排队的调用被取消后不会再执行
+- 已经在线程 / 子进程中运行的调用无法中断，它的结果会被丢弃，但调用方立即返回
+  （占用的 worker 在调用结束后才释放，因此 `stats()` 同时报告在途数与排队深度）
+
+线程池 / 进程池均按需创建，模块级实例可以在多次 `asyncio.run` 之间复用。
+"""
+import asyncio
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+EXEC_KINDS = ("async", "thread", "process")
+
+DEFAULT_THREAD_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+DEFAULT_PROCESS_WORKERS = os.cpu_count() or 1
+
+
+class ToolPool:
+    """
+    对 ThreadPoolExecutor / ProcessPoolExecutor 的薄封装：按需创建、统计在途与排队深度。
+    计数在 worker 线程的完成回调中更新，因此用锁保护。
+    """
+
+    def __init__(self, kind: str, max_workers: int | None = None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"未知的执行池类型：{kind}")
+        self.kind = kind
+        self.max_workers = max_workers or (DEFAULT_THREAD_WORKERS if kind == "thread" else DEFAULT_PROCESS_WORKERS)
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+        self.pending = 0           # 已提交、尚未结束（排队 + 运行中）
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.max_queue_depth = 0
+
+    @property
+    def executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "thread":
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="agent-tool")
+                else:
+                    self._executor = ProcessPoolExecutor(self.max_workers, mp_context=mp.get_context("spawn"))
+            return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        """等待空闲 worker 的调用数。"""
+        return max(0, self.pending - self.max_workers)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        executor = self.executor
+        try:
+            cfut = executor.submit(func, *args)
+        except BrokenProcessPool:
+            # 子进程意外退出后进程池不可再用：丢弃它，下一次调用重新创建
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        with self._lock:
+            self.pending += 1
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        cfut.add_done_callback(self._done)
+        # wrap_future：外层 Future 被取消（超时 / 调用方取消）时会一并取消仍在排队的 cfut
+        return await asyncio.wrap_future(cfut)
+
+    def _done(self, cfut: Future) -> None:
+        with self._lock:
+            self.pending -= 1
+            if cfut.cancelled():
+                self.cancelled += 1
+            elif cfut.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "inflight": min(self.pending, self.max_workers),
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# 进程级共享：所有同步工具共用一个线程池，所有 CPU 密集型工具共用一个进程池
+POOLS: dict[str, ToolPool] = {
+    "thread": ToolPool("thread"),
+    "process": ToolPool("process"),
+}
+
+
+def pool_stats(used_only: bool = False) -> dict[str, dict]:
+    """每个执行池的在途数 / 排队深度 / 完成计数；`used_only` 时省略从未提交过调用的池。"""
+    return {kind: pool.stats() for kind, pool in POOLS.items() if pool.submitted or not used_only}
+
+
+def shutdown_pools(wait: bool = True) -> None:
+    for pool in POOLS.values():
+        pool.shutdown(wait=wait)
@@ -1,15 +1,328 @@
 # tool_registry.py
-# 像是一个工具名单册，列出了AI agent可以调用的各种工具函数。 
+# 像是一个工具名单册，列出了AI agent可以调用的各种工具函数。
 # 我这里有search_general_knowledge, search_tech_knowledge, search_project_knowledge。。。工具
 
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable
+
+from agent_learning.deadline import DeadlineExceeded
+from agent_learning.rate_limit import ToolLimiter, ToolLimits
+from agent_learning.tool_pools import EXEC_KINDS, POOLS, pool_stats
 from agent_learning.tool import (
     search_general_knowledge,
     search_tech_knowledge,
     search_project_knowledge,
 )
 
-TOOLS = {
-    "general": search_general_knowledge,
-    "tech": search_tech_knowledge,
-    "project": search_project_knowledge,
-}
+# 没有历史数据时使用的超时（秒）
+DEFAULT_TOOL_TIMEOUT = 3.0
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器打开时拒绝调用。"""
+
+
+class ToolTimeout(asyncio.TimeoutError):
+    """工具自身的执行超时（已计入 ToolHealth）；调用方一侧的等待超时仍是普通的 asyncio.TimeoutError。"""
+
+
+class ToolHealth:
+    """
+    工具的实时健康状况：
+    - EWMA 平滑的延迟、超时率、错误率
+    - 最近延迟样本，用于计算自适应超时（p99 * 倍数，限制在 [min, cap] 之间）
+    - 熔断器：连续失败达到阈值后打开，冷却后放行一个半开探测，探测成功才关闭
+    """
+
+    ALPHA = 0.2
+    MIN_SAMPLES = 10
+    TIMEOUT_MULTIPLIER = 1.5
+    FAILURE_THRESHOLD = 5
+    COOLDOWN = 10.0
+
+    def __init__(self):
+        self.ewma_latency: float | None = None
+        self.timeout_rate = 0.0
+        self.error_rate = 0.0
+        self.calls = 0
+        self._latencies: deque[float] = deque(maxlen=200)
+
+        self.state = "closed"            # closed / open / half_open
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    # ---------------- 统计 ----------------
+
+    def _update(self, timed_out: bool, errored: bool) -> None:
+        self.calls += 1
+        self.timeout_rate += self.ALPHA * (float(timed_out) - self.timeout_rate)
+        self.error_rate += self.ALPHA * (float(errored) - self.error_rate)
+
+    def record_success(self, seconds: float) -> None:
+        self._update(False, False)
+        self._latencies.append(seconds)
+        if self.ewma_latency is None:
+            self.ewma_latency = seconds
+        else:
+            self.ewma_latency += self.ALPHA * (seconds - self.ewma_latency)
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        self.state = "closed"
+
+    def record_failure(self, timed_out: bool) -> None:
+        self._update(timed_out, not timed_out)
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.FAILURE_THRESHOLD:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """探测调用被取消（既没成功也没失败）时归还探测名额。"""
+        self._probe_in_flight = False
+
+    def latency_percentile(self, q: float) -> float | None:
+        if len(self._latencies) < self.MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def timeout(self, cap: float, floor: float) -> float:
+        p99 = self.latency_percentile(0.99)
+        if p99 is None:
+            return cap
+        return max(floor, min(cap, p99 * self.TIMEOUT_MULTIPLIER))
+
+    # ---------------- 熔断器 ----------------
+
+    def available(self) -> bool:
+        """只读判断：决策层据此过滤候选工具，不占用半开探测名额。"""
+        if self.state == "closed":
+            return True
+        if self._probe_in_flight:
+            return False
+        return time.monotonic() - self.opened_at >= self.COOLDOWN
+
+    def try_acquire(self) -> bool:
+        """执行前调用：打开状态冷却结束后转为半开，并只放行一个探测。"""
+        if self.state == "closed":
+            return True
+        if not self.available():
+            return False
+        self.state = "half_open"
+        self._probe_in_flight = True
+        return True
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "ewma_latency": self.ewma_latency,
+            "timeout_rate": self.timeout_rate,
+            "error_rate": self.error_rate,
+            "p99_latency": self.latency_percentile(0.99),
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+@dataclass
+class ToolDescriptor:
+    """
+    工具描述：实现函数 + 限流参数 + 超时下限 + 执行方式 + 实时健康状况。
+    可以像原来的工具函数一样直接调用：`await descriptor(query)`。
+    kind 为 "thread" / "process" 时 func 是同步函数，调用被提交到共享的线程池 / 进程池（见 tool_pools.py）。
+    """
+    name: str
+    func: Callable[[str], Any]
+    limits: ToolLimits | None = None
+    min_timeout: float = 0.2
+    kind: str = "async"
+    health: ToolHealth = field(default_factory=ToolHealth)
+    _limiter: ToolLimiter | None = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.kind not in EXEC_KINDS:
+            raise ValueError(f"未知的工具执行方式：{self.kind}")
+
+    def __call__(self, query: str) -> Awaitable[dict]:
+        if self.kind == "async":
+            return self.func(query)
+        return POOLS[self.kind].run(self.func, query)
+
+    @property
+    def limiter(self) -> ToolLimiter | None:
+        if self.limits is None:
+            return None
+        if self._limiter is None:
+            self._limiter = ToolLimiter(self.limits)
+        return self._limiter
+
+    def timeout(self, cap: float | None = None) -> float:
+        """自适应超时：由观测到的延迟分位数推导，且不超过调用方给出的上限。"""
+        return self.health.timeout(cap if cap is not None else DEFAULT_TOOL_TIMEOUT, self.min_timeout)
+
+    def available(self) -> bool:
+        return self.health.available()
+
+
+class ToolRegistry(dict):
+    """
+    name -> ToolDescriptor。直接赋值普通工具函数时会自动包装成描述符，
+    并沿用同名旧描述符的限流参数。
+    """
+
+    def __setitem__(self, name: str, tool: Any) -> None:
+        if not isinstance(tool, ToolDescriptor):
+            previous = self.get(name)
+            tool = ToolDescriptor(name, tool, limits=previous.limits if previous else None)
+        super().__setitem__(name, tool)
+
+    def stats(self) -> dict:
+        return {name: desc.health.snapshot() for name, desc in self.items()}
+
+    def pool_stats(self) -> dict[str, dict]:
+        """线程池 / 进程池的在途数与排队深度（所有 registry 共享同一组执行池）。"""
+        return pool_stats()
+
+
+# 每个工具声明后端能承受的调用速率（令牌桶）与在途上限，批量运行时保护后端
+TOOLS = ToolRegistry()
+TOOLS["general"] = ToolDescriptor(
+    "general", search_general_knowledge, ToolLimits(rate=200, burst=50, max_inflight=100)
+)
+TOOLS["tech"] = ToolDescriptor(
+    "tech", search_tech_knowledge, ToolLimits(rate=100, burst=20, max_inflight=50)
+)
+TOOLS["project"] = ToolDescriptor(
+    "project", search_project_knowledge, ToolLimits(rate=100, burst=20, max_inflight=50)
+)
+
+
+class SingleFlight:
+    """
+    合并相同 key 的并发调用：同一时刻只有一个真实执行，其余调用方共享它的 Future。
+    按工具（key 为 (tool, query) 时取 tool，否则取 key 本身）聚合 calls（调用次数）/
+    executed（真实执行次数）/ deduplicated（被合并次数）；不按 query 记录，长期运行时不会无限增长。
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self._waiters: dict[Hashable, int] = {}
+        self.stats: dict[Hashable, dict[str, int]] = {}
+
+    def _counters(self, key: Hashable) -> dict[str, int]:
+        group = key[0] if isinstance(key, tuple) and key else key
+        counters = self.stats.get(group)
+        if counters is None:
+            counters = self.stats[group] = {"calls": 0, "executed": 0, "deduplicated": 0}
+        return counters
+
+    def _forget(self, key: Hashable, fut: asyncio.Future) -> None:
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
+            self._waiters.pop(key, None)
+        # 取走异常，避免所有调用方都已放弃时出现 "exception was never retrieved"
+        if not fut.cancelled():
+            fut.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        counters = self._counters(key)
+        counters["calls"] += 1
+
+        fut = self._inflight.get(key)
+        if fut is not None and fut.get_loop() is not asyncio.get_running_loop():
+            fut = None  # 旧事件循环遗留的调用，不能跨循环共享
+
+        if fut is None:
+            counters["executed"] += 1
+            fut = asyncio.ensure_future(fn())
+            self._inflight[key] = fut
+            self._waiters[key] = 0
+            fut.add_done_callback(lambda f, k=key: self._forget(k, f))
+        else:
+            counters["deduplicated"] += 1
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # shield：单个调用方超时 / 取消不会影响其他共享者
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            # 最后一个等待者离开时，取消已无人关心的真实调用
+            if self._inflight.get(key) is fut:
+                self._waiters[key] -= 1
+                if self._waiters[key] <= 0:
+                    fut.cancel()
+            raise
+
+    def hit_rate(self) -> float:
+        """被合并的调用占全部调用的比例。"""
+        calls = sum(c["calls"] for c in self.stats.values())
+        deduplicated = sum(c["deduplicated"] for c in self.stats.values())
+        return deduplicated / calls if calls else 0.0
+
+    def reset_stats(self) -> None:
+        self.stats.clear()
+
+
+# 进程级共享：同一进程内所有 Agent 的工具调用都经过这里
+SINGLE_FLIGHT = SingleFlight()
+
+
+async def _execute(descriptor: ToolDescriptor, query: str, timeout: float) -> dict:
+    """
+    真实调用：熔断检查 → 限流 → 带超时执行，并把结果记入工具健康状况。
+    超时只从拿到限流配额后开始计算，排队时间不算作工具慢；工具自身超时抛 ToolTimeout。
+    """
+    health = descriptor.health
+    if not health.try_acquire():
+        raise CircuitOpenError(f"工具 {descriptor.name} 熔断中")
+
+    limiter = descriptor.limiter
+    started = time.perf_counter()
+    try:
+        if limiter is None:
+            res = await asyncio.wait_for(descriptor(query), timeout)
+        else:
+            async with limiter:
+                started = time.perf_counter()  # 排队时间不计入工具延迟
+                res = await asyncio.wait_for(descriptor(query), timeout)
+    except asyncio.TimeoutError as e:
+        health.record_failure(timed_out=True)
+        raise ToolTimeout(f"工具 {descriptor.name} 执行超时") from e
+    except asyncio.CancelledError:
+        health.release_probe()
+        raise
+    except Exception:
+        health.record_failure(timed_out=False)
+        raise
+    health.record_success(time.perf_counter() - started)
+    return res
+
+
+async def call_tool(
+    tool_type: str, query: str, timeout: float | None = None, budget: float | None = None
+) -> dict:
+    """
+    通过 single-flight 调用工具：相同 (tool, query) 的并发请求只打到后端一次；
+    真实调用受描述符声明的速率与在途上限约束（被合并的调用不占配额），
+    超时取自适应超时与调用方上限 `timeout` 中的较小者，只约束真实执行（限流排队时间不计入）。
+    `budget` 是调用方总时限的剩余预算（秒），是硬上限（含排队时间）：预算耗尽时不发起调用，直接抛 DeadlineExceeded。
+    预算只约束本调用方对共享调用的等待，真实调用仍按工具自身的超时执行，不会因某个调用方的预算被截断。
+    """
+    descriptor = TOOLS[tool_type]
+    if budget is not None and budget <= 0:
+        raise DeadlineExceeded(f"工具 {tool_type} 没有剩余预算")
+    limit = descriptor.timeout(timeout)
+    shared = SINGLE_FLIGHT.do((tool_type, query), lambda: _execute(descriptor, query, limit))
+    if budget is None:
+        return await shared
+    try:
+        return await asyncio.wait_for(shared, budget)
+    except ToolTimeout:
+        raise
+    except asyncio.TimeoutError as e:
+        raise DeadlineExceeded(f"工具 {tool_type} 超出总时限") from e
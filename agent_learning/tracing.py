@@ -0,0 +1,190 @@
+"""
+tracing.py
+
+轻量 span 追踪：记录控制循环各阶段（规划 / 决策 / 缓存读取 / 执行 / 反思 / 状态写入）的耗时与重叠。
+
+- `tracer.span(name, trace_id=..., step=..., tool=...)` 返回上下文管理器，计时使用 `perf_counter_ns`
+- 通过 contextvars 自动形成嵌套：子 span 继承父 span 的 trace_id / step / tool，
+  在 span 内创建的 asyncio 任务同样继承（上下文在创建任务时复制）
+- 关闭时（`Tracer(enabled=False)`，即默认的 `TRACER`）`span()` 直接返回共享的空 span，开销只有一次方法调用
+- `to_chrome_trace()` / `export_chrome_trace(path)` 输出 Chrome / Perfetto 的 trace-event JSON：
+  每个 trace（一次 run）是一个进程，每个 asyncio 任务是一条线程轨道，并发工具 / 并发 run 会并排显示
+
+    tracer = Tracer()
+    await run_agent("解释什么是 asyncio", tracer=tracer)
+    tracer.export_chrome_trace("logs/trace.json")   # 用 chrome://tracing 或 ui.perfetto.dev 打开
+"""
+import asyncio
+import json
+import threading
+import time
+import weakref
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+
+_CURRENT_SPAN: ContextVar["Span | None"] = ContextVar("agent_learning_span", default=None)
+
+
+def _lane_owner() -> object:
+    """span 所在的执行轨道：asyncio 任务（同一任务内的 span 严格嵌套），否则为线程。"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return task if task is not None else threading.current_thread()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "trace_id", "step", "tool", "args", "start_ns", "end_ns", "lane", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str | None, step: str | None,
+                 tool: str | None, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.step = step
+        self.tool = tool
+        self.args = args
+        self.start_ns = 0
+        self.end_ns = 0
+        self.lane = 0
+        self._token = None
+
+    def set(self, **args: Any) -> None:
+        """给 span 补充属性（例如命中数、选中的工具）。"""
+        self.args.update(args)
+
+    def __enter__(self) -> "Span":
+        parent = _CURRENT_SPAN.get()
+        if parent is not None:
+            self.trace_id = self.trace_id or parent.trace_id
+            self.step = self.step or parent.step
+            self.tool = self.tool or parent.tool
+        self.lane = self.tracer._lane(_lane_owner())
+        self._token = _CURRENT_SPAN.set(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.perf_counter_ns()
+        _CURRENT_SPAN.reset(self._token)
+        self._token = None
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer._finish(self)
+        return False
+
+    @property
+    def duration(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+
+class _NoopSpan:
+    """追踪关闭时共享的空 span。"""
+    __slots__ = ()
+
+    def set(self, **args: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    收集已结束的 span。`max_spans` 限制内存占用，超出后丢弃新 span 并计数。
+    """
+
+    def __init__(self, enabled: bool = True, max_spans: int = 1_000_000):
+        self.enabled = enabled
+        self.max_spans = max_spans
+        self.spans: list[Span] = []
+        self.dropped = 0
+        # 以任务 / 线程对象本身为弱引用 key：结束的任务随之移除，不会因 id 复用而共用轨道
+        self._lanes: weakref.WeakKeyDictionary[object, int] = weakref.WeakKeyDictionary()
+        self._next_lane = 0
+        self._origin_ns = time.perf_counter_ns()
+
+    def span(self, name: str, trace_id: str | None = None, step: str | None = None,
+             tool: str | None = None, **args: Any) -> Span | _NoopSpan:
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, trace_id, step, tool, args)
+
+    def _lane(self, owner: object) -> int:
+        lane = self._lanes.get(owner)
+        if lane is None:
+            self._next_lane += 1
+            lane = self._lanes[owner] = self._next_lane
+        return lane
+
+    def _finish(self, span: Span) -> None:
+        if len(self.spans) < self.max_spans:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+    def clear(self) -> None:
+        self.spans.clear()
+        self._lanes.clear()
+        self._next_lane = 0
+        self.dropped = 0
+
+    # ---------------- 导出 ----------------
+
+    def to_chrome_trace(self) -> dict:
+        """Chrome / Perfetto trace-event 格式（"X" 完整事件，时间单位微秒）。"""
+        events: list[dict] = []
+        pids: dict[str, int] = {}
+        for span in sorted(self.spans, key=lambda s: s.start_ns):
+            pid = pids.setdefault(span.trace_id or "", len(pids) + 1)
+            args = {k: v for k, v in (("step", span.step), ("tool", span.tool)) if v is not None}
+            args.update(span.args)
+            events.append({
+                "name": span.name,
+                "cat": "agent",
+                "ph": "X",
+                "ts": (span.start_ns - self._origin_ns) / 1000,
+                "dur": (span.end_ns - span.start_ns) / 1000,
+                "pid": pid,
+                "tid": span.lane,
+                "args": args,
+            })
+        for trace_id, pid in pids.items():
+            events.append({
+                "name": "process_name", "ph": "M", "pid": pid,
+                "args": {"name": f"trace {trace_id}" if trace_id else "untraced"},
+            })
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_spans": self.dropped},
+        }
+
+    def export_chrome_trace(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f, ensure_ascii=False)
+        return path
+
+    def summary(self) -> dict[str, dict]:
+        """按 span 名称汇总：次数与总耗时 / 最大耗时（秒）。"""
+        out: dict[str, dict] = {}
+        for span in self.spans:
+            entry = out.setdefault(span.name, {"count": 0, "total": 0.0, "max": 0.0})
+            entry["count"] += 1
+            entry["total"] += span.duration
+            entry["max"] = max(entry["max"], span.duration)
+        return out
+
+
+# 进程级默认 tracer：默认关闭，`TRACER.enabled = True` 或向 run_agent 传入自己的 Tracer 即可开启
+TRACER = Tracer(enabled=False)
@@ -0,0 +1,294 @@
+"""
+workers.py
+
+多进程 worker 模式：supervisor 把任务按任务指纹分片到 N 个 worker 进程，
+每个 worker 在自己的事件循环中并发运行 `run_agent`，突破单核上限。
+
+- 相同任务总是落到同一个 worker，进程内的 single-flight / 缓存仍然生效
+- worker 通过 `SQLiteState`（WAL + 文件锁）安全地共享同一个持久化 store
+- worker 随每个结果发回自上次以来的 `METRICS` 增量，supervisor 运行期间即可看到合并后的指标
+- 关闭时向每个 worker 发送哨兵，worker 处理完在途任务后退出（Ctrl-C 同样走这一流程）
+
+    with WorkerPool(workers=4, state_path="logs/state.db") as pool:
+        for task in pool.run(tasks):
+            print(task.result)
+        print(pool.metrics.summary())
+"""
+import asyncio
+import multiprocessing as mp
+import os
+import queue
+import signal
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+from agent_learning.batch import BatchStats
+from agent_learning.cache import task_fingerprint
+from agent_learning.metrics import MetricsRegistry
+from agent_learning.task import Task
+
+# worker 心跳检查间隔（秒）：等待结果超过该时间就检查是否有 worker 意外退出
+_POLL_INTERVAL = 1.0
+
+
+@dataclass(frozen=True)
+class WorkerConfig:
+    """传给 worker 进程的配置（必须可 pickle）。"""
+    index: int
+    concurrency: int
+    state_path: str | None
+    log_dir: str | None
+    options: dict
+    initializer: Callable[..., None] | None = None
+    initargs: tuple = ()
+
+
+# ---------------- worker 进程 ----------------
+
+def _worker_main(config: WorkerConfig, inbox: mp.Queue, outbox: mp.Queue) -> None:
+    # Ctrl-C 由 supervisor 统一处理：它会发送哨兵，worker 跑完在途任务再退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if config.initializer is not None:
+        config.initializer(*config.initargs)
+    asyncio.run(_worker_loop(config, inbox, outbox))
+
+
+async def _worker_loop(config: WorkerConfig, inbox: mp.Queue, outbox: mp.Queue) -> None:
+    from agent_learning.agent import run_agent
+    from agent_learning.log_sink import JsonLinesSink
+    from agent_learning.metrics import METRICS
+    from agent_learning.state import SQLiteState
+
+    store = SQLiteState(config.state_path) if config.state_path else None
+    sink = (
+        JsonLinesSink(Path(config.log_dir) / f"decisions.w{config.index}.jsonl")
+        if config.log_dir else None
+    )
+    options = dict(config.options)
+    if sink is not None:
+        options["log_sink"] = sink
+
+    def metrics_delta() -> dict:
+        # 取走自上次发送以来合并进 METRICS 的内容（快照与清空之间没有 await，不会漏掉其他 run）
+        snapshot = METRICS.snapshot()
+        METRICS.reset()
+        return snapshot
+
+    async def handle(seq: int, description: str) -> None:
+        try:
+            result, error = await run_agent(description, persistent_state=store, **options), None
+        except Exception as e:
+            result, error = None, f"{type(e).__name__}: {e}"
+        outbox.put(("result", config.index, (seq, result, error, metrics_delta())))
+
+    outbox.put(("ready", config.index, None))
+    running: set[asyncio.Task] = set()
+    try:
+        while True:
+            item = await asyncio.to_thread(inbox.get)
+            if item is None:
+                break
+            while len(running) >= config.concurrency:
+                _, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            running.add(asyncio.ensure_future(handle(*item)))
+        if running:
+            await asyncio.gather(*running)
+    finally:
+        if store is not None:
+            store.close()
+        if sink is not None:
+            sink.close()
+        # 最后一个结果之后才合并的指标（例如后台刷新）在退出前补发
+        outbox.put(("metrics", config.index, metrics_delta()))
+        outbox.put(("exit", config.index, None))
+
+
+# ---------------- supervisor ----------------
+
+class WorkerPool:
+    """
+    supervisor：管理 worker 进程、分片投递任务并按完成顺序收集结果。
+    `options` 透传给每个 worker 中的 run_agent（必须可 pickle，例如 exec_mode / cache_ttl）。
+    `initializer(*initargs)` 在每个 worker 启动时调用（例如替换 TOOLS）。
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        concurrency: int = 16,
+        state_path: str | Path | None = None,
+        log_dir: str | Path | None = None,
+        initializer: Callable[..., None] | None = None,
+        initargs: tuple = (),
+        **options: Any,
+    ):
+        if concurrency < 1:
+            raise ValueError("concurrency 必须 >= 1")
+        self.workers = workers or os.cpu_count() or 1
+        self.concurrency = concurrency
+        self.metrics = MetricsRegistry()
+
+        ctx = mp.get_context("spawn")
+        self._outbox: mp.Queue = ctx.Queue()
+        self._inboxes: list[mp.Queue] = []
+        self._procs: list[mp.process.BaseProcess] = []
+        for index in range(self.workers):
+            config = WorkerConfig(
+                index, concurrency,
+                str(state_path) if state_path else None,
+                str(log_dir) if log_dir else None,
+                options, initializer, initargs,
+            )
+            inbox = ctx.Queue()
+            proc = ctx.Process(
+                target=_worker_main, args=(config, inbox, self._outbox),
+                name=f"agent-worker-{index}", daemon=True,
+            )
+            proc.start()
+            self._inboxes.append(inbox)
+            self._procs.append(proc)
+
+        self._alive = set(range(self.workers))
+        self._ready: set[int] = set()
+        self._pending: dict[int, tuple[Task, int, float]] = {}   # seq -> (task, worker, 提交时间)
+        self._seq = 0
+        self._closed = False
+        self._last_reap = time.monotonic()
+
+    # ---------------- 投递与收集 ----------------
+
+    def _shard(self, task: Task) -> int:
+        alive = sorted(self._alive)
+        if not alive:
+            raise RuntimeError("所有 worker 都已退出")
+        return alive[int(task_fingerprint(task.description), 16) % len(alive)]
+
+    def _submit(self, task: Task) -> None:
+        worker = self._shard(task)
+        self._seq += 1
+        self._pending[self._seq] = (task, worker, time.perf_counter())
+        self._inboxes[worker].put((self._seq, task.description))
+
+    def _handle_message(self, kind: str, worker: int, payload: Any) -> list[tuple[Task, float]]:
+        """处理一条 worker 消息，返回完成的 (task, 提交时间)。"""
+        if kind == "result":
+            seq, result, error, metrics = payload
+            self.metrics.merge_snapshot(metrics)
+            entry = self._pending.pop(seq, None)
+            if entry is None:
+                return []
+            task, _, started = entry
+            task.result = result if error is None else f"任务失败：{error}"
+            task.status = "ok" if error is None else "failed"
+            return [(task, started)]
+        if kind == "ready":
+            self._ready.add(worker)
+        elif kind == "metrics":
+            self.metrics.merge_snapshot(payload)
+        elif kind == "exit":
+            self._alive.discard(worker)
+        return []
+
+    def _poll(self) -> list[tuple[Task, float]]:
+        """
+        等待并处理一条 worker 消息；每隔 `_POLL_INTERVAL` 检查一次 worker 是否存活，
+        不论其间有没有消息——其他 worker 持续产出结果时，崩溃 worker 的任务也要及时报告。
+        """
+        try:
+            done = self._handle_message(*self._outbox.get(timeout=_POLL_INTERVAL))
+        except queue.Empty:
+            done = []
+        if time.monotonic() - self._last_reap >= _POLL_INTERVAL:
+            self._last_reap = time.monotonic()
+            done += self._reap_dead_workers()
+        return done
+
+    def _reap_dead_workers(self) -> list[tuple[Task, float]]:
+        """把意外退出的 worker 上未完成的任务标记为失败；返回值也包含检查前先取出的已完成任务。"""
+        dead = [worker for worker in self._alive if not self._procs[worker].is_alive()]
+        if not dead:
+            return []
+        # 先处理已经发出的消息：worker 退出前发回的结果不应被当成失败
+        done = []
+        while True:
+            try:
+                done += self._handle_message(*self._outbox.get_nowait())
+            except queue.Empty:
+                break
+        for worker in dead:
+            if worker not in self._alive:
+                continue  # 已经正常发回 exit
+            proc = self._procs[worker]
+            self._alive.discard(worker)
+            for seq, (task, owner, started) in list(self._pending.items()):
+                if owner == worker:
+                    del self._pending[seq]
+                    task.result = f"任务失败：worker {worker} 异常退出（exitcode={proc.exitcode}）"
+                    task.status = "failed"
+                    done.append((task, started))
+        return done
+
+    def wait_ready(self, timeout: float = 60.0) -> None:
+        """阻塞直到所有 worker 完成启动（导入模块、打开 store），便于把启动开销排除在测量之外。"""
+        deadline = time.monotonic() + timeout
+        while self._alive - self._ready:
+            if time.monotonic() >= deadline:
+                raise TimeoutError("worker 启动超时")
+            self._poll()
+
+    def run(self, tasks: Iterable[Task], stats: BatchStats | None = None) -> Iterator[Task]:
+        """
+        惰性投递 `tasks`（在途任务不超过 workers * concurrency * 2），按完成顺序 yield 填好 `result` 的 Task。
+        """
+        stats = stats if stats is not None else BatchStats()
+        stats.started_at = time.perf_counter()
+        pending = iter(tasks)
+        window = self.workers * self.concurrency * 2
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(self._pending) < window:
+                    item = next(pending, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    self._submit(item)
+                    stats.submitted += 1
+                if exhausted and not self._pending:
+                    return
+
+                for task, started in self._poll():
+                    stats.completed += 1
+                    stats.latencies.append(time.perf_counter() - started)
+                    if task.status == "failed":
+                        stats.failed += 1
+                    yield task
+        finally:
+            stats.finished_at = time.perf_counter()
+
+    # ---------------- 关闭 ----------------
+
+    def shutdown(self, timeout: float = 30.0) -> None:
+        """发送哨兵，等待 worker 处理完在途任务、发回指标后退出；超时则强制终止。"""
+        if self._closed:
+            return
+        self._closed = True
+        for worker in self._alive:
+            self._inboxes[worker].put(None)
+
+        deadline = time.monotonic() + timeout
+        while self._alive and time.monotonic() < deadline:
+            self._poll()
+        for proc in self._procs:
+            proc.join(max(0.0, deadline - time.monotonic()))
+            if proc.is_alive():
+                proc.terminate()
+                proc.join()
+
+    def __enter__(self) -> "WorkerPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()